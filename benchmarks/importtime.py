@@ -0,0 +1,84 @@
+"""Measures the time taken to import socksio with ``python -X importtime``.
+
+Every scenario runs in a fresh interpreter. The cost of a scenario is the sum of
+the self times of the modules it imports, leaving out the modules imported during
+interpreter startup, and the median over all runs is reported as a Markdown table.
+
+With ``--max-import`` the script exits with an error if a bare ``import socksio``
+loads a protocol module or its median exceeds the given number of microseconds.
+
+Usage: python benchmarks/importtime.py [--repeat N] [--max-import MICROSECONDS]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import typing
+
+# The only modules a bare "import socksio" is expected to load.
+BARE_IMPORT_MODULES = ["socksio", "socksio.exceptions"]
+
+SCENARIOS = (
+    ("import socksio", "import socksio"),
+    ("SOCKS4 only", "import socksio; socksio.SOCKS4Connection"),
+    ("SOCKS5 only", "import socksio; socksio.SOCKS5Connection"),
+    ("everything", "from socksio import *"),
+)
+
+
+def import_times(code: str) -> typing.Dict[str, int]:
+    """Returns the self time in microseconds of every module imported by ``code``."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_time, _, name = line[len("import time:") :].split("|")
+        if self_time.strip().isdigit():
+            times[name.strip()] = int(self_time)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-import", type=int, default=None)
+    args = parser.parse_args()
+
+    startup = set(import_times("pass"))
+    print("| Scenario | Median (µs) | socksio modules |")
+    print("| --- | ---: | --- |")
+    errors = []
+    for label, code in SCENARIOS:
+        totals = []
+        modules: typing.List[str] = []
+        for _ in range(args.repeat):
+            times = import_times(code)
+            totals.append(
+                sum(time for name, time in times.items() if name not in startup)
+            )
+            modules = sorted(name for name in times if name.startswith("socksio"))
+        median = statistics.median(totals)
+        print("| {} | {:.0f} | {} |".format(label, median, ", ".join(modules)))
+        if args.max_import is None or code != "import socksio":
+            continue
+        if modules != BARE_IMPORT_MODULES:
+            errors.append("import socksio loaded {}".format(", ".join(modules)))
+        if median > args.max_import:
+            errors.append(
+                "import socksio took {:.0f} µs, more than the {} µs allowed".format(
+                    median, args.max_import
+                )
+            )
+    if errors:
+        sys.exit("\n".join(errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import typing
+
+import pytest
+
+from socksio import (
+    SOCKS4ARequest,
+    SOCKS4Command,
+    SOCKS4Reply,
+    SOCKS4ReplyCode,
+    SOCKS4Request,
+    SOCKS4RequestTemplate,
+    SOCKS5AuthMethod,
+    SOCKS5AuthMethodsRequest,
+    SOCKS5AuthReply,
+    SOCKS5Command,
+    SOCKS5CommandRequest,
+    SOCKS5Datagram,
+    SOCKS5Reply,
+    SOCKS5ReplyCode,
+    SOCKS5UsernamePasswordReply,
+    SOCKS5UsernamePasswordRequest,
+)
+from socksio.utils import AddressCache, AddressType, decode_address, encode_address
+
+MESSAGES = {
+    "socks4-request": SOCKS4Request.from_address(
+        SOCKS4Command.CONNECT, "127.0.0.1:80", user_id=b"socksio"
+    ),
+    "socks4a-request": SOCKS4ARequest.from_address(
+        SOCKS4Command.CONNECT, "example.com:80", user_id=b"socksio"
+    ),
+    "socks4-reply": SOCKS4Reply(SOCKS4ReplyCode.REQUEST_GRANTED, 80, "127.0.0.1"),
+    "socks5-auth-methods": SOCKS5AuthMethodsRequest(
+        [SOCKS5AuthMethod.NO_AUTH_REQUIRED, SOCKS5AuthMethod.USERNAME_PASSWORD]
+    ),
+    "socks5-auth-reply": SOCKS5AuthReply(SOCKS5AuthMethod.NO_AUTH_REQUIRED),
+    "socks5-username-password": SOCKS5UsernamePasswordRequest(b"user", b"pass"),
+    "socks5-username-password-reply": SOCKS5UsernamePasswordReply(True),
+    "socks5-command-ipv4": SOCKS5CommandRequest.from_address(
+        SOCKS5Command.CONNECT, "127.0.0.1:80"
+    ),
+    "socks5-command-ipv6": SOCKS5CommandRequest.from_address(
+        SOCKS5Command.CONNECT, "[::1]:80"
+    ),
+    "socks5-command-domain": SOCKS5CommandRequest.from_address(
+        SOCKS5Command.CONNECT, "example.com:80"
+    ),
+    "socks5-reply": SOCKS5Reply.from_address(
+        SOCKS5ReplyCode.SUCCEEDED, ("127.0.0.1", 1080)
+    ),
+    "socks5-datagram": SOCKS5Datagram.from_address(("example.com", 53), b"x" * 512),
+}
+
+
+@pytest.mark.parametrize("name", list(MESSAGES))
+def test_dumps(benchmark: typing.Any, name: str) -> None:
+    message = MESSAGES[name]
+    assert benchmark(message.dumps) == message.dumps()
+
+
+@pytest.mark.parametrize("name", list(MESSAGES))
+def test_loads(benchmark: typing.Any, name: str) -> None:
+    message = MESSAGES[name]
+    data = message.dumps()
+    assert benchmark(type(message).loads, data) == message
+
+
+@pytest.mark.parametrize(
+    "address", ["127.0.0.1", "::1", "example.com"], ids=["ipv4", "ipv6", "domain"]
+)
+def test_encode_address_cache_hit(benchmark: typing.Any, address: str) -> None:
+    cache = AddressCache()
+    encode_address(address, cache)
+    benchmark(encode_address, address, cache)
+    assert cache.info().misses == 1
+
+
+@pytest.mark.parametrize(
+    "address", ["127.0.0.1", "::1", "example.com"], ids=["ipv4", "ipv6", "domain"]
+)
+def test_encode_address_cache_miss(benchmark: typing.Any, address: str) -> None:
+    cache = AddressCache(maxsize=0)
+    benchmark(encode_address, address, cache)
+
+
+def test_decode_address_cache_hit(benchmark: typing.Any) -> None:
+    cache = AddressCache()
+    benchmark(decode_address, AddressType.IPV4, b"\x7f\x00\x00\x01", cache)
+
+
+def test_decode_address_cache_miss(benchmark: typing.Any) -> None:
+    cache = AddressCache(maxsize=0)
+    benchmark(decode_address, AddressType.IPV4, b"\x7f\x00\x00\x01", cache)
+
+
+BATCH_ADDRESSES = {
+    "repeated-hosts": [("10.0.0.{}".format(i % 30), 80) for i in range(1000)],
+    "distinct-hosts": [("host{}.example.com".format(i), 443) for i in range(1000)],
+}
+
+
+def dumps_each(
+    command: SOCKS5Command, addresses: typing.List[typing.Tuple[str, int]]
+) -> bytes:
+    return b"".join(
+        SOCKS5CommandRequest.from_address(command, address).dumps()
+        for address in addresses
+    )
+
+
+@pytest.mark.benchmark(group="socks5-command-batch")
+@pytest.mark.parametrize("hosts", list(BATCH_ADDRESSES))
+def test_socks5_command_dumps_each(benchmark: typing.Any, hosts: str) -> None:
+    addresses = BATCH_ADDRESSES[hosts]
+    expected = dumps_each(SOCKS5Command.CONNECT, addresses)
+    assert benchmark(dumps_each, SOCKS5Command.CONNECT, addresses) == expected
+
+
+@pytest.mark.benchmark(group="socks5-command-batch")
+@pytest.mark.parametrize("hosts", list(BATCH_ADDRESSES))
+def test_socks5_command_dumps_batch(benchmark: typing.Any, hosts: str) -> None:
+    addresses = BATCH_ADDRESSES[hosts]
+    buffer, offsets = benchmark(
+        SOCKS5CommandRequest.dumps_batch, SOCKS5Command.CONNECT, addresses
+    )
+    assert buffer == dumps_each(SOCKS5Command.CONNECT, addresses)
+    assert len(offsets) == len(addresses) + 1
+
+
+@pytest.mark.benchmark(group="socks4-request")
+@pytest.mark.parametrize("protocol", ["socks4", "socks4a"])
+def test_socks4_request_dumps(benchmark: typing.Any, protocol: str) -> None:
+    message = MESSAGES[protocol + "-request"]
+    request = type(message)(message.command, 80, message.addr)
+    assert benchmark(request.dumps, b"socksio") == message.dumps()
+
+
+@pytest.mark.benchmark(group="socks4-request")
+@pytest.mark.parametrize("protocol", ["socks4", "socks4a"])
+def test_socks4_request_template_dumps(benchmark: typing.Any, protocol: str) -> None:
+    message = MESSAGES[protocol + "-request"]
+    template = SOCKS4RequestTemplate(SOCKS4Command.CONNECT, b"socksio")
+    dumps = template.dumps if protocol == "socks4" else template.dumps_socks4a
+    assert benchmark(dumps, 80, message.addr) == message.dumps()
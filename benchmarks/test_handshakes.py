@@ -0,0 +1,110 @@
+import socket
+import typing
+
+import pytest
+
+from socksio import (
+    NEED_DATA,
+    SOCKS4ARequest,
+    SOCKS4Command,
+    SOCKS4Connection,
+    SOCKS4Reply,
+    SOCKS4ReplyCode,
+    SOCKS4Request,
+    SOCKS4ServerConnection,
+    SOCKS5AuthMethod,
+    SOCKS5AuthMethodsRequest,
+    SOCKS5AuthReply,
+    SOCKS5Command,
+    SOCKS5CommandRequest,
+    SOCKS5Connection,
+    SOCKS5Reply,
+    SOCKS5ReplyCode,
+    SOCKS5ServerConnection,
+    SOCKS5UsernamePasswordReply,
+    SOCKS5UsernamePasswordRequest,
+)
+
+Sockets = typing.Tuple[socket.socket, socket.socket]
+
+
+@pytest.fixture
+def sockets() -> typing.Iterator[Sockets]:
+    client, server = socket.socketpair()
+    with client, server:
+        yield client, server
+
+
+def transfer(source: socket.socket, destination: socket.socket, data: bytes) -> bytes:
+    """Sends data through the socket pair and returns what the peer received.
+    The handshake messages are small enough to arrive in a single read.
+    """
+    source.sendall(data)
+    return destination.recv(4096)
+
+
+def socks5_handshake(client: socket.socket, server: socket.socket, auth: bool) -> None:
+    """Runs a complete SOCKS5 handshake, stepping the client and the stub server
+    in turn on the same thread."""
+    conn = SOCKS5Connection()
+    server_conn = SOCKS5ServerConnection()
+    methods = [SOCKS5AuthMethod.NO_AUTH_REQUIRED]
+    if auth:
+        methods.append(SOCKS5AuthMethod.USERNAME_PASSWORD)
+    conn.send(SOCKS5AuthMethodsRequest(methods))
+    server_conn.receive_data(transfer(client, server, conn.data_to_send()))
+    server_conn.send(SOCKS5AuthReply(methods[-1]))
+    conn.receive_data(transfer(server, client, server_conn.data_to_send()))
+    if auth:
+        conn.send(SOCKS5UsernamePasswordRequest(b"user", b"pass"))
+        server_conn.receive_data(transfer(client, server, conn.data_to_send()))
+        server_conn.send(SOCKS5UsernamePasswordReply(True))
+        conn.receive_data(transfer(server, client, server_conn.data_to_send()))
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.example:80"))
+    server_conn.receive_data(transfer(client, server, conn.data_to_send()))
+    server_conn.send(
+        SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, ("127.0.0.1", 1080))
+    )
+    reply = conn.receive_data(transfer(server, client, server_conn.data_to_send()))
+    assert isinstance(reply, SOCKS5Reply)
+
+
+def socks4_handshake(
+    client: socket.socket, server: socket.socket, socks4a: bool
+) -> None:
+    conn = SOCKS4Connection(user_id=b"socksio")
+    server_conn = SOCKS4ServerConnection()
+    if socks4a:
+        conn.send(SOCKS4ARequest.from_address(SOCKS4Command.CONNECT, "a.example:80"))
+    else:
+        conn.send(SOCKS4Request.from_address(SOCKS4Command.CONNECT, "127.0.0.1:80"))
+    request = server_conn.receive_data(transfer(client, server, conn.data_to_send()))
+    assert request is not NEED_DATA
+    server_conn.send(SOCKS4Reply(SOCKS4ReplyCode.REQUEST_GRANTED, 0, None))
+    conn.receive_data(transfer(server, client, server_conn.data_to_send()))
+
+
+@pytest.mark.parametrize("auth", [False, True], ids=["no-auth", "username-password"])
+def test_socks5_handshake(benchmark: typing.Any, sockets: Sockets, auth: bool) -> None:
+    benchmark(socks5_handshake, *sockets, auth)
+
+
+@pytest.mark.parametrize("socks4a", [False, True], ids=["socks4", "socks4a"])
+def test_socks4_handshake(
+    benchmark: typing.Any, sockets: Sockets, socks4a: bool
+) -> None:
+    benchmark(socks4_handshake, *sockets, socks4a)
+
+
+def test_socks5_data_to_send(benchmark: typing.Any) -> None:
+    conn = SOCKS5Connection()
+    conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.NO_AUTH_REQUIRED]))
+    conn.data_to_send()
+    conn.receive_data(b"\x05\x00")
+    request = SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.example:80")
+
+    def send() -> bytes:
+        conn.send(request)
+        return conn.data_to_send()
+
+    assert benchmark(send) == request.dumps()
@@ -1,8 +1,19 @@
+import glob
+import os
+import shutil
+
 import nox
 
 nox.options.stop_on_first_error = True
 
-source_files = ("socksio", "tests/", "noxfile.py", "examples/", "docs/source/")
+source_files = (
+    "socksio",
+    "tests/",
+    "benchmarks/",
+    "noxfile.py",
+    "examples/",
+    "docs/source/",
+)
 
 
 @nox.session()
@@ -35,6 +46,68 @@ def test(session):
     session.run("python", "-m", "pytest", *session.posargs)
 
 
+@nox.session()
+def test_compiled(session):
+    """Runs the tests against the mypyc compiled accelerator module.
+
+    The module is compiled in a copy of the package, the extension modules are
+    then copied next to ``socksio/_codec.py`` for the run and removed after it.
+    """
+    session.install("-r", "test-requirements.txt", "mypy", "setuptools")
+    build_dir = session.create_tmp()
+    shutil.rmtree(os.path.join(build_dir, "socksio"), ignore_errors=True)
+    shutil.copytree("socksio", os.path.join(build_dir, "socksio"))
+    with session.chdir(build_dir):
+        session.run("mypyc", "socksio/_codec.py")
+
+    extensions = []
+    for pattern in ("_codec*.so", "_codec*.pyd"):
+        for path in glob.glob(os.path.join(build_dir, "socksio", pattern)):
+            extensions.append(shutil.copy(path, "socksio"))
+    try:
+        session.run(
+            "python", "-m", "pytest", *session.posargs, env={"SOCKSIO_COMPILED": "1"}
+        )
+    finally:
+        for path in extensions:
+            os.remove(path)
+
+
+@nox.session(reuse_venv=True)
+def benchmark(session):
+    """Runs the benchmarks and compares them against the saved baseline.
+
+    Run ``nox -s benchmark -- --save`` to record a new baseline first, the run
+    fails if the median of any benchmark is more than 20% slower than it.
+    """
+    session.install("-r", "test-requirements.txt", "pytest-benchmark", ".")
+    args = [
+        "python",
+        "-m",
+        "pytest",
+        "-o",
+        "addopts=",
+        "--benchmark-storage=.benchmarks",
+        "--benchmark-sort=name",
+    ]
+    if "--save" in session.posargs:
+        args.append("--benchmark-save=baseline")
+    else:
+        args.extend(["--benchmark-compare", "--benchmark-compare-fail=median:20%"])
+    args.extend(arg for arg in session.posargs if arg != "--save")
+    session.run(*args, "benchmarks/")
+
+
+@nox.session(reuse_venv=True)
+def importtime(session):
+    """Reports the time taken to import socksio, measured with -X importtime.
+
+    Pass ``-- --max-import MICROSECONDS`` to fail if a bare ``import socksio``
+    loads a protocol module or takes longer than that.
+    """
+    session.run("python", "benchmarks/importtime.py", *session.posargs)
+
+
 @nox.session(reuse_venv=True)
 def docs(session):
     session.install("sphinx", "sphinx_rtd_theme", ".")
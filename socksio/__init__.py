@@ -1,36 +1,106 @@
 """Sans-I/O implementation of SOCKS4, SOCKS4A, and SOCKS5."""
 
+import importlib
+import sys
+import typing
+
 from .exceptions import ProtocolError, SOCKSError
-from .socks4 import (
-    SOCKS4ARequest,
-    SOCKS4Command,
-    SOCKS4Connection,
-    SOCKS4Reply,
-    SOCKS4ReplyCode,
-    SOCKS4Request,
-)
-from .socks5 import (
-    SOCKS5AType,
-    SOCKS5AuthMethod,
-    SOCKS5AuthMethodsRequest,
-    SOCKS5AuthReply,
-    SOCKS5Command,
-    SOCKS5CommandRequest,
-    SOCKS5Connection,
-    SOCKS5Reply,
-    SOCKS5ReplyCode,
-    SOCKS5UsernamePasswordRequest,
-)
+
+# Submodules are imported on first access of one of their names, so programs
+# only using one protocol don't pay for loading the others.
+_LAZY_ATTRIBUTES = {
+    "SOCKS4ARequest": "socks4",
+    "SOCKS4Command": "socks4",
+    "SOCKS4Connection": "socks4",
+    "SOCKS4Reply": "socks4",
+    "SOCKS4ReplyCode": "socks4",
+    "SOCKS4Request": "socks4",
+    "SOCKS4RequestTemplate": "socks4",
+    "SOCKS4ServerConnection": "socks4",
+    "SOCKS5AType": "socks5",
+    "SOCKS5AuthMethod": "socks5",
+    "SOCKS5AuthMethodsRequest": "socks5",
+    "SOCKS5AuthReply": "socks5",
+    "SOCKS5Command": "socks5",
+    "SOCKS5CommandRequest": "socks5",
+    "SOCKS5Connection": "socks5",
+    "SOCKS5Datagram": "socks5",
+    "SOCKS5ReassemblyQueue": "socks5",
+    "SOCKS5Reply": "socks5",
+    "SOCKS5ReplyCode": "socks5",
+    "SOCKS5ServerConnection": "socks5",
+    "SOCKS5UsernamePasswordReply": "socks5",
+    "SOCKS5UsernamePasswordRequest": "socks5",
+    "NEED_DATA": "utils",
+    "NeedData": "utils",
+}
+
+# Submodules the package used to import eagerly, which made them available as
+# attributes after a bare "import socksio".
+_SUBMODULES = ("compat", "socks4", "socks5", "utils")
+
+if typing.TYPE_CHECKING or sys.version_info < (3, 7):
+    # Module level __getattr__ (PEP 562) requires Python 3.7.
+    from .socks4 import (
+        SOCKS4ARequest,
+        SOCKS4Command,
+        SOCKS4Connection,
+        SOCKS4Reply,
+        SOCKS4ReplyCode,
+        SOCKS4Request,
+        SOCKS4RequestTemplate,
+        SOCKS4ServerConnection,
+    )
+    from .socks5 import (
+        SOCKS5AType,
+        SOCKS5AuthMethod,
+        SOCKS5AuthMethodsRequest,
+        SOCKS5AuthReply,
+        SOCKS5Command,
+        SOCKS5CommandRequest,
+        SOCKS5Connection,
+        SOCKS5Datagram,
+        SOCKS5ReassemblyQueue,
+        SOCKS5Reply,
+        SOCKS5ReplyCode,
+        SOCKS5ServerConnection,
+        SOCKS5UsernamePasswordReply,
+        SOCKS5UsernamePasswordRequest,
+    )
+    from .utils import NEED_DATA, NeedData
+else:
+
+    def __getattr__(name: str) -> typing.Any:
+        if name in _SUBMODULES:
+            return importlib.import_module("." + name, __name__)
+        try:
+            module_name = _LAZY_ATTRIBUTES[name]
+        except KeyError:
+            raise AttributeError(
+                "module {!r} has no attribute {!r}".format(__name__, name)
+            ) from None
+        # Same as "from .module_name import name", unlike importlib.import_module()
+        # this is reported by python -X importtime.
+        module = __import__(module_name, globals(), None, (name,), 1)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    def __dir__() -> typing.List[str]:
+        return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_SUBMODULES))
+
 
 __version__ = "1.0.0"
 
 __all__ = [
     "SOCKS4Request",
     "SOCKS4ARequest",
+    "SOCKS4RequestTemplate",
     "SOCKS4Reply",
     "SOCKS4Connection",
     "SOCKS4Command",
     "SOCKS4ReplyCode",
+    "SOCKS4ServerConnection",
     "SOCKS5AType",
     "SOCKS5AuthMethodsRequest",
     "SOCKS5AuthReply",
@@ -38,9 +108,15 @@ __all__ = [
     "SOCKS5Connection",
     "SOCKS5Command",
     "SOCKS5CommandRequest",
+    "SOCKS5Datagram",
+    "SOCKS5ReassemblyQueue",
     "SOCKS5ReplyCode",
     "SOCKS5Reply",
+    "SOCKS5ServerConnection",
+    "SOCKS5UsernamePasswordReply",
     "SOCKS5UsernamePasswordRequest",
     "SOCKSError",
     "ProtocolError",
+    "NEED_DATA",
+    "NeedData",
 ]
@@ -0,0 +1,181 @@
+"""Encoding and decoding of the frames packed and parsed for every tunnel.
+
+The functions only take and return builtin types so the module can be compiled
+with mypyc, ``mypyc socksio/_codec.py`` in a source checkout. Python imports the
+compiled extension module instead of this file when it is present.
+"""
+
+import socket
+import struct
+import typing
+
+from ._types import ReadableBuffer
+from .exceptions import ProtocolError
+
+IPV4 = 1
+DOMAIN_NAME = 3
+IPV6 = 4
+
+IPV4_CHARACTERS = "0123456789."
+MAX_DOMAIN_NAME_LENGTH = 255
+
+
+def is_compiled() -> bool:
+    """Returns whether the compiled accelerator module is in use."""
+    return not __file__.endswith(".py")
+
+
+def pack_port(port: int) -> bytes:
+    if not 0 <= port <= 0xFFFF:
+        raise struct.error("'H' format requires 0 <= number <= 65535")
+    return bytes((port >> 8, port & 0xFF))
+
+
+def pack_socks5_command(command: int, atype: int, addr: bytes, port: int) -> bytes:
+    """Packs a SOCKS5 command request for an address already encoded for
+    ``atype``, one of ``IPV4``, ``DOMAIN_NAME`` or ``IPV6``.
+    """
+    if atype == DOMAIN_NAME:
+        header = bytes((5, command, 0, atype, len(addr)))
+    else:
+        assert len(addr) == (4 if atype == IPV4 else 16)
+        header = bytes((5, command, 0, atype))
+    return header + addr + pack_port(port)
+
+
+def socks5_frame_length(
+    data: ReadableBuffer, offset: int = 0, kind: str = "frame"
+) -> typing.Optional[int]:
+    """Returns the total length of a frame laid out as VER, CMD/REP, RSV, ATYP,
+    ADDR and PORT starting at ``offset``, or None if not enough data is available
+    to determine it.
+
+    Args:
+        data: The buffer holding the frame.
+        offset: The position of the frame within ``data``.
+        kind: What the frame is, "request", "reply" or "datagram", named in the
+            error message.
+
+    Raises:
+        ProtocolError: If the address type is unknown.
+    """
+    if len(data) - offset < 5:
+        return None
+    atype: int = data[offset + 3]
+    if atype == IPV4:
+        return 10
+    elif atype == IPV6:
+        return 22
+    elif atype == DOMAIN_NAME:
+        length: int = data[offset + 4]
+        return 7 + length
+    raise ProtocolError("Malformed " + kind)
+
+
+def unpack_socks5_reply(
+    data: ReadableBuffer, offset: int
+) -> typing.Tuple[int, int, typing.Optional[str], int, int, int]:
+    """Unpacks the fields of a SOCKS5 reply spanning ``data`` from ``offset``.
+
+    Returns:
+        The reply code and address type bytes, the address decoded if it is an
+        IPv4 address and ``None`` otherwise, the offset and length of the
+        encoded address and the port.
+
+    Raises:
+        ProtocolError: If the frame length or version does not match the spec.
+    """
+    end = len(data)
+    if end - offset != socks5_frame_length(data, offset, "reply"):
+        raise ProtocolError("Malformed reply")
+    version: int = data[offset]
+    if version != 5:
+        raise ProtocolError("Malformed reply")
+    code: int = data[offset + 1]
+    atype: int = data[offset + 3]
+    high: int = data[end - 2]
+    low: int = data[end - 1]
+    port = high << 8 | low
+    if atype == IPV4:
+        return code, atype, format_ipv4(data, offset + 4), offset + 4, 4, port
+    elif atype == DOMAIN_NAME:
+        return code, atype, None, offset + 5, end - offset - 7, port
+    return code, atype, None, offset + 4, end - offset - 6, port
+
+
+def unpack_socks4_reply(
+    data: ReadableBuffer, offset: int
+) -> typing.Tuple[int, int, str]:
+    """Unpacks the reply code byte, the port and the address of a SOCKS4 reply
+    spanning ``data`` from ``offset``.
+
+    Raises:
+        ProtocolError: If the frame length or version does not match the spec.
+    """
+    if len(data) - offset != 8:
+        raise ProtocolError("Malformed reply")
+    version: int = data[offset]
+    if version != 0:
+        raise ProtocolError("Malformed reply")
+    code: int = data[offset + 1]
+    high: int = data[offset + 2]
+    low: int = data[offset + 3]
+    return code, high << 8 | low, format_ipv4(data, offset + 4)
+
+
+def format_ipv4(data: ReadableBuffer, offset: int) -> str:
+    """Returns the dotted notation of the IPv4 address at ``offset``."""
+    first: int = data[offset]
+    second: int = data[offset + 1]
+    third: int = data[offset + 2]
+    fourth: int = data[offset + 3]
+    return "%d.%d.%d.%d" % (first, second, third, fourth)
+
+
+def encode_host(addr: str) -> typing.Tuple[int, bytes]:
+    """Determines the type of address and encodes it into the format SOCKS expects.
+
+    Returns:
+        The SOCKS5 address type, ``IPV4``, ``DOMAIN_NAME`` or ``IPV6``, and the
+        encoded address.
+
+    Raises:
+        ValueError: If a domain name is not valid IDNA or too long.
+    """
+    # Classify on the characters first so domain names, the common case,
+    # never go through inet_pton() and the exceptions it raises.
+    if ":" in addr:
+        try:
+            return IPV6, socket.inet_pton(socket.AF_INET6, addr)
+        except OSError:
+            pass
+    elif addr and not addr.lstrip(IPV4_CHARACTERS):
+        try:
+            return IPV4, socket.inet_pton(socket.AF_INET, addr)
+        except OSError:
+            pass
+    return DOMAIN_NAME, encode_domain_name(addr)
+
+
+def encode_domain_name(name: str) -> bytes:
+    """Encodes a domain name, converting non-ASCII names to IDNA (punycode).
+
+    Args:
+        name: The domain name to encode.
+
+    Returns:
+        The encoded domain name.
+
+    Raises:
+        ValueError: If the name is not valid IDNA or longer than the 255
+            bytes SOCKS allows.
+    """
+    try:
+        encoded = name.encode("ascii")
+    except UnicodeEncodeError:
+        encoded = name.encode("idna")
+    if len(encoded) > MAX_DOMAIN_NAME_LENGTH:
+        raise ValueError(
+            "Domain name is longer than {} bytes".format(MAX_DOMAIN_NAME_LENGTH)
+        )
+    return encoded
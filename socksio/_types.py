@@ -1,3 +1,5 @@
 import typing
 
 StrOrBytes = typing.Union[str, bytes]
+ReadableBuffer = typing.Union[bytes, bytearray, memoryview]
+WritableBuffer = typing.Union[bytearray, memoryview]
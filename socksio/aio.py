@@ -0,0 +1,681 @@
+"""Client helpers driving the sans-I/O connections over asyncio streams."""
+
+import asyncio
+import collections
+import time
+import typing
+
+from .exceptions import ProtocolError, SOCKSError
+from .handshake import (
+    Address,
+    AsyncioStream,
+    HopTiming,
+    ProxyHop,
+    chain_handshake,
+    check_protocol,
+    flush,
+    socks4_handshake,
+    socks5_auth_replies,
+    socks5_authenticate,
+    socks5_bind,
+    socks5_command_reply,
+    socks5_connect,
+    socks5_pipelined_connection,
+)
+from .socks5 import SOCKS5Command, SOCKS5CommandRequest, SOCKS5Connection
+from .utils import get_address_port_tuple_from_address
+
+Streams = typing.Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+async def open_connection(
+    proxy: Address,
+    target: Address,
+    *,
+    protocol: str = "socks5",
+    auth: typing.Optional[typing.Tuple[bytes, bytes]] = None,
+    user_id: typing.Optional[bytes] = None,
+    connect_timeout: typing.Optional[float] = None,
+    auth_timeout: typing.Optional[float] = None,
+    command_timeout: typing.Optional[float] = None,
+    pipelined: bool = False,
+) -> Streams:
+    """Opens a tunnel to ``target`` through the SOCKS proxy at ``proxy``.
+
+    Args:
+        proxy: The proxy address as a 'HOST:PORT' string or a (host, port) tuple.
+        target: The address to connect to through the proxy, in the same forms.
+        protocol: One of 'socks4', 'socks4a' or 'socks5'.
+        auth: Optional (username, password) for SOCKS5 username/password
+            authentication.
+        user_id: The user ID to send to SOCKS4 and SOCKS4A proxies.
+        connect_timeout: Timeout in seconds to establish the TCP connection.
+        auth_timeout: Timeout in seconds for the SOCKS5 method negotiation and
+            authentication.
+        command_timeout: Timeout in seconds for the CONNECT request.
+        pipelined: Sends the SOCKS5 authentication and CONNECT requests in a single
+            flight without waiting for each reply. Only a single authentication
+            method is offered to the proxy, username/password if ``auth`` is given.
+
+    Returns:
+        A (reader, writer) pair for the established tunnel.
+
+    Raises:
+        SOCKSError: If the proxy rejects the authentication or the request, or no
+            user ID was given for SOCKS4.
+        ProtocolError: If the proxy sends malformed data or closes the connection.
+        asyncio.TimeoutError: If any of the phases times out.
+    """
+    check_protocol(protocol, user_id)
+
+    proxy_host, proxy_port = get_address_port_tuple_from_address(proxy)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(proxy_host, proxy_port), connect_timeout
+    )
+    try:
+        stream = AsyncioStream(reader, writer)
+        if protocol == "socks5":
+            await _socks5_handshake(
+                stream, target, auth, auth_timeout, command_timeout, pipelined
+            )
+        else:
+            assert user_id is not None
+            await asyncio.wait_for(
+                socks4_handshake(
+                    stream, target, user_id=user_id, socks4a=protocol == "socks4a"
+                ),
+                command_timeout,
+            )
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def open_connection_chain(
+    hops: typing.Sequence[ProxyHop],
+    target: Address,
+    *,
+    connect_timeout: typing.Optional[float] = None,
+    handshake_timeout: typing.Optional[float] = None,
+) -> typing.Tuple[asyncio.StreamReader, asyncio.StreamWriter, typing.List[HopTiming]]:
+    """Opens a tunnel to ``target`` through a chain of SOCKS proxies, see
+    :func:`socksio.handshake.chain_handshake`.
+
+    Args:
+        hops: The proxies to go through, in order.
+        target: The address to connect to through the last proxy.
+        connect_timeout: Timeout in seconds to establish the TCP connection to the
+            first proxy.
+        handshake_timeout: Timeout in seconds for the handshakes with all the
+            proxies.
+
+    Returns:
+        A (reader, writer, timings) tuple for the established tunnel, with the
+        handshake timing of each proxy.
+
+    Raises:
+        SOCKSError: If any proxy rejects the authentication or the request.
+        ProtocolError: If any proxy sends malformed data or closes the connection.
+        asyncio.TimeoutError: If connecting or the handshakes time out.
+    """
+    if not hops:
+        raise ValueError("At least one proxy is required")
+    proxy_host, proxy_port = get_address_port_tuple_from_address(hops[0].address)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(proxy_host, proxy_port), connect_timeout
+    )
+    try:
+        timings = await asyncio.wait_for(
+            chain_handshake(AsyncioStream(reader, writer), hops, target),
+            handshake_timeout,
+        )
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer, timings
+
+
+class SOCKS5Bind:
+    """A SOCKS5 BIND request waiting for the peer to connect to the proxy,
+    returned by :func:`open_bind`.
+
+    Attributes:
+        address: The (host, port) the proxy listens on, to be passed to the peer.
+        peer_address: The (host, port) of the peer once it has connected, ``None``
+            until then.
+        reader: The reader of the connection to the proxy.
+        writer: The writer of the connection to the proxy.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        conn: SOCKS5Connection,
+        address: typing.Tuple[str, int],
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.address = address
+        self.peer_address: typing.Optional[typing.Tuple[str, int]] = None
+        self._conn = conn
+
+    async def accept(self, timeout: typing.Optional[float] = None) -> Streams:
+        """Waits for the second reply of the proxy, sent once the peer connected.
+
+        The wait can run in a task of its own while the address is handed to the
+        peer, e.g. ``asyncio.ensure_future(bind.accept())``.
+
+        Args:
+            timeout: Timeout in seconds to wait for the peer.
+
+        Returns:
+            A (reader, writer) pair for the tunnel to the peer.
+
+        Raises:
+            SOCKSError: If the proxy reports a failure instead of a connection.
+            ProtocolError: If the proxy sends malformed data or closes the
+                connection.
+            asyncio.TimeoutError: If the peer does not connect in time.
+        """
+        try:
+            reply = await asyncio.wait_for(
+                socks5_command_reply(
+                    AsyncioStream(self.reader, self.writer), self._conn
+                ),
+                timeout,
+            )
+        except BaseException:
+            self.writer.close()
+            raise
+        self.peer_address = (reply.addr, reply.port)
+        return self.reader, self.writer
+
+    def close(self) -> None:
+        """Closes the connection to the proxy, cancelling the BIND request."""
+        self.writer.close()
+
+
+async def open_bind(
+    proxy: Address,
+    target: Address,
+    *,
+    auth: typing.Optional[typing.Tuple[bytes, bytes]] = None,
+    connect_timeout: typing.Optional[float] = None,
+    auth_timeout: typing.Optional[float] = None,
+    command_timeout: typing.Optional[float] = None,
+) -> SOCKS5Bind:
+    """Asks the SOCKS5 proxy at ``proxy`` to accept a connection from ``target``,
+    as used by protocols where the server connects back to the client.
+
+    The proxy replies twice, this returns after the first reply with the address
+    the proxy listens on. :meth:`SOCKS5Bind.accept` waits for the second one.
+
+    .. code:: python
+
+        bind = await open_bind("localhost:1080", ("ftp.example.com", 0))
+        send_port_command(bind.address)
+        reader, writer = await bind.accept(timeout=30)
+
+    Args:
+        proxy: The proxy address as a 'HOST:PORT' string or a (host, port) tuple.
+        target: The address of the peer expected to connect, in the same forms.
+        auth: Optional (username, password) for username/password
+            authentication.
+        connect_timeout: Timeout in seconds to establish the TCP connection.
+        auth_timeout: Timeout in seconds for the method negotiation and
+            authentication.
+        command_timeout: Timeout in seconds for the first reply to the BIND
+            request.
+
+    Returns:
+        The BIND request, waiting for the peer.
+
+    Raises:
+        SOCKSError: If the proxy rejects the authentication or the request.
+        ProtocolError: If the proxy sends malformed data or closes the connection.
+        asyncio.TimeoutError: If any of the phases times out.
+    """
+    proxy_host, proxy_port = get_address_port_tuple_from_address(proxy)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(proxy_host, proxy_port), connect_timeout
+    )
+    conn = SOCKS5Connection()
+    try:
+        stream = AsyncioStream(reader, writer)
+        await asyncio.wait_for(socks5_authenticate(stream, conn, auth), auth_timeout)
+        reply = await asyncio.wait_for(
+            socks5_bind(stream, conn, target), command_timeout
+        )
+    except BaseException:
+        writer.close()
+        raise
+    return SOCKS5Bind(reader, writer, conn, (reply.addr, reply.port))
+
+
+async def _socks5_handshake(
+    stream: AsyncioStream,
+    target: Address,
+    auth: typing.Optional[typing.Tuple[bytes, bytes]],
+    auth_timeout: typing.Optional[float],
+    command_timeout: typing.Optional[float],
+    pipelined: bool = False,
+) -> None:
+    if pipelined:
+        conn = socks5_pipelined_connection(target, auth)
+        await flush(stream, conn)
+        await asyncio.wait_for(socks5_auth_replies(stream, conn, auth), auth_timeout)
+        await asyncio.wait_for(socks5_command_reply(stream, conn), command_timeout)
+        return
+
+    conn = SOCKS5Connection()
+    await asyncio.wait_for(socks5_authenticate(stream, conn, auth), auth_timeout)
+    await asyncio.wait_for(socks5_connect(stream, conn, target), command_timeout)
+
+
+class ProxyLatencyTracker:
+    """Tracks the handshake latency of proxies so the fastest is tried first.
+
+    Latencies are smoothed with an exponentially weighted moving average. A proxy
+    whose last attempt failed is tried after all the others until it succeeds
+    again.
+
+    Args:
+        smoothing: Weight of each new sample in the moving average, between 0
+            and 1.
+    """
+
+    def __init__(self, smoothing: float = 0.3) -> None:
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be between 0 and 1")
+        self.smoothing = smoothing
+        self._latencies: typing.Dict[typing.Tuple[str, int], float] = {}
+        self._failed: typing.Set[typing.Tuple[str, int]] = set()
+
+    def record(self, proxy: Address, latency: float) -> None:
+        """Records the time in seconds a handshake through ``proxy`` took."""
+        key = get_address_port_tuple_from_address(proxy)
+        previous = self._latencies.get(key)
+        if previous is not None:
+            latency = previous + self.smoothing * (latency - previous)
+        self._latencies[key] = latency
+        self._failed.discard(key)
+
+    def record_lower_bound(self, proxy: Address, latency: float) -> None:
+        """Records that a handshake through ``proxy`` was abandoned after
+        ``latency`` seconds, so it takes at least that long.
+
+        The smoothed latency is only ever raised and a recorded failure is kept.
+        """
+        key = get_address_port_tuple_from_address(proxy)
+        previous = self._latencies.get(key)
+        if previous is None or previous < latency:
+            self._latencies[key] = latency
+
+    def record_failure(self, proxy: Address) -> None:
+        """Records a failed handshake through ``proxy``."""
+        self._failed.add(get_address_port_tuple_from_address(proxy))
+
+    def latency(self, proxy: Address) -> typing.Optional[float]:
+        """Returns the smoothed latency of ``proxy``, None if never measured."""
+        return self._latencies.get(get_address_port_tuple_from_address(proxy))
+
+    def sort(
+        self, proxies: typing.Iterable[Address]
+    ) -> typing.List[typing.Tuple[str, int]]:
+        """Returns the proxies in the order they should be tried: fastest first,
+        then those never measured in their original order, then those whose last
+        attempt failed.
+        """
+        keys = [get_address_port_tuple_from_address(proxy) for proxy in proxies]
+
+        def sort_key(item: typing.Tuple[int, typing.Tuple[str, int]]) -> typing.Any:
+            index, key = item
+            latency = self._latencies.get(key)
+            return (key in self._failed, latency is None, latency or 0.0, index)
+
+        return [key for _, key in sorted(enumerate(keys), key=sort_key)]
+
+
+async def open_connection_racing(
+    proxies: typing.Iterable[Address],
+    target: Address,
+    *,
+    happy_eyeballs_delay: float = 0.25,
+    latency_tracker: typing.Optional[ProxyLatencyTracker] = None,
+    auth: typing.Optional[typing.Tuple[bytes, bytes]] = None,
+    connect_timeout: typing.Optional[float] = None,
+    auth_timeout: typing.Optional[float] = None,
+    command_timeout: typing.Optional[float] = None,
+    pipelined: bool = False,
+) -> Streams:
+    """Opens a tunnel to ``target`` through whichever of several SOCKS5 proxies
+    completes the handshake first.
+
+    Handshakes are started one proxy at a time, ``happy_eyeballs_delay`` seconds
+    apart or as soon as the previous attempt fails, as in RFC 8305. The first
+    successful tunnel is returned and the other attempts are cancelled.
+
+    Args:
+        proxies: The proxy addresses as 'HOST:PORT' strings or (host, port) tuples,
+            in order of preference.
+        target: The address to connect to through the proxy, in the same forms.
+        happy_eyeballs_delay: Seconds to wait for an attempt before starting the
+            next one in parallel.
+        latency_tracker: Optional tracker recording the latency of every attempt
+            and reordering ``proxies`` to try the fastest first.
+        auth: Optional (username, password) for username/password
+            authentication, sent to every proxy.
+        connect_timeout: Timeout in seconds to establish each TCP connection.
+        auth_timeout: Timeout in seconds for each method negotiation and
+            authentication.
+        command_timeout: Timeout in seconds for each CONNECT request.
+        pipelined: Sends the authentication and CONNECT requests in a single
+            flight, see :func:`open_connection`.
+
+    Returns:
+        A (reader, writer) pair for the established tunnel.
+
+    Raises:
+        SOCKSError: If the handshakes through all the proxies fail, chained to the
+            error of the last attempt.
+        ValueError: If no proxy is given or ``target`` is not a valid address.
+    """
+    if latency_tracker is not None:
+        candidates = latency_tracker.sort(proxies)
+    else:
+        candidates = [get_address_port_tuple_from_address(proxy) for proxy in proxies]
+    if not candidates:
+        raise ValueError("At least one proxy is required")
+    # An invalid target fails the same way through every proxy, reject it before
+    # any attempt can be recorded as a failure of the proxy.
+    SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, target).dumps()
+
+    winner_proxy: typing.Optional[typing.Tuple[str, int]] = None
+
+    async def attempt(proxy: typing.Tuple[str, int]) -> Streams:
+        start = time.monotonic()
+        try:
+            streams = await open_connection(
+                proxy,
+                target,
+                auth=auth,
+                connect_timeout=connect_timeout,
+                auth_timeout=auth_timeout,
+                command_timeout=command_timeout,
+                pipelined=pipelined,
+            )
+        except asyncio.CancelledError:
+            # Lost the race, the proxy is at least as slow as the winner, which
+            # may have started later.
+            if latency_tracker is not None and winner_proxy is not None:
+                winner_latency = latency_tracker.latency(winner_proxy) or 0.0
+                latency_tracker.record_lower_bound(
+                    proxy, max(time.monotonic() - start, winner_latency)
+                )
+            raise
+        except (OSError, asyncio.TimeoutError, SOCKSError):
+            # Only connection and handshake errors are the proxy's fault.
+            if latency_tracker is not None:
+                latency_tracker.record_failure(proxy)
+            raise
+        if latency_tracker is not None:
+            latency_tracker.record(proxy, time.monotonic() - start)
+        return streams
+
+    remaining = iter(candidates)
+    next_proxy = next(remaining, None)
+    attempts: typing.Dict["asyncio.Future[Streams]", typing.Tuple[str, int]] = {}
+    pending: typing.Set["asyncio.Future[Streams]"] = set()
+    errors: typing.List[typing.Tuple[typing.Tuple[str, int], BaseException]] = []
+    winner: typing.Optional[Streams] = None
+    try:
+        while winner is None and (next_proxy is not None or pending):
+            if next_proxy is not None:
+                task = asyncio.ensure_future(attempt(next_proxy))
+                attempts[task] = next_proxy
+                pending.add(task)
+                next_proxy = next(remaining, None)
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=happy_eyeballs_delay if next_proxy is not None else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for future in done:
+                exc = future.exception()
+                if exc is not None:
+                    errors.append((attempts[future], exc))
+                elif winner is None:
+                    winner = future.result()
+                    winner_proxy = attempts[future]
+                else:
+                    future.result()[1].close()
+    finally:
+        for future in pending:
+            future.cancel()
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if isinstance(result, tuple):
+                result[1].close()
+
+    if winner is None:
+        raise SOCKSError(
+            "Could not connect through any proxy: {}".format(
+                "; ".join(
+                    "{}:{}: {!r}".format(host, port, exc)
+                    for (host, port), exc in errors
+                )
+            )
+        ) from errors[-1][1]
+    return winner
+
+
+class _IdleConnection(typing.NamedTuple):
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    conn: SOCKS5Connection
+    idle_since: float
+
+
+HealthCheck = typing.Callable[
+    [asyncio.StreamReader, asyncio.StreamWriter], typing.Awaitable[bool]
+]
+
+
+class SOCKS5ConnectionPool:
+    """Pool of SOCKS5 proxy connections that have already been authenticated.
+
+    Each idle connection has completed the method negotiation and, if required,
+    the username/password exchange, so opening a tunnel only costs the CONNECT
+    round trip. A connection leaves the pool once it is used for a tunnel and
+    the pool opens a replacement in the background.
+
+    Args:
+        proxy: The proxy address as a 'HOST:PORT' string or a (host, port) tuple.
+        auth: Optional (username, password) for username/password authentication.
+        max_size: The maximum number of idle connections kept open.
+        idle_ttl: Seconds after which an idle connection is closed, None to keep
+            idle connections open until the pool is closed.
+        health_check: Optional coroutine function called with the (reader, writer)
+            of an idle connection before it is handed out, returning False or
+            raising an exception evicts the connection.
+        replenish: Whether to open a replacement connection in the background each
+            time an idle connection is handed out.
+        connect_timeout: Timeout in seconds to establish the TCP connection.
+        auth_timeout: Timeout in seconds for the method negotiation and
+            authentication.
+        command_timeout: Timeout in seconds for the CONNECT request.
+    """
+
+    def __init__(
+        self,
+        proxy: Address,
+        *,
+        auth: typing.Optional[typing.Tuple[bytes, bytes]] = None,
+        max_size: int = 10,
+        idle_ttl: typing.Optional[float] = 60.0,
+        health_check: typing.Optional[HealthCheck] = None,
+        replenish: bool = True,
+        connect_timeout: typing.Optional[float] = None,
+        auth_timeout: typing.Optional[float] = None,
+        command_timeout: typing.Optional[float] = None,
+    ) -> None:
+        self.proxy = get_address_port_tuple_from_address(proxy)
+        self.auth = auth
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.health_check = health_check
+        self.replenish = replenish
+        self.connect_timeout = connect_timeout
+        self.auth_timeout = auth_timeout
+        self.command_timeout = command_timeout
+
+        self._idle: typing.Deque[_IdleConnection] = collections.deque()
+        self._pending: typing.Set["asyncio.Future[None]"] = set()
+        self._closed = False
+
+    @property
+    def idle_count(self) -> int:
+        """Returns the number of idle authenticated connections in the pool."""
+        return len(self._idle)
+
+    async def __aenter__(self) -> "SOCKS5ConnectionPool":
+        return self
+
+    async def __aexit__(self, *args: typing.Any) -> None:
+        await self.aclose()
+
+    async def fill(self, count: typing.Optional[int] = None) -> None:
+        """Opens authenticated connections until ``count`` are idle, by default
+        up to ``max_size``.
+        """
+        self.evict_expired()
+        target = self.max_size if count is None else min(count, self.max_size)
+        missing = target - len(self._idle)
+        if missing > 0:
+            await asyncio.gather(*[self._add_connection() for _ in range(missing)])
+
+    async def open_connection(self, target: Address) -> Streams:
+        """Opens a tunnel to ``target`` using an idle authenticated connection if
+        one is available, otherwise a freshly authenticated one.
+
+        Args:
+            target: The address to connect to through the proxy.
+
+        Returns:
+            A (reader, writer) pair for the established tunnel.
+
+        Raises:
+            SOCKSError: If the proxy rejects the authentication or the request.
+            ProtocolError: If the proxy sends malformed data or closes the
+                connection.
+            asyncio.TimeoutError: If any of the phases times out.
+        """
+        if self._closed:
+            raise SOCKSError("Connection pool is closed")
+
+        idle = await self._acquire()
+        if idle is not None:
+            if self.replenish:
+                self._spawn_replacement()
+            try:
+                return await self._connect(idle, target)
+            except (ProtocolError, ConnectionError):
+                # The proxy may have dropped the idle connection in the meantime,
+                # retry once on a new connection.
+                pass
+        return await self._connect(await self._authenticate(), target)
+
+    def evict_expired(self) -> None:
+        """Closes idle connections older than ``idle_ttl`` or already closed."""
+        now = time.monotonic()
+        for idle in list(self._idle):
+            if self._is_expired(idle, now):
+                self._idle.remove(idle)
+                idle.writer.close()
+
+    async def aclose(self) -> None:
+        """Closes all the idle connections and stops replenishing the pool."""
+        self._closed = True
+        for future in self._pending:
+            future.cancel()
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        while self._idle:
+            self._idle.popleft().writer.close()
+
+    async def _acquire(self) -> typing.Optional[_IdleConnection]:
+        now = time.monotonic()
+        while self._idle:
+            idle = self._idle.popleft()
+            if self._is_expired(idle, now) or not await self._is_healthy(idle):
+                idle.writer.close()
+                continue
+            return idle
+        return None
+
+    async def _is_healthy(self, idle: _IdleConnection) -> bool:
+        """Runs the health check, a check raising an exception counts as failed."""
+        if self.health_check is None:
+            return True
+        try:
+            return await self.health_check(idle.reader, idle.writer)
+        except Exception:
+            return False
+        except BaseException:
+            idle.writer.close()
+            raise
+
+    def _is_expired(self, idle: _IdleConnection, now: float) -> bool:
+        return (
+            idle.writer.is_closing()
+            or idle.reader.at_eof()
+            or (self.idle_ttl is not None and now - idle.idle_since > self.idle_ttl)
+        )
+
+    def _spawn_replacement(self) -> None:
+        future = asyncio.ensure_future(self._add_connection())
+        self._pending.add(future)
+        future.add_done_callback(self._replacement_done)
+
+    def _replacement_done(self, future: "asyncio.Future[None]") -> None:
+        self._pending.discard(future)
+        if not future.cancelled():
+            # Failing to replenish is not fatal, the next open_connection() call
+            # authenticates a new connection itself.
+            future.exception()
+
+    async def _add_connection(self) -> None:
+        idle = await self._authenticate()
+        if self._closed or len(self._idle) >= self.max_size:
+            idle.writer.close()
+        else:
+            self._idle.append(idle)
+
+    async def _authenticate(self) -> _IdleConnection:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(*self.proxy), self.connect_timeout
+        )
+        conn = SOCKS5Connection()
+        try:
+            await asyncio.wait_for(
+                socks5_authenticate(AsyncioStream(reader, writer), conn, self.auth),
+                self.auth_timeout,
+            )
+        except BaseException:
+            writer.close()
+            raise
+        return _IdleConnection(reader, writer, conn, time.monotonic())
+
+    async def _connect(self, idle: _IdleConnection, target: Address) -> Streams:
+        try:
+            await asyncio.wait_for(
+                socks5_connect(
+                    AsyncioStream(idle.reader, idle.writer), idle.conn, target
+                ),
+                self.command_timeout,
+            )
+        except BaseException:
+            idle.writer.close()
+            raise
+        return idle.reader, idle.writer
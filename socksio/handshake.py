@@ -0,0 +1,488 @@
+"""Framework independent driver for the client side of the SOCKS handshakes.
+
+The handshake coroutines only ever await the two methods of
+:class:`AsyncByteStream`, so the same code runs on asyncio, trio, anyio or, through
+:func:`run_sync`, on a blocking socket. Each phase of the SOCKS5 handshake is also
+available on its own so that integrations can apply their own per-phase timeouts.
+"""
+
+import abc
+import asyncio
+import socket
+import time
+import typing
+
+from ._types import StrOrBytes
+from .exceptions import ProtocolError, SOCKSError
+from .socks4 import (
+    SOCKS4ARequest,
+    SOCKS4Command,
+    SOCKS4Connection,
+    SOCKS4Reply,
+    SOCKS4ReplyCode,
+    SOCKS4Request,
+)
+from .socks5 import (
+    SOCKS5AuthMethod,
+    SOCKS5AuthMethodsRequest,
+    SOCKS5AuthReply,
+    SOCKS5Command,
+    SOCKS5CommandRequest,
+    SOCKS5Connection,
+    SOCKS5Reply,
+    SOCKS5ReplyCode,
+    SOCKS5UsernamePasswordReply,
+    SOCKS5UsernamePasswordRequest,
+)
+from .utils import NeedData, get_address_port_tuple_from_address
+
+Address = typing.Union[StrOrBytes, typing.Tuple[StrOrBytes, int]]
+Auth = typing.Optional[typing.Tuple[bytes, bytes]]
+T = typing.TypeVar("T")
+
+PROTOCOLS = ("socks4", "socks4a", "socks5")
+
+
+class AsyncByteStream(abc.ABC):
+    """The minimal byte stream interface the handshake coroutines are written
+    against.
+    """
+
+    @abc.abstractmethod
+    async def receive(self, max_bytes: int) -> bytes:
+        """Receives at most ``max_bytes`` bytes, returning b"" at end of stream."""
+
+    @abc.abstractmethod
+    async def send(self, data: bytes) -> None:
+        """Sends all of ``data``."""
+
+
+class AsyncioStream(AsyncByteStream):
+    """Adapts an asyncio (reader, writer) pair.
+
+    Args:
+        reader: The stream reader.
+        writer: The stream writer.
+    """
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    async def receive(self, max_bytes: int) -> bytes:
+        return await self.reader.read(max_bytes)
+
+    async def send(self, data: bytes) -> None:
+        self.writer.write(data)
+        await self.writer.drain()
+
+
+class TrioStream(AsyncByteStream):
+    """Adapts a ``trio.abc.Stream`` such as ``trio.SocketStream``.
+
+    Args:
+        stream: The trio stream.
+    """
+
+    def __init__(self, stream: typing.Any) -> None:
+        self.stream = stream
+
+    async def receive(self, max_bytes: int) -> bytes:
+        data = await self.stream.receive_some(max_bytes)
+        return bytes(data)
+
+    async def send(self, data: bytes) -> None:
+        await self.stream.send_all(data)
+
+
+class AnyioStream(AsyncByteStream):
+    """Adapts an ``anyio.abc.ByteStream`` such as the stream returned by
+    ``anyio.connect_tcp()``. Requires anyio to be installed.
+
+    Args:
+        stream: The anyio byte stream.
+    """
+
+    def __init__(self, stream: typing.Any) -> None:
+        import anyio
+
+        self.stream = stream
+        self._end_of_stream = anyio.EndOfStream
+
+    async def receive(self, max_bytes: int) -> bytes:
+        try:
+            data = await self.stream.receive(max_bytes)
+        except self._end_of_stream:
+            return b""
+        return bytes(data)
+
+    async def send(self, data: bytes) -> None:
+        await self.stream.send(data)
+
+
+class SocketStream(AsyncByteStream):
+    """Adapts a blocking socket. The coroutines never suspend, drive them with
+    :func:`run_sync`.
+
+    Args:
+        sock: A connected blocking socket, timeouts set on it apply to every
+            receive and send.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+
+    async def receive(self, max_bytes: int) -> bytes:
+        return self.sock.recv(max_bytes)
+
+    async def send(self, data: bytes) -> None:
+        self.sock.sendall(data)
+
+
+def run_sync(coroutine: typing.Coroutine[typing.Any, typing.Any, T]) -> T:
+    """Runs a handshake coroutine over a :class:`SocketStream` to completion.
+
+    Args:
+        coroutine: The coroutine, which must not await anything but blocking
+            streams.
+
+    Returns:
+        The value returned by the coroutine.
+
+    Raises:
+        RuntimeError: If the coroutine suspends, for example because it awaits an
+            asynchronous stream.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as exc:
+        return typing.cast(T, exc.value)
+    coroutine.close()
+    raise RuntimeError("run_sync() can only drive blocking streams")
+
+
+class ProxyHop(typing.NamedTuple):
+    """A proxy in a chain and the arguments of its handshake.
+
+    Args:
+        address: The proxy address as a 'HOST:PORT' string or a (host, port)
+            tuple.
+        protocol: One of 'socks4', 'socks4a' or 'socks5'.
+        auth: Optional (username, password) for SOCKS5 username/password
+            authentication.
+        user_id: The user ID to send to SOCKS4 and SOCKS4A proxies.
+        pipelined: Sends the SOCKS5 authentication and CONNECT requests in a single
+            flight.
+    """
+
+    address: Address
+    protocol: str = "socks5"
+    auth: Auth = None
+    user_id: typing.Optional[bytes] = None
+    pipelined: bool = False
+
+
+class HopTiming(typing.NamedTuple):
+    """How long the handshake with one proxy of a chain took.
+
+    Args:
+        proxy: The (host, port) of the proxy.
+        protocol: The protocol spoken to the proxy.
+        started: ``time.monotonic()`` when the handshake started.
+        duration: Seconds the handshake took.
+    """
+
+    proxy: typing.Tuple[str, int]
+    protocol: str
+    started: float
+    duration: float
+
+
+def check_protocol(protocol: str, user_id: typing.Optional[bytes]) -> None:
+    """Raises if ``protocol`` is unknown or SOCKS4 is used without a user ID."""
+    if protocol not in PROTOCOLS:
+        raise ValueError("protocol must be one of {}".format(", ".join(PROTOCOLS)))
+    if protocol != "socks5" and not user_id:
+        raise SOCKSError("SOCKS4 requires a user_id, none was specified")
+
+
+async def proxy_handshake(
+    stream: AsyncByteStream,
+    target: Address,
+    *,
+    protocol: str = "socks5",
+    auth: Auth = None,
+    user_id: typing.Optional[bytes] = None,
+    pipelined: bool = False,
+) -> typing.Union[SOCKS4Reply, SOCKS5Reply]:
+    """Runs the handshake of ``protocol``, see :func:`socks5_handshake` and
+    :func:`socks4_handshake`.
+    """
+    check_protocol(protocol, user_id)
+    if protocol == "socks5":
+        return await socks5_handshake(stream, target, auth=auth, pipelined=pipelined)
+    assert user_id is not None
+    return await socks4_handshake(
+        stream, target, user_id=user_id, socks4a=protocol == "socks4a"
+    )
+
+
+async def chain_handshake(
+    stream: AsyncByteStream, hops: typing.Sequence[ProxyHop], target: Address
+) -> typing.List[HopTiming]:
+    """Tunnels through several proxies in turn over a single stream.
+
+    The stream is connected to the first proxy. Each proxy is asked to connect to
+    the next one, whose handshake then runs inside the tunnel, and the last proxy
+    is asked to connect to ``target``. No data is copied between hops, every
+    handshake reads and writes the same stream.
+
+    Args:
+        stream: A stream connected to the first proxy.
+        hops: The proxies to go through, in order.
+        target: The address the last proxy connects to.
+
+    Returns:
+        The timing of each handshake, in the order of ``hops``.
+
+    Raises:
+        SOCKSError: If any proxy rejects the authentication or the request.
+        ProtocolError: If any proxy sends malformed data or closes the stream.
+    """
+    if not hops:
+        raise ValueError("At least one proxy is required")
+    for hop in hops:
+        check_protocol(hop.protocol, hop.user_id)
+
+    timings = []
+    for index, hop in enumerate(hops):
+        next_address = hops[index + 1].address if index + 1 < len(hops) else target
+        started = time.monotonic()
+        await proxy_handshake(
+            stream,
+            next_address,
+            protocol=hop.protocol,
+            auth=hop.auth,
+            user_id=hop.user_id,
+            pipelined=hop.pipelined,
+        )
+        timings.append(
+            HopTiming(
+                get_address_port_tuple_from_address(hop.address),
+                hop.protocol,
+                started,
+                time.monotonic() - started,
+            )
+        )
+    return timings
+
+
+async def socks5_handshake(
+    stream: AsyncByteStream,
+    target: Address,
+    *,
+    auth: Auth = None,
+    pipelined: bool = False,
+) -> SOCKS5Reply:
+    """Authenticates with a SOCKS5 proxy and opens a tunnel to ``target``.
+
+    Args:
+        stream: A stream connected to the proxy.
+        target: The address to connect to as a 'HOST:PORT' string or a
+            (host, port) tuple.
+        auth: Optional (username, password) for username/password
+            authentication.
+        pipelined: Sends the authentication and CONNECT requests in a single
+            flight without waiting for each reply.
+
+    Returns:
+        The successful reply to the CONNECT request.
+
+    Raises:
+        SOCKSError: If the proxy rejects the authentication or the request.
+        ProtocolError: If the proxy sends malformed data or closes the stream.
+    """
+    if pipelined:
+        conn = socks5_pipelined_connection(target, auth)
+        await flush(stream, conn)
+        await socks5_auth_replies(stream, conn, auth)
+        return await socks5_command_reply(stream, conn)
+
+    conn = SOCKS5Connection()
+    await socks5_authenticate(stream, conn, auth)
+    return await socks5_connect(stream, conn, target)
+
+
+def socks5_pipelined_connection(target: Address, auth: Auth) -> SOCKS5Connection:
+    """Returns a pipelined connection with the authentication and CONNECT requests
+    already queued. Only a single authentication method is offered to the proxy,
+    username/password if ``auth`` is given.
+    """
+    conn = SOCKS5Connection(pipelined=True)
+    if auth is None:
+        conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.NO_AUTH_REQUIRED]))
+    else:
+        conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD]))
+        conn.send(SOCKS5UsernamePasswordRequest(*auth))
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, target))
+    return conn
+
+
+async def socks5_authenticate(
+    stream: AsyncByteStream, conn: SOCKS5Connection, auth: Auth
+) -> None:
+    """Negotiates the authentication method and authenticates if required."""
+    methods = [SOCKS5AuthMethod.NO_AUTH_REQUIRED]
+    if auth is not None:
+        methods.append(SOCKS5AuthMethod.USERNAME_PASSWORD)
+    conn.send(SOCKS5AuthMethodsRequest(methods))
+    await flush(stream, conn)
+    reply = await receive_reply(stream, conn)
+    assert isinstance(reply, SOCKS5AuthReply)
+
+    if reply.method == SOCKS5AuthMethod.USERNAME_PASSWORD and auth is not None:
+        conn.send(SOCKS5UsernamePasswordRequest(*auth))
+        await flush(stream, conn)
+        await _socks5_username_password_reply(stream, conn)
+    elif reply.method != SOCKS5AuthMethod.NO_AUTH_REQUIRED:
+        raise SOCKSError("No acceptable authentication method")
+
+
+async def socks5_auth_replies(
+    stream: AsyncByteStream, conn: SOCKS5Connection, auth: Auth
+) -> None:
+    """Receives the replies to pipelined authentication requests."""
+    reply = await receive_reply(stream, conn)
+    assert isinstance(reply, SOCKS5AuthReply)
+    expected_method = (
+        SOCKS5AuthMethod.NO_AUTH_REQUIRED
+        if auth is None
+        else SOCKS5AuthMethod.USERNAME_PASSWORD
+    )
+    if reply.method != expected_method:
+        raise SOCKSError("No acceptable authentication method")
+    if auth is not None:
+        await _socks5_username_password_reply(stream, conn)
+
+
+async def socks5_connect(
+    stream: AsyncByteStream, conn: SOCKS5Connection, target: Address
+) -> SOCKS5Reply:
+    """Sends a CONNECT request on an authenticated connection and waits for the
+    reply.
+    """
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, target))
+    await flush(stream, conn)
+    return await socks5_command_reply(stream, conn)
+
+
+async def socks5_bind(
+    stream: AsyncByteStream, conn: SOCKS5Connection, target: Address
+) -> SOCKS5Reply:
+    """Sends a BIND request on an authenticated connection and waits for the
+    first reply, holding the address the proxy listens on for the connection from
+    ``target``. The second reply is received with :func:`socks5_command_reply`.
+    """
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.BIND, target))
+    await flush(stream, conn)
+    return await socks5_command_reply(stream, conn)
+
+
+async def socks5_command_reply(
+    stream: AsyncByteStream, conn: SOCKS5Connection
+) -> SOCKS5Reply:
+    """Receives the reply to a command request, raising SOCKSError unless it
+    succeeded.
+    """
+    reply = await receive_reply(stream, conn)
+    assert isinstance(reply, SOCKS5Reply)
+    if reply.reply_code != SOCKS5ReplyCode.SUCCEEDED:
+        raise SOCKSError(
+            "Proxy server could not connect to remote host: {}".format(
+                reply.reply_code.name
+            )
+        )
+    return reply
+
+
+async def _socks5_username_password_reply(
+    stream: AsyncByteStream, conn: SOCKS5Connection
+) -> None:
+    reply = await receive_reply(stream, conn)
+    assert isinstance(reply, SOCKS5UsernamePasswordReply)
+    if not reply.success:
+        raise SOCKSError("Invalid username/password")
+
+
+async def socks4_handshake(
+    stream: AsyncByteStream,
+    target: Address,
+    *,
+    user_id: bytes,
+    socks4a: bool = False,
+) -> SOCKS4Reply:
+    """Opens a tunnel to ``target`` through a SOCKS4 or SOCKS4A proxy.
+
+    Args:
+        stream: A stream connected to the proxy.
+        target: The address to connect to as a 'HOST:PORT' string or a
+            (host, port) tuple.
+        user_id: The user ID to send to the proxy.
+        socks4a: Whether to send a SOCKS4A request, letting the proxy resolve
+            domain names.
+
+    Returns:
+        The successful reply to the CONNECT request.
+
+    Raises:
+        SOCKSError: If the proxy rejects the request.
+        ProtocolError: If the proxy sends malformed data or closes the stream.
+    """
+    conn = SOCKS4Connection(user_id=user_id)
+    request_type = SOCKS4ARequest if socks4a else SOCKS4Request
+    conn.send(request_type.from_address(SOCKS4Command.CONNECT, target))
+    await flush(stream, conn)
+    reply = await receive_reply(stream, conn)
+    assert isinstance(reply, SOCKS4Reply)
+    if reply.reply_code != SOCKS4ReplyCode.REQUEST_GRANTED:
+        raise SOCKSError(
+            "Proxy server could not connect to remote host: {}".format(
+                reply.reply_code.name
+            )
+        )
+    return reply
+
+
+async def flush(
+    stream: AsyncByteStream, conn: typing.Union[SOCKS4Connection, SOCKS5Connection]
+) -> None:
+    """Sends the connection's pending data on the stream."""
+    await stream.send(conn.data_to_send())
+
+
+async def receive_reply(
+    stream: AsyncByteStream, conn: typing.Union[SOCKS4Connection, SOCKS5Connection]
+) -> typing.Union[
+    SOCKS4Reply, SOCKS5AuthReply, SOCKS5UsernamePasswordReply, SOCKS5Reply
+]:
+    """Waits for the next reply on the stream.
+
+    Only ``conn.bytes_needed`` bytes are read at a time so no data past the end of
+    the reply is consumed from the stream.
+
+    Raises:
+        ProtocolError: If the proxy closes the stream before the reply is complete.
+    """
+    while True:
+        nbytes = conn.bytes_needed
+        data = b""
+        while len(data) < nbytes:
+            chunk = await stream.receive(nbytes - len(data))
+            if not chunk:
+                raise ProtocolError("Proxy server closed the connection")
+            data += chunk
+        reply = conn.receive_data(data)
+        if not isinstance(reply, NeedData):
+            return reply
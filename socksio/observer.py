@@ -0,0 +1,107 @@
+"""Optional instrumentation of connection state transitions and frames."""
+
+import enum
+import time
+import typing
+
+from .utils import NeedData
+
+T = typing.TypeVar("T")
+R = typing.TypeVar("R")
+
+
+class ConnectionObserver:
+    """Receives callbacks from the connections it is passed to.
+
+    Subclass and override the callbacks of interest, the default implementations
+    do nothing. Every callback receives the connection and a ``time.monotonic()``
+    timestamp, callbacks caused by the same call share the timestamp. A single
+    observer can be passed to many connections.
+    """
+
+    def on_state_change(
+        self,
+        connection: typing.Any,
+        old_state: enum.IntEnum,
+        new_state: enum.IntEnum,
+        timestamp: float,
+    ) -> None:
+        """Called when the state of ``connection`` changes."""
+
+    def on_frame_sent(
+        self, connection: typing.Any, frame: typing.Any, timestamp: float
+    ) -> None:
+        """Called when ``frame`` is added to the send buffer of ``connection``."""
+
+    def on_frame_parsed(
+        self, connection: typing.Any, frame: typing.Any, timestamp: float
+    ) -> None:
+        """Called when ``connection`` unpacks ``frame`` from received data."""
+
+
+class StateTimer(ConnectionObserver):
+    """Records how long a connection spends in each state.
+
+    A state is timed from the transition entering it to the transition leaving
+    it, so on the client side ``SERVER_AUTH_REPLY`` measures the method
+    negotiation round trip and ``CLIENT_AUTHENTICATED`` the command round trip.
+    Use one timer per connection.
+
+    Attributes:
+        durations: A (state, seconds) tuple for each state left so far.
+    """
+
+    def __init__(self) -> None:
+        self.durations: typing.List[typing.Tuple[enum.IntEnum, float]] = []
+        self._entered: typing.Optional[float] = None
+
+    def on_state_change(
+        self,
+        connection: typing.Any,
+        old_state: enum.IntEnum,
+        new_state: enum.IntEnum,
+        timestamp: float,
+    ) -> None:
+        if self._entered is not None:
+            self.durations.append((old_state, timestamp - self._entered))
+        self._entered = timestamp
+
+
+def notify_sent(
+    observer: ConnectionObserver,
+    connection: typing.Any,
+    frame: typing.Any,
+    old_state: enum.IntEnum,
+) -> None:
+    """Reports a frame sent by ``connection`` and the transition it caused."""
+    timestamp = time.monotonic()
+    observer.on_frame_sent(connection, frame, timestamp)
+    new_state = connection.state
+    if new_state != old_state:
+        observer.on_state_change(connection, old_state, new_state, timestamp)
+
+
+def observe_receive(
+    observer: ConnectionObserver,
+    connection: typing.Any,
+    receive: typing.Callable[[T], R],
+    data: T,
+) -> R:
+    """Calls ``receive(data)`` reporting the frame it returns, if any, and the
+    transition it caused, including transitions before a ProtocolError.
+    """
+    old_state = connection.state
+    try:
+        frame = receive(data)
+    except BaseException:
+        new_state = connection.state
+        if new_state != old_state:
+            observer.on_state_change(connection, old_state, new_state, time.monotonic())
+        raise
+    timestamp = time.monotonic()
+    if not isinstance(frame, NeedData):
+        observer.on_frame_parsed(connection, frame, timestamp)
+    new_state = connection.state
+    if new_state != old_state:
+        observer.on_state_change(connection, old_state, new_state, timestamp)
+    return frame
@@ -0,0 +1,311 @@
+"""Reference SOCKS5 proxy server driving SOCKS5ServerConnection over asyncio."""
+
+import argparse
+import asyncio
+import errno
+import socket
+import typing
+
+from .exceptions import ProtocolError
+from .socks5 import (
+    ADDRESS_TYPES,
+    SOCKS5AuthMethod,
+    SOCKS5AuthMethodsRequest,
+    SOCKS5AuthReply,
+    SOCKS5Command,
+    SOCKS5CommandRequest,
+    SOCKS5Reply,
+    SOCKS5ReplyCode,
+    SOCKS5ServerConnection,
+    SOCKS5State,
+    SOCKS5UsernamePasswordReply,
+    SOCKS5UsernamePasswordRequest,
+)
+from .utils import decode_address
+
+Authenticator = typing.Callable[[bytes, bytes], typing.Awaitable[bool]]
+
+CONNECT_ERRORS = {
+    errno.ECONNREFUSED: SOCKS5ReplyCode.CONNECTION_REFUSED,
+    errno.ENETUNREACH: SOCKS5ReplyCode.NETWORK_UNREACHABLE,
+    errno.EHOSTUNREACH: SOCKS5ReplyCode.HOST_UNREACHABLE,
+    errno.ETIMEDOUT: SOCKS5ReplyCode.TTL_EXPIRED,
+}
+
+
+class SOCKS5Server:
+    """Minimal SOCKS5 proxy server supporting the CONNECT command.
+
+    Clients are handled on non-blocking sockets with the event loop's ``sock_*``
+    methods. Once a tunnel is established data is relayed in both directions with
+    ``loop.sock_recv_into()`` into a buffer allocated once per direction, so the
+    relay loop does not allocate per read.
+
+    Args:
+        authenticate: Coroutine function called with the username and password sent
+            by a client, returning whether they are valid. If given clients must
+            use username/password authentication, otherwise no authentication is
+            required.
+        connect_timeout: Timeout in seconds to connect to the target host.
+        handshake_timeout: Timeout in seconds for a client to complete the
+            handshake.
+        buffer_size: The size of each relay buffer.
+    """
+
+    def __init__(
+        self,
+        *,
+        authenticate: typing.Optional[Authenticator] = None,
+        connect_timeout: typing.Optional[float] = 10.0,
+        handshake_timeout: typing.Optional[float] = 30.0,
+        buffer_size: int = 65536,
+    ) -> None:
+        self.authenticate = authenticate
+        self.connect_timeout = connect_timeout
+        self.handshake_timeout = handshake_timeout
+        self.buffer_size = buffer_size
+
+        self._listener: typing.Optional[socket.socket] = None
+        self._accept_task: typing.Optional["asyncio.Future[None]"] = None
+        self._client_tasks: typing.Set["asyncio.Future[None]"] = set()
+
+    @property
+    def address(self) -> typing.Tuple[str, int]:
+        """Returns the (host, port) the server is listening on."""
+        if self._listener is None:
+            raise RuntimeError("The server is not listening")
+        host, port = self._listener.getsockname()[:2]
+        return host, port
+
+    async def start(self, host: str = "127.0.0.1", port: int = 1080) -> None:
+        """Starts listening and accepting clients in the background.
+
+        Args:
+            host: The address to listen on.
+            port: The port to listen on, 0 picks a free port.
+        """
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        listener = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((host, port))
+            listener.listen(socket.SOMAXCONN)
+            listener.setblocking(False)
+        except BaseException:
+            listener.close()
+            raise
+        self._listener = listener
+        self._accept_task = asyncio.ensure_future(self._accept_clients(listener))
+
+    async def serve_forever(self) -> None:
+        """Waits until the server is closed."""
+        if self._accept_task is None:
+            raise RuntimeError("The server is not listening")
+        await self._accept_task
+
+    async def aclose(self) -> None:
+        """Stops accepting clients and closes all open tunnels."""
+        tasks = set(self._client_tasks)
+        if self._accept_task is not None:
+            tasks.add(self._accept_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._listener is not None:
+            self._listener.close()
+        self._accept_task = None
+
+    async def _accept_clients(self, listener: socket.socket) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            client, _ = await loop.sock_accept(listener)
+            client.setblocking(False)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            task = asyncio.ensure_future(self._handle_client(client))
+            self._client_tasks.add(task)
+            task.add_done_callback(self._client_tasks.discard)
+
+    async def _handle_client(self, client: socket.socket) -> None:
+        upstream = None
+        try:
+            conn = SOCKS5ServerConnection()
+            upstream = await asyncio.wait_for(
+                self._handshake(client, conn), self.handshake_timeout
+            )
+            if upstream is not None:
+                await self._relay(client, upstream, conn.trailing_data())
+        except (ProtocolError, OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            client.close()
+            if upstream is not None:
+                upstream.close()
+
+    async def _handshake(
+        self, client: socket.socket, conn: SOCKS5ServerConnection
+    ) -> typing.Optional[socket.socket]:
+        """Runs the handshake with a client, returning the connected upstream
+        socket or None if the client was rejected.
+        """
+        loop = asyncio.get_running_loop()
+        buf = bytearray(1024)
+        with memoryview(buf) as view:
+            while conn.state != SOCKS5State.MUST_CLOSE:
+                event = conn.receive_data(b"")
+                while not isinstance(
+                    event,
+                    (
+                        SOCKS5AuthMethodsRequest,
+                        SOCKS5UsernamePasswordRequest,
+                        SOCKS5CommandRequest,
+                    ),
+                ):
+                    nbytes = await loop.sock_recv_into(client, view)
+                    if not nbytes:
+                        return None
+                    event = conn.receive_data(view[:nbytes])
+
+                if isinstance(event, SOCKS5AuthMethodsRequest):
+                    conn.send(SOCKS5AuthReply(self._select_method(event)))
+                elif isinstance(event, SOCKS5UsernamePasswordRequest):
+                    assert self.authenticate is not None
+                    success = await self.authenticate(event.username, event.password)
+                    conn.send(SOCKS5UsernamePasswordReply(success))
+                else:
+                    upstream, reply = await self._connect(event)
+                    conn.send(reply)
+                    await loop.sock_sendall(client, conn.data_to_send())
+                    return upstream
+                await loop.sock_sendall(client, conn.data_to_send())
+        return None
+
+    def _select_method(self, request: SOCKS5AuthMethodsRequest) -> SOCKS5AuthMethod:
+        required = (
+            SOCKS5AuthMethod.NO_AUTH_REQUIRED
+            if self.authenticate is None
+            else SOCKS5AuthMethod.USERNAME_PASSWORD
+        )
+        if required in request.methods:
+            return required
+        return SOCKS5AuthMethod.NO_ACCEPTABLE_METHODS
+
+    async def _connect(
+        self, request: SOCKS5CommandRequest
+    ) -> typing.Tuple[typing.Optional[socket.socket], SOCKS5Reply]:
+        """Connects to the target of a command request, returning the connected
+        socket, or None on failure, and the reply to send to the client.
+        """
+        if request.command != SOCKS5Command.CONNECT:
+            return None, _failure(SOCKS5ReplyCode.COMMAND_NOT_SUPPORTED)
+        try:
+            host = decode_address(ADDRESS_TYPES[request.atype], request.addr)
+            upstream = await asyncio.wait_for(
+                _open_socket(host, request.port), self.connect_timeout
+            )
+        except (socket.gaierror, ValueError):
+            return None, _failure(SOCKS5ReplyCode.HOST_UNREACHABLE)
+        except asyncio.TimeoutError:
+            return None, _failure(SOCKS5ReplyCode.TTL_EXPIRED)
+        except OSError as exc:
+            code = CONNECT_ERRORS.get(
+                exc.errno or 0, SOCKS5ReplyCode.GENERAL_SERVER_FAILURE
+            )
+            return None, _failure(code)
+        host, port = upstream.getsockname()[:2]
+        return upstream, SOCKS5Reply.from_address(
+            SOCKS5ReplyCode.SUCCEEDED, (host, port)
+        )
+
+    async def _relay(
+        self, client: socket.socket, upstream: socket.socket, early_data: bytearray
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        if early_data:
+            await loop.sock_sendall(upstream, early_data)
+        await asyncio.gather(self._pipe(client, upstream), self._pipe(upstream, client))
+
+    async def _pipe(self, source: socket.socket, destination: socket.socket) -> None:
+        """Copies data from ``source`` to ``destination`` until end of stream,
+        reusing a single buffer for every read.
+        """
+        loop = asyncio.get_running_loop()
+        buf = bytearray(self.buffer_size)
+        with memoryview(buf) as view:
+            try:
+                while True:
+                    nbytes = await loop.sock_recv_into(source, view)
+                    if not nbytes:
+                        break
+                    await loop.sock_sendall(destination, view[:nbytes])
+            except OSError:
+                pass
+        try:
+            destination.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+def _failure(reply_code: SOCKS5ReplyCode) -> SOCKS5Reply:
+    return SOCKS5Reply.from_address(reply_code, ("0.0.0.0", 0))
+
+
+async def _open_socket(host: str, port: int) -> socket.socket:
+    """Connects a non-blocking socket to the first reachable address of a host."""
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    error: typing.Optional[OSError] = None
+    for family, type_, proto, _, address in infos:
+        sock = socket.socket(family, type_, proto)
+        try:
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            await loop.sock_connect(sock, address)
+        except OSError as exc:
+            sock.close()
+            error = exc
+        except BaseException:
+            sock.close()
+            raise
+        else:
+            return sock
+    raise error or OSError("No addresses found for {}".format(host))
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    """Runs a SOCKS5 proxy server from the command line."""
+    parser = argparse.ArgumentParser(
+        prog="python -m socksio.server", description=main.__doc__
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1080)
+    parser.add_argument("--username", help="require username/password auth")
+    parser.add_argument("--password", default="")
+    args = parser.parse_args(argv)
+
+    credentials = (
+        None
+        if args.username is None
+        else (args.username.encode(), args.password.encode())
+    )
+
+    async def authenticate(username: bytes, password: bytes) -> bool:
+        return (username, password) == credentials
+
+    async def serve() -> None:
+        server = SOCKS5Server(
+            authenticate=None if credentials is None else authenticate
+        )
+        await server.start(args.host, args.port)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.aclose()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:  # pragma: nocover
+        pass
+
+
+if __name__ == "__main__":  # pragma: nocover
+    main()
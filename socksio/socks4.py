@@ -1,15 +1,30 @@
 import enum
+import struct
 import typing
 
-from ._types import StrOrBytes
+from ._codec import unpack_socks4_reply
+from ._types import ReadableBuffer, StrOrBytes, WritableBuffer
 from .exceptions import ProtocolError, SOCKSError
+from .observer import ConnectionObserver, notify_sent, observe_receive
 from .utils import (
+    NEED_DATA,
     AddressType,
-    decode_address,
+    BufferedConnection,
+    NeedData,
+    StreamConnection,
+    byte_enum_table,
+    check_buffer_size,
     encode_address,
     get_address_port_tuple_from_address,
+    pop_frame,
 )
 
+REQUEST_HEADER_STRUCT = struct.Struct("!BcH4s")
+PORT_ADDRESS_STRUCT = struct.Struct("!H4s")
+PORT_STRUCT = struct.Struct("!H")
+SOCKS4A_ADDRESS = b"\x00\x00\x00\xff"
+REPLY_HEADER_STRUCT = struct.Struct("!BBH")
+
 
 class SOCKS4ReplyCode(bytes, enum.Enum):
     """Enumeration of SOCKS4 reply codes."""
@@ -27,6 +42,10 @@ class SOCKS4Command(bytes, enum.Enum):
     BIND = b"\x02"
 
 
+REPLY_CODES = byte_enum_table(SOCKS4ReplyCode)
+COMMANDS = byte_enum_table(SOCKS4Command)
+
+
 class SOCKS4Request(typing.NamedTuple):
     """Encapsulates a request to the SOCKS4 proxy server
 
@@ -72,6 +91,27 @@ class SOCKS4Request(typing.NamedTuple):
             )
         return cls(command=command, addr=encoded_addr, port=port, user_id=user_id)
 
+    @classmethod
+    def loads(cls, data: ReadableBuffer, offset: int = 0) -> "SOCKS4Request":
+        """Unpacks the request data into an instance.
+
+        Args:
+            data: A buffer holding the request from ``offset`` to its end.
+            offset: The position of the request within ``data``.
+
+        Returns:
+            The unpacked request instance.
+
+        Raises:
+            ProtocolError: If the data does not match the spec.
+        """
+        command, port, addr = _unpack_request_header(data, offset)
+        with memoryview(data) as view:
+            user_id = bytes(view[offset + REQUEST_HEADER_STRUCT.size : -1])
+        if 0 in user_id:
+            raise ProtocolError("Malformed request")
+        return cls(command=command, port=port, addr=addr, user_id=user_id)
+
     def dumps(self, user_id: typing.Optional[bytes] = None) -> bytes:
         """Packs the instance into a raw binary in the appropriate form.
 
@@ -85,20 +125,49 @@ class SOCKS4Request(typing.NamedTuple):
         Raises:
             SOCKSError: If no user was specified in this call or on initialization.
         """
-        user_id = user_id or self.user_id
-        if user_id is None:
-            raise SOCKSError("SOCKS4 requires a user_id, none was specified")
+        buf = bytearray(self.packed_size(user_id))
+        self.write_into(buf, 0, user_id)
+        return bytes(buf)
 
-        return b"".join(
-            [
-                b"\x04",
-                self.command,
-                (self.port).to_bytes(2, byteorder="big"),
-                self.addr,
-                user_id,
-                b"\x00",
-            ]
+    def packed_size(self, user_id: typing.Optional[bytes] = None) -> int:
+        """Returns the length in bytes of the packed request.
+
+        Raises:
+            SOCKSError: If no user was specified in this call or on initialization.
+        """
+        return REQUEST_HEADER_STRUCT.size + len(_get_user_id(self, user_id)) + 1
+
+    def write_into(
+        self,
+        buf: WritableBuffer,
+        offset: int = 0,
+        user_id: typing.Optional[bytes] = None,
+    ) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the request at.
+            user_id: Optional user ID as an override, as in :meth:`dumps`.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            SOCKSError: If no user was specified in this call or on initialization.
+            ValueError: If the request does not fit in the buffer.
+        """
+        user_id = _get_user_id(self, user_id)
+        size = REQUEST_HEADER_STRUCT.size + len(user_id) + 1
+        check_buffer_size(buf, offset, size)
+
+        REQUEST_HEADER_STRUCT.pack_into(
+            buf, offset, 4, self.command, self.port, self.addr
         )
+        end = offset + size - 1
+        buf[offset + REQUEST_HEADER_STRUCT.size : end] = user_id
+        buf[end] = 0
+        return size
 
 
 class SOCKS4ARequest(typing.NamedTuple):
@@ -139,6 +208,28 @@ class SOCKS4ARequest(typing.NamedTuple):
         atype, encoded_addr = encode_address(address)
         return cls(command=command, addr=encoded_addr, port=port, user_id=user_id)
 
+    @classmethod
+    def loads(cls, data: ReadableBuffer, offset: int = 0) -> "SOCKS4ARequest":
+        """Unpacks the request data into an instance.
+
+        Args:
+            data: A buffer holding the request from ``offset`` to its end.
+            offset: The position of the request within ``data``.
+
+        Returns:
+            The unpacked request instance, ``addr`` holds the domain name.
+
+        Raises:
+            ProtocolError: If the data does not match the spec.
+        """
+        command, port, addr = _unpack_request_header(data, offset)
+        with memoryview(data) as view:
+            fields = bytes(view[offset + REQUEST_HEADER_STRUCT.size : -1])
+        user_id, separator, domain_name = fields.partition(b"\x00")
+        if not _is_socks4a_address(addr) or not separator or 0 in domain_name:
+            raise ProtocolError("Malformed request")
+        return cls(command=command, port=port, addr=domain_name, user_id=user_id)
+
     def dumps(self, user_id: typing.Optional[bytes] = None) -> bytes:
         """Packs the instance into a raw binary in the appropriate form.
 
@@ -152,23 +243,249 @@ class SOCKS4ARequest(typing.NamedTuple):
         Raises:
             SOCKSError: If no user was specified in this call or on initialization.
         """
-        user_id = user_id or self.user_id
-        if user_id is None:
+        buf = bytearray(self.packed_size(user_id))
+        self.write_into(buf, 0, user_id)
+        return bytes(buf)
+
+    def packed_size(self, user_id: typing.Optional[bytes] = None) -> int:
+        """Returns the length in bytes of the packed request.
+
+        Raises:
+            SOCKSError: If no user was specified in this call or on initialization.
+        """
+        user_id = _get_user_id(self, user_id)
+        return REQUEST_HEADER_STRUCT.size + len(user_id) + len(self.addr) + 2
+
+    def write_into(
+        self,
+        buf: WritableBuffer,
+        offset: int = 0,
+        user_id: typing.Optional[bytes] = None,
+    ) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the request at.
+            user_id: Optional user ID as an override, as in :meth:`dumps`.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            SOCKSError: If no user was specified in this call or on initialization.
+            ValueError: If the request does not fit in the buffer.
+        """
+        user_id = _get_user_id(self, user_id)
+        size = REQUEST_HEADER_STRUCT.size + len(user_id) + len(self.addr) + 2
+        check_buffer_size(buf, offset, size)
+
+        # The arbitrary final non-zero byte of the address marks a SOCKS4A request
+        REQUEST_HEADER_STRUCT.pack_into(
+            buf, offset, 4, self.command, self.port, b"\x00\x00\x00\xff"
+        )
+        user_id_end = offset + REQUEST_HEADER_STRUCT.size + len(user_id)
+        buf[offset + REQUEST_HEADER_STRUCT.size : user_id_end] = user_id
+        buf[user_id_end] = 0
+        end = offset + size - 1
+        buf[user_id_end + 1 : end] = self.addr
+        buf[end] = 0
+        return size
+
+
+class SOCKS4RequestTemplate:
+    """Packs SOCKS4 and SOCKS4A requests sharing a command and user ID.
+
+    The version, command and user ID fields are packed once, each request then
+    only packs its port and address between them. Useful to send many requests
+    without building a request object for each.
+
+    This is a standalone serializer, :class:`SOCKS4Connection` only sends request
+    objects. Write the packed requests to the proxy directly and feed its replies
+    to :meth:`SOCKS4Reply.loads`.
+
+    Args:
+        command: The command to request.
+        user_id: The user ID to be included in the requests.
+
+    Raises:
+        SOCKSError: If the user ID is empty.
+    """
+
+    def __init__(self, command: SOCKS4Command, user_id: bytes) -> None:
+        if not user_id:
             raise SOCKSError("SOCKS4 requires a user_id, none was specified")
+        self.command = command
+        self.user_id = user_id
+        self._prefix = b"\x04" + command
+        self._suffix = user_id + b"\x00"
+        # The arbitrary final non-zero byte of the address marks a SOCKS4A request
+        self._socks4a_suffix = SOCKS4A_ADDRESS + self._suffix
+        self._frame = self._prefix + bytes(6) + self._suffix
+
+    def packed_size(self, domain_name: typing.Optional[bytes] = None) -> int:
+        """Returns the length in bytes of a packed request, for a SOCKS4A request
+        if ``domain_name`` is given."""
+        if domain_name is None:
+            return len(self._frame)
+        return len(self._frame) + len(domain_name) + 1
+
+    def dumps(self, port: int, addr: bytes) -> bytes:
+        """Packs a SOCKS4 request.
+
+        Args:
+            port: The port number to connect to on the target host.
+            addr: The packed IPv4 address of the target host.
+
+        Returns:
+            The packed request, identical to the result of
+            ``SOCKS4Request(command, port, addr, user_id).dumps()``.
 
+        Raises:
+            ValueError: If ``addr`` is not 4 bytes long.
+        """
+        if len(addr) != 4:
+            raise ValueError("SOCKS4 addresses must be 4 bytes long")
         return b"".join(
-            [
-                b"\x04",
-                self.command,
-                (self.port).to_bytes(2, byteorder="big"),
-                b"\x00\x00\x00\xff",  # arbitrary final non-zero byte
-                user_id,
-                b"\x00",
-                self.addr,
+            (self._prefix, PORT_ADDRESS_STRUCT.pack(port, addr), self._suffix)
+        )
+
+    def dumps_socks4a(self, port: int, domain_name: bytes) -> bytes:
+        """Packs a SOCKS4A request.
+
+        Args:
+            port: The port number to connect to on the target host.
+            domain_name: The domain name of the target host.
+
+        Returns:
+            The packed request, identical to the result of
+            ``SOCKS4ARequest(command, port, domain_name, user_id).dumps()``.
+
+        Raises:
+            ValueError: If ``domain_name`` contains a NUL byte.
+        """
+        _check_domain_name(domain_name)
+        return b"".join(
+            (
+                self._prefix,
+                PORT_STRUCT.pack(port),
+                self._socks4a_suffix,
+                domain_name,
                 b"\x00",
-            ]
+            )
         )
 
+    def write_template_into(self, buf: WritableBuffer, offset: int) -> int:
+        """Writes the fields shared by all requests, the version, command and
+        user ID, into a writable buffer.
+
+        Call this once for a position in ``buf``, :meth:`write_into` and
+        :meth:`write_socks4a_into` then only write the fields of each request.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` requests will be written at.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            ValueError: If the fields do not fit in the buffer.
+        """
+        size = len(self._frame)
+        check_buffer_size(buf, offset, size)
+        buf[offset : offset + size] = self._frame
+        return size
+
+    def write_into(
+        self, buf: WritableBuffer, offset: int, port: int, addr: bytes
+    ) -> int:
+        """Packs a SOCKS4 request into a buffer prepared with
+        :meth:`write_template_into` at the same ``offset``, writing only its port
+        and address.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` of the request.
+            port: The port number to connect to on the target host.
+            addr: The packed IPv4 address of the target host.
+
+        Returns:
+            The length of the request in ``buf``.
+
+        Raises:
+            ValueError: If the request does not fit in the buffer or ``addr`` is
+                not 4 bytes long.
+        """
+        if len(addr) != 4:
+            raise ValueError("SOCKS4 addresses must be 4 bytes long")
+        size = len(self._frame)
+        check_buffer_size(buf, offset, size)
+        PORT_ADDRESS_STRUCT.pack_into(buf, offset + 2, port, addr)
+        return size
+
+    def write_socks4a_into(
+        self, buf: WritableBuffer, offset: int, port: int, domain_name: bytes
+    ) -> int:
+        """Packs a SOCKS4A request into a buffer prepared with
+        :meth:`write_template_into` at the same ``offset``, writing only its port,
+        the SOCKS4A address marker and the domain name after the user ID.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` of the request.
+            port: The port number to connect to on the target host.
+            domain_name: The domain name of the target host.
+
+        Returns:
+            The length of the request in ``buf``.
+
+        Raises:
+            ValueError: If the request does not fit in the buffer or
+                ``domain_name`` contains a NUL byte.
+        """
+        _check_domain_name(domain_name)
+        size = len(self._frame) + len(domain_name) + 1
+        check_buffer_size(buf, offset, size)
+        PORT_ADDRESS_STRUCT.pack_into(buf, offset + 2, port, SOCKS4A_ADDRESS)
+        end = offset + size - 1
+        buf[offset + len(self._frame) : end] = domain_name
+        buf[end] = 0
+        return size
+
+
+def _check_domain_name(domain_name: bytes) -> None:
+    if 0 in domain_name:
+        raise ValueError("SOCKS4A domain names must not contain NUL bytes")
+
+
+def _unpack_request_header(
+    data: ReadableBuffer, offset: int
+) -> typing.Tuple[SOCKS4Command, int, bytes]:
+    if len(data) - offset < REQUEST_HEADER_STRUCT.size + 1:
+        raise ProtocolError("Malformed request")
+    version, command_value, port, addr = REQUEST_HEADER_STRUCT.unpack_from(data, offset)
+    command = COMMANDS[command_value[0]]
+    if version != 4 or command is None or data[-1] != 0:
+        raise ProtocolError("Malformed request")
+    return command, port, addr
+
+
+def _is_socks4a_address(addr: bytes) -> bool:
+    """Returns whether a packed request address is the ``0.0.0.x`` marker of a
+    SOCKS4A request carrying a domain name."""
+    return addr[:3] == b"\x00\x00\x00" and addr[3] != 0
+
+
+def _get_user_id(
+    request: typing.Union[SOCKS4Request, SOCKS4ARequest],
+    user_id: typing.Optional[bytes],
+) -> bytes:
+    user_id = user_id or request.user_id
+    if user_id is None:
+        raise SOCKSError("SOCKS4 requires a user_id, none was specified")
+    return user_id
+
 
 class SOCKS4Reply(typing.NamedTuple):
     """Encapsulates a reply from the SOCKS4 proxy server
@@ -184,29 +501,77 @@ class SOCKS4Reply(typing.NamedTuple):
     addr: typing.Optional[str]
 
     @classmethod
-    def loads(cls, data: bytes) -> "SOCKS4Reply":
+    def loads(cls, data: ReadableBuffer, offset: int = 0) -> "SOCKS4Reply":
         """Unpacks the reply data into an instance.
 
+        Args:
+            data: A buffer holding the reply from ``offset`` to its end.
+            offset: The position of the reply within ``data``.
+
         Returns:
             The unpacked reply instance.
 
         Raises:
             ProtocolError: If the data does not match the spec.
         """
-        if len(data) != 8 or data[0:1] != b"\x00":
+        reply_code, port, addr = unpack_socks4_reply(data, offset)
+        code = REPLY_CODES[reply_code]
+        if code is None:
             raise ProtocolError("Malformed reply")
 
-        try:
-            return cls(
-                reply_code=SOCKS4ReplyCode(data[1:2]),
-                port=int.from_bytes(data[2:4], byteorder="big"),
-                addr=decode_address(AddressType.IPV4, data[4:8]),
-            )
-        except ValueError as exc:
-            raise ProtocolError("Malformed reply") from exc
+        return cls(reply_code=code, port=port, addr=addr)
+
+    def dumps(self) -> bytes:
+        """Packs the instance into a raw binary in the appropriate form.
 
+        Returns:
+            The packed reply.
+        """
+        buf = bytearray(8)
+        self.write_into(buf)
+        return bytes(buf)
+
+    def packed_size(self) -> int:
+        """Returns the length in bytes of the packed reply."""
+        return 8
+
+    def write_into(self, buf: WritableBuffer, offset: int = 0) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the reply at.
 
-class SOCKS4Connection:
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            ValueError: If the reply does not fit in the buffer or the address is
+                not an IPv4 address.
+        """
+        check_buffer_size(buf, offset, 8)
+        addr = b"\x00\x00\x00\x00"
+        if self.addr is not None:
+            atype, addr = encode_address(self.addr)
+            if atype != AddressType.IPV4:
+                raise ValueError("SOCKS4 replies only support IPv4 addresses")
+        REPLY_HEADER_STRUCT.pack_into(buf, offset, 0, self.reply_code[0], self.port)
+        buf[offset + 4 : offset + 8] = addr
+        return 8
+
+
+class SOCKS4State(enum.IntEnum):
+    """Enumeration of SOCKS4 protocol states, shared by the client and proxy
+    server sides.
+    """
+
+    CLIENT_REQUEST = 1
+    SERVER_REPLY = 2
+    TUNNEL_READY = 3
+    MUST_CLOSE = 4
+
+
+class SOCKS4Connection(BufferedConnection):
     """Encapsulates a SOCKS4 and SOCKS4A connection.
 
     Packs request objects into data suitable to be send and unpacks reply
@@ -214,13 +579,28 @@ class SOCKS4Connection:
 
     Args:
         user_id: The user ID to be sent as part of the requests.
+        observer: Optional :class:`~socksio.observer.ConnectionObserver` notified
+            of state transitions and of every frame sent and parsed.
     """
 
-    def __init__(self, user_id: bytes):
+    def __init__(
+        self, user_id: bytes, observer: typing.Optional[ConnectionObserver] = None
+    ):
+        super().__init__()
         self.user_id = user_id
+        self._observer = observer
+
+        self._state = SOCKS4State.CLIENT_REQUEST
+
+    @property
+    def state(self) -> SOCKS4State:
+        """Returns the current state of the protocol."""
+        return self._state
 
-        self._data_to_send = bytearray()
-        self._received_data = bytearray()
+    @property
+    def bytes_needed(self) -> int:
+        """Returns the number of bytes to receive before the reply can be unpacked."""
+        return max(8 - len(self._received_data), 0)
 
     def send(self, request: typing.Union[SOCKS4Request, SOCKS4ARequest]) -> None:
         """Packs a request object and adds it to the send data buffer.
@@ -228,10 +608,17 @@ class SOCKS4Connection:
         Args:
             request: The request instance to be packed.
         """
+        state = self._state
         user_id = request.user_id or self.user_id
-        self._data_to_send += request.dumps(user_id=user_id)
+        self._data_to_send.write(
+            request.packed_size(user_id),
+            lambda buf, offset: request.write_into(buf, offset, user_id),
+        )
+        self._state = SOCKS4State.SERVER_REPLY
+        if self._observer is not None:
+            notify_sent(self._observer, self, request, state)
 
-    def receive_data(self, data: bytes) -> SOCKS4Reply:
+    def receive_data(self, data: ReadableBuffer) -> SOCKS4Reply:
         """Unpacks response data into a reply object.
 
         Args:
@@ -240,14 +627,160 @@ class SOCKS4Connection:
         Returns:
             The appropriate reply object.
         """
+        if self._observer is None:
+            return self._receive_data(data)
+        return observe_receive(self._observer, self, self._receive_data, data)
+
+    def _receive_data(self, data: ReadableBuffer) -> SOCKS4Reply:
         self._received_data += data
-        return SOCKS4Reply.loads(bytes(self._received_data))
+        reply = SOCKS4Reply.loads(self._received_data)
+        if reply.reply_code == SOCKS4ReplyCode.REQUEST_GRANTED:
+            self._state = SOCKS4State.TUNNEL_READY
+        else:
+            self._state = SOCKS4State.MUST_CLOSE
+        return reply
+
 
-    def data_to_send(self) -> bytes:
-        """Returns the data to be sent via the I/O library of choice.
+class SOCKS4ServerConnection(StreamConnection):
+    """Encapsulates the proxy server side of a SOCKS4 and SOCKS4A connection.
 
-        Also clears the connection's buffer.
+    Unpacks the request of a client into a request object and packs the reply
+    object into data suitable to be sent back.
+
+    Args:
+        max_field_length: The maximum length of the USERID field and of the SOCKS4A
+            domain name. A client sending a longer field without its terminating
+            NUL byte is rejected instead of growing the receive buffer.
+        observer: Optional :class:`~socksio.observer.ConnectionObserver` notified
+            of state transitions and of every frame sent and parsed.
+    """
+
+    def __init__(
+        self,
+        max_field_length: int = 255,
+        observer: typing.Optional[ConnectionObserver] = None,
+    ) -> None:
+        super().__init__()
+        self.max_field_length = max_field_length
+        self._observer = observer
+
+        self._state = SOCKS4State.CLIENT_REQUEST
+        # Where to resume searching for the NUL byte ending the current field.
+        self._scan_offset = REQUEST_HEADER_STRUCT.size
+        self._user_id_end = -1
+
+    @property
+    def state(self) -> SOCKS4State:
+        """Returns the current state of the protocol."""
+        return self._state
+
+    @property
+    def bytes_needed(self) -> int:
+        """Returns the minimum number of bytes to receive before the request can be
+        unpacked, 0 if no request is expected.
+
+        The USERID and domain name fields have no length prefix, so once the fixed
+        header has been received this is 1 until their terminating NUL bytes have
+        been found.
+        """
+        if self._state != SOCKS4State.CLIENT_REQUEST:
+            return 0
+        return max(REQUEST_HEADER_STRUCT.size + 1 - len(self._received_data), 1)
+
+    def receive_data(
+        self, data: ReadableBuffer
+    ) -> typing.Union[SOCKS4Request, SOCKS4ARequest, NeedData]:
+        """Buffers request data and unpacks the request once complete.
+
+        Data may be passed in arbitrarily sized chunks as it arrives from the
+        network. Any data following the request is the start of the tunneled stream
+        and can be retrieved with :meth:`trailing_data`.
+
+        Args:
+            data: The raw request data from the client.
+
+        Returns:
+            A SOCKS4Request, or a SOCKS4ARequest whose ``addr`` is the domain name,
+            or ``NEED_DATA`` if the request is not complete yet.
+
+        Raises:
+            ProtocolError: If the data does not match the spec or a field exceeds
+                ``max_field_length``.
+        """
+        if self._observer is None:
+            return self._receive_data(data)
+        return observe_receive(self._observer, self, self._receive_data, data)
+
+    def _receive_data(
+        self, data: ReadableBuffer
+    ) -> typing.Union[SOCKS4Request, SOCKS4ARequest, NeedData]:
+        if self._state != SOCKS4State.CLIENT_REQUEST:
+            raise ProtocolError("Not expecting any request")
+        self._received_data += data
+
+        received = self._received_data
+        if received and received[0] != 4:
+            self._state = SOCKS4State.MUST_CLOSE
+            raise ProtocolError("Malformed request")
+        if len(received) <= REQUEST_HEADER_STRUCT.size:
+            return NEED_DATA
+
+        header_end = REQUEST_HEADER_STRUCT.size
+        socks4a = _is_socks4a_address(bytes(received[4:header_end]))
+        if self._user_id_end < 0:
+            self._user_id_end = self._find_field_end(header_end)
+            if self._user_id_end < 0:
+                return NEED_DATA
+        end = self._user_id_end
+        if socks4a:
+            end = self._find_field_end(self._user_id_end + 1)
+            if end < 0:
+                return NEED_DATA
+
+        loads: typing.Callable[
+            [ReadableBuffer], typing.Union[SOCKS4Request, SOCKS4ARequest]
+        ] = (SOCKS4ARequest.loads if socks4a else SOCKS4Request.loads)
+        try:
+            request = pop_frame(received, end + 1, loads)
+        except ProtocolError:
+            self._state = SOCKS4State.MUST_CLOSE
+            raise
+        assert request is not None
+        self._state = SOCKS4State.SERVER_REPLY
+        return request
+
+    def _find_field_end(self, field_offset: int) -> int:
+        """Returns the index of the NUL byte ending the field starting at
+        ``field_offset``, or -1 if it has not been received yet.
+        """
+        start = max(self._scan_offset, field_offset)
+        end = self._received_data.find(0, start)
+        if end >= 0:
+            self._scan_offset = end + 1
+            if end - field_offset <= self.max_field_length:
+                return end
+        elif len(self._received_data) - field_offset <= self.max_field_length:
+            self._scan_offset = len(self._received_data)
+            return -1
+        self._state = SOCKS4State.MUST_CLOSE
+        raise ProtocolError("Request field exceeds the maximum length")
+
+    def send(self, reply: SOCKS4Reply) -> None:
+        """Packs the reply object and adds it to the send data buffer.
+
+        Args:
+            reply: The reply instance to be packed.
+
+        Raises:
+            ProtocolError: If no request is waiting for a reply.
         """
-        data = bytes(self._data_to_send)
-        self._data_to_send = bytearray()
-        return data
+        state = self._state
+        if state != SOCKS4State.SERVER_REPLY:
+            raise ProtocolError("Not currently replying to a request")
+        self._data_to_send.write(reply.packed_size(), reply.write_into)
+        if reply.reply_code == SOCKS4ReplyCode.REQUEST_GRANTED:
+            self._state = SOCKS4State.TUNNEL_READY
+        else:
+            self._state = SOCKS4State.MUST_CLOSE
+        if self._observer is not None:
+            notify_sent(self._observer, self, reply, state)
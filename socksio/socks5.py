@@ -1,16 +1,49 @@
+import array
+import collections
 import enum
+import functools
+import struct
+import time
 import typing
 
-from ._types import StrOrBytes
-from .compat import singledispatchmethod
+from ._codec import (
+    pack_socks5_command,
+    socks5_frame_length as _frame_length,
+    unpack_socks5_reply,
+)
+from ._types import ReadableBuffer, StrOrBytes, WritableBuffer
 from .exceptions import ProtocolError
+from .observer import ConnectionObserver, notify_sent, observe_receive
 from .utils import (
+    NEED_DATA,
     AddressType,
-    decode_address,
+    NeedData,
+    StreamConnection,
+    byte_enum_table,
+    check_buffer_size,
     encode_address,
     get_address_port_tuple_from_address,
+    pop_frame,
+    unpack_address,
 )
 
+HEADER_STRUCT = struct.Struct("!4B")
+COMMAND_HEADER_STRUCT = struct.Struct("!BcBc")
+DATAGRAM_HEADER_STRUCT = struct.Struct("!HBB")
+IPV4_COMMAND_STRUCT = struct.Struct("!BcBc4sH")
+IPV6_COMMAND_STRUCT = struct.Struct("!BcBc16sH")
+
+
+@functools.lru_cache(maxsize=256)
+def _domain_name_command_struct(length: int) -> struct.Struct:
+    """Returns the struct packing a whole command request for a domain name of
+    ``length`` bytes.
+    """
+    return struct.Struct("!BcBcB{}sH".format(length))
+
+
+PORT_STRUCT = struct.Struct("!H")
+
 
 class SOCKS5AuthMethod(bytes, enum.Enum):
     """Enumeration of SOCKS5 authentication methods."""
@@ -61,6 +94,22 @@ class SOCKS5ReplyCode(bytes, enum.Enum):
     ADDRESS_TYPE_NOT_SUPPORTED = b"\x08"
 
 
+AUTH_METHODS = byte_enum_table(SOCKS5AuthMethod)
+COMMANDS = byte_enum_table(SOCKS5Command)
+ATYPES = byte_enum_table(SOCKS5AType)
+REPLY_CODES = byte_enum_table(SOCKS5ReplyCode)
+ADDRESS_TYPES = {
+    SOCKS5AType.IPV4_ADDRESS: AddressType.IPV4,
+    SOCKS5AType.DOMAIN_NAME: AddressType.DN,
+    SOCKS5AType.IPV6_ADDRESS: AddressType.IPV6,
+}
+
+BATCH_COMMAND_STRUCTS = {
+    AddressType.IPV4: (IPV4_COMMAND_STRUCT, SOCKS5AType.IPV4_ADDRESS),
+    AddressType.IPV6: (IPV6_COMMAND_STRUCT, SOCKS5AType.IPV6_ADDRESS),
+}
+
+
 class SOCKS5AuthMethodsRequest(typing.NamedTuple):
     """Encapsulates a request to the proxy for available authentication methods.
 
@@ -70,16 +119,68 @@ class SOCKS5AuthMethodsRequest(typing.NamedTuple):
 
     methods: typing.List[SOCKS5AuthMethod]
 
+    @classmethod
+    def loads(cls, data: ReadableBuffer, offset: int = 0) -> "SOCKS5AuthMethodsRequest":
+        """Unpacks the authentication methods request data into an instance.
+
+        Methods without a member in :class:`SOCKS5AuthMethod`, such as private
+        methods, are left out as they cannot be selected anyway.
+
+        Args:
+            data: A buffer holding the request from ``offset`` to its end.
+            offset: The position of the request within ``data``.
+
+        Returns:
+            The unpacked authentication methods request instance.
+
+        Raises:
+            ProtocolError: If the data does not match the spec.
+        """
+        if (
+            len(data) - offset < 2
+            or data[offset] != 5
+            or len(data) - offset != 2 + data[offset + 1]
+        ):
+            raise ProtocolError("Malformed request")
+
+        methods = []
+        for index in range(offset + 2, len(data)):
+            method = AUTH_METHODS[data[index]]
+            if method is not None:
+                methods.append(method)
+        return cls(methods=methods)
+
     def dumps(self) -> bytes:
         """Packs the instance into a raw binary in the appropriate form."""
+        buf = bytearray(self.packed_size())
+        self.write_into(buf)
+        return bytes(buf)
 
-        return b"".join(
-            [
-                b"\x05",
-                len(self.methods).to_bytes(1, byteorder="big"),
-                b"".join(self.methods),
-            ]
-        )
+    def packed_size(self) -> int:
+        """Returns the length in bytes of the packed request."""
+        return 2 + len(self.methods)
+
+    def write_into(self, buf: WritableBuffer, offset: int = 0) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the request at.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            ValueError: If the request does not fit in the buffer.
+        """
+        size = 2 + len(self.methods)
+        check_buffer_size(buf, offset, size)
+
+        buf[offset] = 5
+        buf[offset + 1] = len(self.methods)
+        for index, method in enumerate(self.methods, offset + 2):
+            buf[index] = method[0]
+        return size
 
 
 class SOCKS5AuthReply(typing.NamedTuple):
@@ -95,22 +196,56 @@ class SOCKS5AuthReply(typing.NamedTuple):
     method: SOCKS5AuthMethod
 
     @classmethod
-    def loads(cls, data: bytes) -> "SOCKS5AuthReply":
+    def loads(cls, data: ReadableBuffer, offset: int = 0) -> "SOCKS5AuthReply":
         """Unpacks the authentication reply data into an instance.
 
+        Args:
+            data: A buffer holding the reply from ``offset`` to its end.
+            offset: The position of the reply within ``data``.
+
         Returns:
             The unpacked authentication reply instance.
 
         Raises:
             ProtocolError: If the data does not match the spec.
         """
-        if len(data) != 2:
+        if len(data) - offset != 2:
             raise ProtocolError("Malformed reply")
 
-        try:
-            return cls(method=SOCKS5AuthMethod(data[1:2]))
-        except ValueError as exc:
-            raise ProtocolError("Malformed reply") from exc
+        method = AUTH_METHODS[data[offset + 1]]
+        if method is None:
+            raise ProtocolError("Malformed reply")
+        return cls(method=method)
+
+    def dumps(self) -> bytes:
+        """Packs the instance into a raw binary in the appropriate form.
+
+        Returns:
+            The packed reply.
+        """
+        return bytes((5, self.method[0]))
+
+    def packed_size(self) -> int:
+        """Returns the length in bytes of the packed reply."""
+        return 2
+
+    def write_into(self, buf: WritableBuffer, offset: int = 0) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the reply at.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            ValueError: If the reply does not fit in the buffer.
+        """
+        check_buffer_size(buf, offset, 2)
+        buf[offset] = 5
+        buf[offset + 1] = self.method[0]
+        return 2
 
 
 class SOCKS5UsernamePasswordRequest(typing.NamedTuple):
@@ -119,21 +254,71 @@ class SOCKS5UsernamePasswordRequest(typing.NamedTuple):
     username: bytes
     password: bytes
 
+    @classmethod
+    def loads(
+        cls, data: ReadableBuffer, offset: int = 0
+    ) -> "SOCKS5UsernamePasswordRequest":
+        """Unpacks the username/password authentication request data into an
+        instance.
+
+        Args:
+            data: A buffer holding the request from ``offset`` to its end.
+            offset: The position of the request within ``data``.
+
+        Returns:
+            The unpacked username/password request instance.
+
+        Raises:
+            ProtocolError: If the data does not match the spec.
+        """
+        length = _username_password_frame_length(data, offset)
+        if length is None or len(data) - offset != length or data[offset] != 1:
+            raise ProtocolError("Malformed request")
+
+        password_offset = offset + 2 + data[offset + 1]
+        with memoryview(data) as view:
+            return cls(
+                username=bytes(view[offset + 2 : password_offset]),
+                password=bytes(view[password_offset + 1 :]),
+            )
+
     def dumps(self) -> bytes:
         """Packs the instance into a raw binary in the appropriate form.
 
         Returns:
             The packed request.
         """
-        return b"".join(
-            [
-                b"\x01",
-                len(self.username).to_bytes(1, byteorder="big"),
-                self.username,
-                len(self.password).to_bytes(1, byteorder="big"),
-                self.password,
-            ]
-        )
+        buf = bytearray(self.packed_size())
+        self.write_into(buf)
+        return bytes(buf)
+
+    def packed_size(self) -> int:
+        """Returns the length in bytes of the packed request."""
+        return 3 + len(self.username) + len(self.password)
+
+    def write_into(self, buf: WritableBuffer, offset: int = 0) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the request at.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            ValueError: If the request does not fit in the buffer.
+        """
+        size = 3 + len(self.username) + len(self.password)
+        check_buffer_size(buf, offset, size)
+
+        buf[offset] = 1
+        buf[offset + 1] = len(self.username)
+        password_offset = offset + 2 + len(self.username)
+        buf[offset + 2 : password_offset] = self.username
+        buf[password_offset] = len(self.password)
+        buf[password_offset + 1 : offset + size] = self.password
+        return size
 
 
 class SOCKS5UsernamePasswordReply(typing.NamedTuple):
@@ -142,13 +327,53 @@ class SOCKS5UsernamePasswordReply(typing.NamedTuple):
     success: bool
 
     @classmethod
-    def loads(cls, data: bytes) -> "SOCKS5UsernamePasswordReply":
+    def loads(
+        cls, data: ReadableBuffer, offset: int = 0
+    ) -> "SOCKS5UsernamePasswordReply":
         """Unpacks the reply authentication data into an instance.
 
+        Args:
+            data: A buffer holding the reply from ``offset`` to its end.
+            offset: The position of the reply within ``data``.
+
         Returns:
             The unpacked authentication reply instance.
         """
-        return cls(success=data == b"\x01\x00")
+        return cls(
+            success=len(data) - offset == 2
+            and data[offset] == 1
+            and data[offset + 1] == 0
+        )
+
+    def dumps(self) -> bytes:
+        """Packs the instance into a raw binary in the appropriate form.
+
+        Returns:
+            The packed reply.
+        """
+        return b"\x01\x00" if self.success else b"\x01\x01"
+
+    def packed_size(self) -> int:
+        """Returns the length in bytes of the packed reply."""
+        return 2
+
+    def write_into(self, buf: WritableBuffer, offset: int = 0) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the reply at.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            ValueError: If the reply does not fit in the buffer.
+        """
+        check_buffer_size(buf, offset, 2)
+        buf[offset] = 1
+        buf[offset + 1] = 0 if self.success else 1
+        return 2
 
 
 class SOCKS5CommandRequest(typing.NamedTuple):
@@ -194,22 +419,141 @@ class SOCKS5CommandRequest(typing.NamedTuple):
             port=port,
         )
 
+    @classmethod
+    def loads(cls, data: ReadableBuffer, offset: int = 0) -> "SOCKS5CommandRequest":
+        """Unpacks the command request data into an instance.
+
+        Args:
+            data: A buffer holding the request from ``offset`` to its end.
+            offset: The position of the request within ``data``.
+
+        Returns:
+            The unpacked command request instance.
+
+        Raises:
+            ProtocolError: If the data does not match the spec.
+        """
+        if len(data) - offset != _frame_length(data, offset, "request"):
+            raise ProtocolError("Malformed request")
+
+        version, command_value, _, frame_atypevalue = HEADER_STRUCT.unpack_from(
+            data, offset
+        )
+        command = COMMANDS[command_value]
+        atype = ATYPES[frame_atypevalue]
+        if version != 5 or command is None or atype is None:
+            raise ProtocolError("Malformed request")
+
+        addr_offset = offset + 4
+        if atype == SOCKS5AType.DOMAIN_NAME:
+            addr_offset += 1
+        with memoryview(data) as view:
+            addr = bytes(view[addr_offset : len(data) - 2])
+        return cls(
+            command=command,
+            atype=atype,
+            addr=addr,
+            port=PORT_STRUCT.unpack_from(data, len(data) - 2)[0],
+        )
+
+    @classmethod
+    def dumps_batch(
+        cls,
+        command: SOCKS5Command,
+        addresses: typing.Iterable[
+            typing.Union[StrOrBytes, typing.Tuple[StrOrBytes, int]]
+        ],
+    ) -> typing.Tuple[bytearray, "array.array[int]"]:
+        """Packs requests for many addresses into a single contiguous buffer.
+
+        Equivalent to calling :meth:`from_address` and :meth:`dumps` for each
+        address and concatenating the results, without creating the intermediate
+        objects.
+
+        Args:
+            command: The command to request for every address.
+            addresses: An iterable of addresses in any form accepted by
+                :meth:`from_address`. Other sequences of host and port, such as the
+                records of a NumPy structured array, are accepted as well.
+
+        Returns:
+            A tuple of the buffer and an array of offsets, request ``i`` occupies
+            ``buffer[offsets[i]:offsets[i + 1]]``.
+        """
+        frames = []
+        size = 0
+        for address in addresses:
+            if not isinstance(address, (str, bytes, tuple)):
+                address = tuple(address)
+            host, port = get_address_port_tuple_from_address(address)
+            atype, encoded_addr = encode_address(host)
+            if atype is AddressType.DN:
+                frame_struct = _domain_name_command_struct(len(encoded_addr))
+                fields: typing.Tuple[typing.Any, ...] = (
+                    SOCKS5AType.DOMAIN_NAME,
+                    len(encoded_addr),
+                    encoded_addr,
+                    port,
+                )
+            else:
+                frame_struct, frame_atype = BATCH_COMMAND_STRUCTS[atype]
+                fields = (frame_atype, encoded_addr, port)
+            frames.append((frame_struct, fields))
+            size += frame_struct.size
+
+        buf = bytearray(size)
+        offsets = array.array("I", [0]) * (len(frames) + 1)
+        offset = 0
+        for index, (frame_struct, fields) in enumerate(frames, 1):
+            frame_struct.pack_into(buf, offset, 5, command, 0, *fields)
+            offset += frame_struct.size
+            offsets[index] = offset
+        return buf, offsets
+
     def dumps(self) -> bytes:
         """Packs the instance into a raw binary in the appropriate form.
 
         Returns:
             The packed request.
         """
-        return b"".join(
-            [
-                b"\x05",
-                self.command,
-                b"\x00",
-                self.atype,
-                self.packed_addr,
-                (self.port).to_bytes(2, byteorder="big"),
-            ]
-        )
+        return pack_socks5_command(self.command[0], self.atype[0], self.addr, self.port)
+
+    def packed_size(self) -> int:
+        """Returns the length in bytes of the packed request."""
+        size = COMMAND_HEADER_STRUCT.size + len(self.addr) + PORT_STRUCT.size
+        if self.atype == SOCKS5AType.DOMAIN_NAME:
+            size += 1
+        return size
+
+    def write_into(self, buf: WritableBuffer, offset: int = 0) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the request at.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            ValueError: If the request does not fit in the buffer.
+        """
+        size = self.packed_size()
+        check_buffer_size(buf, offset, size)
+
+        COMMAND_HEADER_STRUCT.pack_into(buf, offset, 5, self.command, 0, self.atype)
+        addr_offset = offset + COMMAND_HEADER_STRUCT.size
+        if self.atype == SOCKS5AType.DOMAIN_NAME:
+            buf[addr_offset] = len(self.addr)
+            addr_offset += 1
+        elif self.atype == SOCKS5AType.IPV4_ADDRESS:
+            assert len(self.addr) == 4
+        else:
+            assert len(self.addr) == 16
+        port_offset = addr_offset + len(self.addr)
+        buf[addr_offset:port_offset] = self.addr
+        PORT_STRUCT.pack_into(buf, port_offset, self.port)
+        return size
 
     @property
     def packed_addr(self) -> bytes:
@@ -241,55 +585,414 @@ class SOCKS5Reply(typing.NamedTuple):
     port: int
 
     @classmethod
-    def loads(cls, data: bytes) -> "SOCKS5Reply":
+    def loads(cls, data: ReadableBuffer, offset: int = 0) -> "SOCKS5Reply":
         """Unpacks the reply data into an instance.
 
+        Args:
+            data: A buffer holding the reply from ``offset`` to its end.
+            offset: The position of the reply within ``data``.
+
         Returns:
             The unpacked reply instance.
 
         Raises:
             ProtocolError: If the data does not match the spec.
         """
-        if data[0:1] != b"\x05":
+        (
+            reply_code,
+            frame_atypevalue,
+            addr,
+            addr_offset,
+            addr_length,
+            port,
+        ) = unpack_socks5_reply(data, offset)
+        atype = ATYPES[frame_atypevalue]
+        code = REPLY_CODES[reply_code]
+        if atype is None or code is None:
             raise ProtocolError("Malformed reply")
 
-        try:
-            atype = SOCKS5AType(data[3:4])
+        if addr is None:
+            try:
+                addr = unpack_address(
+                    ADDRESS_TYPES[atype], data, addr_offset, addr_length
+                )
+            except ValueError as exc:
+                raise ProtocolError("Malformed reply") from exc
 
-            return cls(
-                reply_code=SOCKS5ReplyCode(data[1:2]),
-                atype=atype,
-                addr=decode_address(AddressType.from_socks5_atype(atype), data[4:-2]),
-                port=int.from_bytes(data[-2:], byteorder="big"),
+        return cls(
+            reply_code=code,
+            atype=atype,
+            addr=addr,
+            port=port,
+        )
+
+    @classmethod
+    def from_address(
+        cls,
+        reply_code: SOCKS5ReplyCode,
+        address: typing.Union[StrOrBytes, typing.Tuple[StrOrBytes, int]],
+    ) -> "SOCKS5Reply":
+        """Convenience class method to build an instance from a reply code and the
+        bound address.
+
+        Args:
+            reply_code: The code representing the type of reply.
+            address: A string in the form 'HOST:PORT' or a tuple of ip address string
+                and port number. The address type will be inferred.
+
+        Returns:
+            A SOCKS5Reply instance.
+        """
+        host, port = get_address_port_tuple_from_address(address)
+        atype, _ = encode_address(host)
+        return cls(
+            reply_code=reply_code,
+            atype=SOCKS5AType.from_atype(atype),
+            addr=host,
+            port=port,
+        )
+
+    def dumps(self) -> bytes:
+        """Packs the instance into a raw binary in the appropriate form.
+
+        Returns:
+            The packed reply.
+        """
+        buf = bytearray(self.packed_size())
+        self.write_into(buf)
+        return bytes(buf)
+
+    def packed_size(self) -> int:
+        """Returns the length in bytes of the packed reply."""
+        size = HEADER_STRUCT.size + len(self._packed_addr()) + PORT_STRUCT.size
+        if self.atype == SOCKS5AType.DOMAIN_NAME:
+            size += 1
+        return size
+
+    def write_into(self, buf: WritableBuffer, offset: int = 0) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the reply at.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            ValueError: If the reply does not fit in the buffer or the address
+                does not match the address type.
+        """
+        addr = self._packed_addr()
+        size = self.packed_size()
+        check_buffer_size(buf, offset, size)
+
+        HEADER_STRUCT.pack_into(buf, offset, 5, self.reply_code[0], 0, self.atype[0])
+        addr_offset = offset + HEADER_STRUCT.size
+        if self.atype == SOCKS5AType.DOMAIN_NAME:
+            buf[addr_offset] = len(addr)
+            addr_offset += 1
+        port_offset = addr_offset + len(addr)
+        buf[addr_offset:port_offset] = addr
+        PORT_STRUCT.pack_into(buf, port_offset, self.port)
+        return size
+
+    def _packed_addr(self) -> bytes:
+        address_type, encoded_addr = encode_address(self.addr)
+        if address_type != ADDRESS_TYPES[self.atype]:
+            raise ValueError(
+                "Address {!r} does not match {}".format(self.addr, self.atype)
             )
-        except ValueError as exc:
-            raise ProtocolError("Malformed reply") from exc
+        return encoded_addr
+
+
+def _username_password_frame_length(
+    data: ReadableBuffer, offset: int = 0
+) -> typing.Optional[int]:
+    """Returns the total length of a username/password request starting at
+    ``offset``, or None if not enough data is available to determine it.
+    """
+    if len(data) - offset < 2:
+        return None
+    password_length_offset = offset + 2 + data[offset + 1]
+    if len(data) <= password_length_offset:
+        return None
+    return password_length_offset - offset + 1 + data[password_length_offset]
 
 
 class SOCKS5Datagram(typing.NamedTuple):
     """Encapsulates a SOCKS5 datagram for UDP connections.
 
-    Currently not implemented.
+    Args:
+        atype: The address type of the addr field.
+        addr: Address of the destination or source host.
+        port: The port number of the destination or source host.
+        data: The datagram payload. When unpacked from a memoryview this is a view
+            of the original buffer rather than a copy.
+        fragment: The position of the fragment in its fragment sequence, 0 for
+            standalone datagrams.
+        last_fragment: Whether this is the final fragment of its sequence.
     """
 
     atype: SOCKS5AType
     addr: bytes
     port: int
-    data: bytes
+    data: ReadableBuffer
 
-    fragment: int
-    last_fragment: bool
+    fragment: int = 0
+    last_fragment: bool = False
 
     @classmethod
-    def loads(cls, data: bytes) -> "SOCKS5Datagram":
-        raise NotImplementedError()  # pragma: nocover
+    def from_address(
+        cls,
+        address: typing.Union[StrOrBytes, typing.Tuple[StrOrBytes, int]],
+        data: ReadableBuffer,
+        fragment: int = 0,
+        last_fragment: bool = False,
+    ) -> "SOCKS5Datagram":
+        """Convenience class method to build an instance from an address.
+
+        Args:
+            address: A string in the form 'HOST:PORT' or a tuple of ip address string
+                and port number. The address type will be inferred.
+            data: The datagram payload.
+            fragment: The position of the fragment in its fragment sequence.
+            last_fragment: Whether this is the final fragment of its sequence.
+
+        Returns:
+            A SOCKS5Datagram instance.
+        """
+        address, port = get_address_port_tuple_from_address(address)
+        atype, encoded_addr = encode_address(address)
+        return cls(
+            atype=SOCKS5AType.from_atype(atype),
+            addr=encoded_addr,
+            port=port,
+            data=data,
+            fragment=fragment,
+            last_fragment=last_fragment,
+        )
+
+    @classmethod
+    def loads(cls, data: ReadableBuffer, offset: int = 0) -> "SOCKS5Datagram":
+        """Unpacks a datagram into an instance.
+
+        Args:
+            data: A buffer holding the datagram from ``offset`` to its end.
+            offset: The position of the datagram within ``data``.
+
+        Returns:
+            The unpacked datagram instance.
+
+        Raises:
+            ProtocolError: If the data does not match the spec.
+        """
+        header_length = _frame_length(data, offset, "datagram")
+        if header_length is None or len(data) - offset < header_length:
+            raise ProtocolError("Malformed datagram")
+
+        reserved, frag, frame_atypevalue = DATAGRAM_HEADER_STRUCT.unpack_from(
+            data, offset
+        )
+        if reserved != 0:
+            raise ProtocolError("Malformed datagram")
+
+        atype = ATYPES[frame_atypevalue]
+        if atype is None:  # pragma: nocover
+            raise ProtocolError("Malformed datagram")
+        addr_offset = offset + DATAGRAM_HEADER_STRUCT.size
+        payload_offset = offset + header_length
+        if atype == SOCKS5AType.DOMAIN_NAME:
+            addr_offset += 1
+        with memoryview(data) as view:
+            addr = bytes(view[addr_offset : payload_offset - 2])
+        return cls(
+            atype=atype,
+            addr=addr,
+            port=PORT_STRUCT.unpack_from(data, payload_offset - 2)[0],
+            data=data[payload_offset:],
+            fragment=frag & 0x7F,
+            last_fragment=bool(frag & 0x80),
+        )
 
     def dumps(self) -> bytes:
-        raise NotImplementedError()  # pragma: nocover
+        """Packs the instance into a raw binary in the appropriate form.
+
+        Returns:
+            The packed datagram.
+        """
+        buf = bytearray(self.packed_size())
+        self.write_into(buf)
+        return bytes(buf)
+
+    def pack_header(self) -> bytes:
+        """Packs only the header preceding the payload.
+
+        Useful to send the datagram with ``socket.sendmsg([header, data])`` without
+        copying the payload.
+        """
+        buf = bytearray(self.packed_size() - len(self.data))
+        self._write_header_into(buf, 0)
+        return bytes(buf)
+
+    def packed_size(self) -> int:
+        """Returns the length in bytes of the packed datagram."""
+        size = DATAGRAM_HEADER_STRUCT.size + len(self.addr) + PORT_STRUCT.size
+        if self.atype == SOCKS5AType.DOMAIN_NAME:
+            size += 1
+        return size + len(self.data)
+
+    def write_into(self, buf: WritableBuffer, offset: int = 0) -> int:
+        """Packs the instance directly into a writable buffer.
+
+        Args:
+            buf: A writable buffer, i.e. a bytearray or a memoryview of one.
+            offset: The position in ``buf`` to write the datagram at.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            ValueError: If the datagram does not fit in the buffer.
+        """
+        size = self.packed_size()
+        check_buffer_size(buf, offset, size)
+
+        payload_offset = self._write_header_into(buf, offset)
+        buf[payload_offset : offset + size] = self.data
+        return size
+
+    def _write_header_into(self, buf: WritableBuffer, offset: int) -> int:
+        if not 0 <= self.fragment <= 127:
+            raise ValueError("Fragment position must be between 0 and 127")
+        frag = (self.fragment | 0x80) if self.last_fragment else self.fragment
+        DATAGRAM_HEADER_STRUCT.pack_into(buf, offset, 0, frag, self.atype[0])
+        addr_offset = offset + DATAGRAM_HEADER_STRUCT.size
+        if self.atype == SOCKS5AType.DOMAIN_NAME:
+            buf[addr_offset] = len(self.addr)
+            addr_offset += 1
+        port_offset = addr_offset + len(self.addr)
+        buf[addr_offset:port_offset] = self.addr
+        PORT_STRUCT.pack_into(buf, port_offset, self.port)
+        return port_offset + PORT_STRUCT.size
+
+
+class _FragmentSequence:
+    def __init__(self, deadline: float) -> None:
+        self.deadline = deadline
+        self.fragments: typing.List[bytes] = []
+        self.size = 0
+
+
+class SOCKS5ReassemblyQueue:
+    """Reassembles fragmented SOCKS5 datagrams as described in RFC 1928.
+
+    A fragment sequence is tracked per source address. Sequences are discarded
+    when their reassembly timer expires, when a fragment arrives out of order or
+    when buffering them would exceed ``max_size`` bytes, in which case the oldest
+    sequences are dropped first.
+
+    Args:
+        timeout: Seconds allowed to receive all the fragments of a sequence, RFC
+            1928 requires at least 5 seconds.
+        max_size: The maximum number of payload bytes buffered across all pending
+            sequences.
+    """
+
+    def __init__(self, timeout: float = 5.0, max_size: int = 65535) -> None:
+        self.timeout = timeout
+        self.max_size = max_size
+
+        self._sequences: typing.Dict[
+            typing.Tuple[SOCKS5AType, bytes, int], _FragmentSequence
+        ] = collections.OrderedDict()
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Returns the number of pending fragment sequences."""
+        return len(self._sequences)
+
+    @property
+    def buffered_size(self) -> int:
+        """Returns the number of payload bytes currently buffered."""
+        return self._size
+
+    def feed(
+        self, datagram: SOCKS5Datagram, now: typing.Optional[float] = None
+    ) -> typing.Optional[SOCKS5Datagram]:
+        """Adds a datagram to the queue.
+
+        Args:
+            datagram: A received datagram, fragmented or not.
+            now: The current ``time.monotonic()`` value, looked up if omitted.
+
+        Returns:
+            The complete datagram if ``datagram`` was standalone or completed its
+            fragment sequence, None otherwise.
+        """
+        if datagram.fragment == 0:
+            return datagram
+
+        now = time.monotonic() if now is None else now
+        self.expire(now)
+        key = (datagram.atype, datagram.addr, datagram.port)
+        sequence = self._sequences.get(key)
+        if datagram.fragment == 1:
+            if sequence is not None:
+                self._discard(key)
+            sequence = _FragmentSequence(now + self.timeout)
+            self._sequences[key] = sequence
+        elif sequence is None or datagram.fragment != len(sequence.fragments) + 1:
+            if sequence is not None:
+                self._discard(key)
+            return None
+
+        if sequence.size + len(datagram.data) > self.max_size:
+            self._discard(key)
+            return None
+        if self._size + len(datagram.data) > self.max_size:
+            # Evict the oldest other sequences, the current one fits on its own.
+            for other in [other for other in self._sequences if other != key]:
+                self._discard(other)
+                if self._size + len(datagram.data) <= self.max_size:
+                    break
+
+        # Fragments are copied as they may be views of a reused receive buffer.
+        sequence.fragments.append(bytes(datagram.data))
+        sequence.size += len(datagram.data)
+        self._size += len(datagram.data)
+
+        if not datagram.last_fragment:
+            return None
+        self._discard(key)
+        return datagram._replace(
+            data=b"".join(sequence.fragments), fragment=0, last_fragment=False
+        )
+
+    def expire(self, now: typing.Optional[float] = None) -> None:
+        """Discards the sequences whose reassembly timer has expired."""
+        now = time.monotonic() if now is None else now
+        # Sequences are kept in the order they started, which with a fixed timeout
+        # is the order of their deadlines, so only the front needs checking.
+        sequences = self._sequences
+        while sequences:
+            key = next(iter(sequences))
+            if sequences[key].deadline > now:
+                break
+            self._discard(key)
+
+    def _discard(self, key: typing.Tuple[SOCKS5AType, bytes, int]) -> None:
+        self._size -= self._sequences.pop(key).size
 
 
 class SOCKS5State(enum.IntEnum):
-    """Enumeration of SOCKS5 protocol states."""
+    """Enumeration of SOCKS5 protocol states.
+
+    A BIND request is answered with two replies, the first one with the address
+    the proxy listens on is handled like the reply to any other command. After it
+    the connection waits in ``SERVER_BIND_CONNECTION_REPLY`` for the second reply,
+    sent once the peer has connected to that address.
+    """
 
     CLIENT_AUTH_REQUIRED = 1
     SERVER_AUTH_REPLY = 2
@@ -298,102 +1001,577 @@ class SOCKS5State(enum.IntEnum):
     CLIENT_WAITING_FOR_USERNAME_PASSWORD = 5
     SERVER_VERIFY_USERNAME_PASSWORD = 6
     MUST_CLOSE = 7
+    SERVER_COMMAND_REPLY = 8
+    SERVER_BIND_CONNECTION_REPLY = 9
+
+
+SOCKS5RequestType = typing.Union[
+    SOCKS5AuthMethodsRequest, SOCKS5UsernamePasswordRequest, SOCKS5CommandRequest
+]
+ReplyType = typing.TypeVar(
+    "ReplyType", SOCKS5AuthReply, SOCKS5UsernamePasswordReply, SOCKS5Reply
+)
+SOCKS5ServerReplyType = typing.Union[
+    SOCKS5AuthReply, SOCKS5UsernamePasswordReply, SOCKS5Reply
+]
+
 
+class _SOCKS5ConnectionBase(StreamConnection):
+    """Dispatch of :meth:`send` shared by the client and server connections."""
 
-SOCKS5RequestType = typing.Union[SOCKS5AuthMethodsRequest, SOCKS5CommandRequest]
+    # Maps the type of each message sent to the name of its send method.
+    _send_methods: typing.ClassVar[typing.Dict[type, str]]
+
+    def _dispatch_send(self, message: typing.Any) -> None:
+        try:
+            name = self._send_methods[type(message)]
+        except KeyError:
+            name = self._send_method_for(type(message))
+        getattr(self, name)(message)
+
+    @classmethod
+    def _send_method_for(cls, message_type: type) -> str:
+        """Finds the send method for a subclass of a message type and caches it."""
+        for base in message_type.__mro__:
+            if base in cls._send_methods:
+                name = cls._send_methods[message_type] = cls._send_methods[base]
+                return name
+        raise NotImplementedError(
+            "Cannot send {} objects".format(message_type.__name__)
+        )
 
 
-class SOCKS5Connection:
+class SOCKS5Connection(_SOCKS5ConnectionBase):
     """Encapsulates a SOCKS5 connection.
 
     Packs request objects into data suitable to be send and unpacks reply
     data into their appropriate reply objects.
+
+    Args:
+        pipelined: Allows queueing the username/password and command requests
+            before the replies to the previous requests have been received, as long
+            as a single authentication method was requested. All the requests can
+            then be sent in one flight and the replies are unpacked in order by
+            successive :meth:`receive_data` calls.
+        observer: Optional :class:`~socksio.observer.ConnectionObserver` notified
+            of state transitions and of every frame sent and parsed.
     """
 
-    def __init__(self) -> None:
-        self._data_to_send = bytearray()
-        self._received_data = bytearray()
+    def __init__(
+        self,
+        pipelined: bool = False,
+        observer: typing.Optional[ConnectionObserver] = None,
+    ) -> None:
+        super().__init__()
+        self.pipelined = pipelined
+        self._observer = observer
+
         self._state = SOCKS5State.CLIENT_AUTH_REQUIRED
+        self._auth_methods_requested: typing.List[SOCKS5AuthMethod] = []
+        self._username_password_queued = False
+        self._command: typing.Optional[SOCKS5Command] = None
 
     @property
     def state(self) -> SOCKS5State:
         """Returns the current state of the protocol."""
         return self._state
 
-    @singledispatchmethod
+    @property
+    def bytes_needed(self) -> int:
+        """Returns the minimum number of bytes to receive before the next reply can
+        be unpacked or its length determined, 0 if no reply is expected.
+
+        Reading at most this many bytes from the network never consumes data past
+        the end of the handshake.
+        """
+        buffered = len(self._received_data)
+        if self._state in (
+            SOCKS5State.SERVER_AUTH_REPLY,
+            SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD,
+        ):
+            return max(2 - buffered, 0)
+        if self._state in (
+            SOCKS5State.CLIENT_AUTHENTICATED,
+            SOCKS5State.SERVER_BIND_CONNECTION_REPLY,
+        ):
+            frame_length = _frame_length(self._received_data, 0, "reply")
+            if frame_length is None:
+                return 5 - buffered
+            return max(frame_length - buffered, 0)
+        return 0
+
     def send(self, request: SOCKS5RequestType) -> None:
         """Packs a request object and adds it to the send data buffer.
 
-        Also progresses the protocol state of the connection.
+        Also progresses the protocol state of the connection. Dispatches to
+        :meth:`send_auth_methods`, :meth:`send_credentials` or
+        :meth:`send_command` depending on the type of the request.
 
         Args:
             request: The request instance to be packed.
         """
-        raise NotImplementedError()  # pragma: nocover
+        self._dispatch_send(request)
 
-    @send.register(SOCKS5AuthMethodsRequest)
-    def _auth_methods(self, request: SOCKS5AuthMethodsRequest) -> None:
-        self._data_to_send += request.dumps()
+    def send_auth_methods(self, request: SOCKS5AuthMethodsRequest) -> None:
+        """Packs an authentication methods request and adds it to the send data
+        buffer.
+
+        Args:
+            request: The request instance to be packed.
+        """
+        state = self._state
+        self._data_to_send.write(request.packed_size(), request.write_into)
+        self._auth_methods_requested = list(request.methods)
         self._state = SOCKS5State.SERVER_AUTH_REPLY
+        if self._observer is not None:
+            notify_sent(self._observer, self, request, state)
+
+    def send_credentials(self, request: SOCKS5UsernamePasswordRequest) -> None:
+        """Packs a username/password authentication request and adds it to the
+        send data buffer.
+
+        Args:
+            request: The request instance to be packed.
 
-    @send.register(SOCKS5UsernamePasswordRequest)
-    def _auth_username_password(self, request: SOCKS5UsernamePasswordRequest) -> None:
-        if self._state != SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD:
+        Raises:
+            ProtocolError: If the proxy did not select username/password
+                authentication and the request cannot be pipelined.
+        """
+        state = self._state
+        waiting = state == SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD
+        if not waiting and (
+            self._pipelining_auth_method() != SOCKS5AuthMethod.USERNAME_PASSWORD
+            or self._username_password_queued
+        ):
             raise ProtocolError("Not currently waiting for username and password")
-        self._state = SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD
-        self._data_to_send += request.dumps()
+        self._data_to_send.write(request.packed_size(), request.write_into)
+        if waiting:
+            self._state = SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD
+        else:
+            self._username_password_queued = True
+        if self._observer is not None:
+            notify_sent(self._observer, self, request, state)
+
+    def send_command(self, request: SOCKS5CommandRequest) -> None:
+        """Packs a command request and adds it to the send data buffer.
+
+        Args:
+            request: The request instance to be packed.
 
-    @send.register(SOCKS5CommandRequest)
-    def _command(self, request: SOCKS5CommandRequest) -> None:
-        if self._state < SOCKS5State.CLIENT_AUTHENTICATED:
+        Raises:
+            ProtocolError: If the connection is not authenticated and the request
+                cannot be pipelined.
+        """
+        if self._state < SOCKS5State.CLIENT_AUTHENTICATED and not (
+            self._pipelining_auth_method() == SOCKS5AuthMethod.NO_AUTH_REQUIRED
+            or self._username_password_queued
+        ):
             raise ProtocolError(
                 "SOCKS5 connections must be authenticated before sending a request"
             )
-        self._data_to_send += request.dumps()
+        self._data_to_send.write(request.packed_size(), request.write_into)
+        self._command = request.command
+        if self._observer is not None:
+            notify_sent(self._observer, self, request, self._state)
+
+    _send_methods: typing.ClassVar[typing.Dict[type, str]] = {
+        SOCKS5AuthMethodsRequest: "send_auth_methods",
+        SOCKS5UsernamePasswordRequest: "send_credentials",
+        SOCKS5CommandRequest: "send_command",
+    }
+
+    def _pipelining_auth_method(self) -> typing.Optional[SOCKS5AuthMethod]:
+        """Returns the only authentication method the proxy can accept if further
+        requests can be pipelined behind the authentication methods request.
+        """
+        if (
+            self.pipelined
+            and self._state == SOCKS5State.SERVER_AUTH_REPLY
+            and len(self._auth_methods_requested) == 1
+        ):
+            return self._auth_methods_requested[0]
+        return None
 
     def receive_data(
-        self, data: bytes
-    ) -> typing.Union[SOCKS5AuthReply, SOCKS5Reply, SOCKS5UsernamePasswordReply]:
-        """Unpacks response data into a reply object.
+        self, data: ReadableBuffer
+    ) -> typing.Union[
+        SOCKS5AuthReply, SOCKS5Reply, SOCKS5UsernamePasswordReply, NeedData
+    ]:
+        """Buffers response data and unpacks the next complete reply object.
+
+        Data may be passed in arbitrarily sized chunks as it arrives from the
+        network, partial replies are kept in the connection's buffer until the
+        rest of the frame is received. When the buffer holds several replies, as
+        with pipelined requests, each call unpacks one of them and further replies
+        are unpacked by calling this method again, with empty data if needed. Any
+        data following the final reply is the start of the tunneled stream and can
+        be retrieved with :meth:`trailing_data`.
 
         Args:
             data: The raw response data from the proxy server.
 
         Returns:
-            A reply instance corresponding to the connection state and reply data.
+            A reply instance corresponding to the connection state and reply data,
+            or ``NEED_DATA`` if the buffered data does not contain a complete reply.
         """
+        if self._observer is None:
+            return self._receive_data(data)
+        return observe_receive(self._observer, self, self._receive_data, data)
+
+    def _receive_data(
+        self, data: ReadableBuffer
+    ) -> typing.Union[
+        SOCKS5AuthReply, SOCKS5Reply, SOCKS5UsernamePasswordReply, NeedData
+    ]:
+        self._received_data += data
+
         if self._state == SOCKS5State.SERVER_AUTH_REPLY:
-            auth_reply = SOCKS5AuthReply.loads(data)
+            auth_reply = self._next_frame(2, SOCKS5AuthReply.loads)
+            if auth_reply is None:
+                return NEED_DATA
             if auth_reply.method == SOCKS5AuthMethod.USERNAME_PASSWORD:
-                self._state = SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD
+                if self._username_password_queued:
+                    self._state = SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD
+                else:
+                    self._state = SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD
             elif auth_reply.method == SOCKS5AuthMethod.NO_AUTH_REQUIRED:
                 self._state = SOCKS5State.CLIENT_AUTHENTICATED
+            elif auth_reply.method == SOCKS5AuthMethod.NO_ACCEPTABLE_METHODS:
+                self._state = SOCKS5State.MUST_CLOSE
             return auth_reply
 
         if self._state == SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD:
-            username_password_reply = SOCKS5UsernamePasswordReply.loads(data)
+            username_password_reply = self._next_frame(
+                2, SOCKS5UsernamePasswordReply.loads
+            )
+            if username_password_reply is None:
+                return NEED_DATA
             if username_password_reply.success:
                 self._state = SOCKS5State.CLIENT_AUTHENTICATED
             else:
                 self._state = SOCKS5State.MUST_CLOSE
             return username_password_reply
 
-        if self._state == SOCKS5State.CLIENT_AUTHENTICATED:
-            reply = SOCKS5Reply.loads(data)
-            if reply.reply_code == SOCKS5ReplyCode.SUCCEEDED:
-                self._state = SOCKS5State.TUNNEL_READY
-            else:
+        if self._state in (
+            SOCKS5State.CLIENT_AUTHENTICATED,
+            SOCKS5State.SERVER_BIND_CONNECTION_REPLY,
+        ):
+            if self._received_data and self._received_data[0] != 5:
+                raise ProtocolError("Malformed reply")
+            frame_length = _frame_length(self._received_data, 0, "reply")
+            reply = (
+                None
+                if frame_length is None
+                else self._next_frame(frame_length, SOCKS5Reply.loads)
+            )
+            if reply is None:
+                return NEED_DATA
+            if reply.reply_code != SOCKS5ReplyCode.SUCCEEDED:
                 self._state = SOCKS5State.MUST_CLOSE
+            elif (
+                self._command == SOCKS5Command.BIND
+                and self._state == SOCKS5State.CLIENT_AUTHENTICATED
+            ):
+                self._state = SOCKS5State.SERVER_BIND_CONNECTION_REPLY
+            else:
+                self._state = SOCKS5State.TUNNEL_READY
 
             return reply
 
         raise NotImplementedError()  # pragma: nocover
 
-    def data_to_send(self) -> bytes:
-        """Returns the data to be sent via the I/O library of choice.
+    def _next_frame(
+        self, length: int, loads: typing.Callable[[ReadableBuffer], ReplyType]
+    ) -> typing.Optional[ReplyType]:
+        """Unpacks the next frame in the receive buffer and removes it from the
+        buffer, or returns None if the buffer does not hold ``length`` bytes yet.
+        """
+        return pop_frame(self._received_data, length, loads)
+
+
+class SOCKS5ServerConnection(_SOCKS5ConnectionBase):
+    """Encapsulates the proxy server side of a SOCKS5 connection.
+
+    Unpacks request data from a client into request objects and packs reply
+    objects into data suitable to be sent back. The states are shared with
+    :class:`SOCKS5Connection`: ``CLIENT_*`` states wait for a request from the
+    client and ``SERVER_*`` states wait for the application to send a reply.
+
+    Args:
+        max_buffer_size: The maximum number of bytes buffered before the tunnel is
+            ready, bounding the memory a client sending requests ahead of the
+            replies or never completing a frame can hold.
+        observer: Optional :class:`~socksio.observer.ConnectionObserver` notified
+            of state transitions and of every frame sent and parsed.
+    """
+
+    def __init__(
+        self,
+        max_buffer_size: int = 65536,
+        observer: typing.Optional[ConnectionObserver] = None,
+    ) -> None:
+        super().__init__()
+        self.max_buffer_size = max_buffer_size
+        self._observer = observer
+
+        self._state = SOCKS5State.CLIENT_AUTH_REQUIRED
+        self._auth_methods_offered: typing.List[SOCKS5AuthMethod] = []
+        self._command: typing.Optional[SOCKS5Command] = None
 
-        Also clears the connection's buffer.
+    @property
+    def state(self) -> SOCKS5State:
+        """Returns the current state of the protocol."""
+        return self._state
+
+    @property
+    def auth_methods_offered(self) -> typing.List[SOCKS5AuthMethod]:
+        """Returns the authentication methods offered by the client."""
+        return self._auth_methods_offered
+
+    @property
+    def bytes_needed(self) -> int:
+        """Returns the minimum number of bytes to receive before the next request
+        can be unpacked or its length determined, 0 if no request is expected.
         """
-        data = bytes(self._data_to_send)
-        self._data_to_send = bytearray()
-        return data
+        buffered = len(self._received_data)
+        if self._state == SOCKS5State.CLIENT_AUTH_REQUIRED:
+            if buffered < 2:
+                return 2 - buffered
+            return max(2 + self._received_data[1] - buffered, 0)
+        if self._state == SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD:
+            frame_length = _username_password_frame_length(self._received_data)
+            if frame_length is None:
+                if buffered < 2:
+                    return 2 - buffered
+                return 3 + self._received_data[1] - buffered
+            return max(frame_length - buffered, 0)
+        if self._state == SOCKS5State.CLIENT_AUTHENTICATED:
+            frame_length = _frame_length(self._received_data, 0, "request")
+            if frame_length is None:
+                return 5 - buffered
+            return max(frame_length - buffered, 0)
+        return 0
+
+    def receive_data(self, data: ReadableBuffer) -> typing.Union[
+        SOCKS5AuthMethodsRequest,
+        SOCKS5UsernamePasswordRequest,
+        SOCKS5CommandRequest,
+        NeedData,
+    ]:
+        """Buffers request data and unpacks the next complete request object.
+
+        Data may be passed in arbitrarily sized chunks as it arrives from the
+        network. Data received while a reply is pending, as sent by pipelining
+        clients, is buffered and unpacked by calling this method again, with empty
+        data if needed, once the reply has been sent. Any data following the
+        command request is the start of the tunneled stream and can be retrieved
+        with :meth:`trailing_data`.
+
+        Args:
+            data: The raw request data from the client.
+
+        Returns:
+            A request instance corresponding to the connection state and request
+            data, or ``NEED_DATA`` if the buffered data does not contain a complete
+            request or a reply must be sent first.
+
+        Raises:
+            ProtocolError: If the data does not match the spec or the client sent
+                more than ``max_buffer_size`` bytes ahead.
+        """
+        if self._observer is None:
+            return self._receive_data(data)
+        return observe_receive(self._observer, self, self._receive_data, data)
+
+    def _receive_data(self, data: ReadableBuffer) -> typing.Union[
+        SOCKS5AuthMethodsRequest,
+        SOCKS5UsernamePasswordRequest,
+        SOCKS5CommandRequest,
+        NeedData,
+    ]:
+        self._received_data += data
+        if len(self._received_data) > self.max_buffer_size:
+            self._state = SOCKS5State.MUST_CLOSE
+            raise ProtocolError("Receive buffer limit exceeded")
+
+        if self._state in (
+            SOCKS5State.CLIENT_AUTH_REQUIRED,
+            SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD,
+            SOCKS5State.CLIENT_AUTHENTICATED,
+        ):
+            try:
+                return self._unpack_request()
+            except ProtocolError:
+                self._state = SOCKS5State.MUST_CLOSE
+                raise
+
+        if self._state in (
+            SOCKS5State.SERVER_AUTH_REPLY,
+            SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD,
+            SOCKS5State.SERVER_COMMAND_REPLY,
+            SOCKS5State.SERVER_BIND_CONNECTION_REPLY,
+        ):
+            return NEED_DATA
+
+        raise ProtocolError("Not expecting any request")
+
+    def _unpack_request(self) -> typing.Union[
+        SOCKS5AuthMethodsRequest,
+        SOCKS5UsernamePasswordRequest,
+        SOCKS5CommandRequest,
+        NeedData,
+    ]:
+        """Unpacks the request expected in a ``CLIENT_*`` state from the receive
+        buffer."""
+        if self._state == SOCKS5State.CLIENT_AUTH_REQUIRED:
+            if self._received_data and self._received_data[0] != 5:
+                raise ProtocolError("Malformed request")
+            if len(self._received_data) < 2:
+                return NEED_DATA
+            methods_request = pop_frame(
+                self._received_data,
+                2 + self._received_data[1],
+                SOCKS5AuthMethodsRequest.loads,
+            )
+            if methods_request is None:
+                return NEED_DATA
+            self._auth_methods_offered = methods_request.methods
+            self._state = SOCKS5State.SERVER_AUTH_REPLY
+            return methods_request
+
+        if self._state == SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD:
+            frame_length = _username_password_frame_length(self._received_data)
+            credentials = (
+                None
+                if frame_length is None
+                else pop_frame(
+                    self._received_data,
+                    frame_length,
+                    SOCKS5UsernamePasswordRequest.loads,
+                )
+            )
+            if credentials is None:
+                return NEED_DATA
+            self._state = SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD
+            return credentials
+
+        if self._state == SOCKS5State.CLIENT_AUTHENTICATED:
+            if self._received_data and self._received_data[0] != 5:
+                raise ProtocolError("Malformed request")
+            frame_length = _frame_length(self._received_data, 0, "request")
+            command = (
+                None
+                if frame_length is None
+                else pop_frame(
+                    self._received_data, frame_length, SOCKS5CommandRequest.loads
+                )
+            )
+            if command is None:
+                return NEED_DATA
+            self._command = command.command
+            self._state = SOCKS5State.SERVER_COMMAND_REPLY
+            return command
+
+        raise NotImplementedError()  # pragma: nocover
+
+    def send(self, reply: SOCKS5ServerReplyType) -> None:
+        """Packs a reply object and adds it to the send data buffer.
+
+        Also progresses the protocol state of the connection. Dispatches to
+        :meth:`send_auth_reply`, :meth:`send_credentials_reply` or
+        :meth:`send_reply` depending on the type of the reply.
+
+        Args:
+            reply: The reply instance to be packed.
+        """
+        self._dispatch_send(reply)
+
+    def send_auth_reply(self, reply: SOCKS5AuthReply) -> None:
+        """Packs the reply selecting the authentication method and adds it to the
+        send data buffer.
+
+        Args:
+            reply: The reply instance to be packed.
+
+        Raises:
+            ProtocolError: If not currently replying to an authentication methods
+                request or the method was not offered by the client or is not
+                supported.
+        """
+        state = self._state
+        if state != SOCKS5State.SERVER_AUTH_REPLY:
+            raise ProtocolError("Not currently replying to authentication methods")
+        if reply.method == SOCKS5AuthMethod.NO_ACCEPTABLE_METHODS:
+            next_state = SOCKS5State.MUST_CLOSE
+        elif reply.method not in self._auth_methods_offered:
+            raise ProtocolError("Authentication method not offered by the client")
+        elif reply.method == SOCKS5AuthMethod.USERNAME_PASSWORD:
+            next_state = SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD
+        elif reply.method == SOCKS5AuthMethod.NO_AUTH_REQUIRED:
+            next_state = SOCKS5State.CLIENT_AUTHENTICATED
+        else:
+            raise ProtocolError("Unsupported authentication method")
+        self._data_to_send.write(reply.packed_size(), reply.write_into)
+        self._state = next_state
+        if self._observer is not None:
+            notify_sent(self._observer, self, reply, state)
+
+    def send_credentials_reply(self, reply: SOCKS5UsernamePasswordReply) -> None:
+        """Packs the username/password authentication reply and adds it to the
+        send data buffer.
+
+        Args:
+            reply: The reply instance to be packed.
+
+        Raises:
+            ProtocolError: If not currently verifying a username and password.
+        """
+        state = self._state
+        if state != SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD:
+            raise ProtocolError("Not currently verifying username and password")
+        self._data_to_send.write(reply.packed_size(), reply.write_into)
+        if reply.success:
+            self._state = SOCKS5State.CLIENT_AUTHENTICATED
+        else:
+            self._state = SOCKS5State.MUST_CLOSE
+        if self._observer is not None:
+            notify_sent(self._observer, self, reply, state)
+
+    def send_reply(self, reply: SOCKS5Reply) -> None:
+        """Packs the reply to the command request and adds it to the send data
+        buffer.
+
+        A successful first reply to a BIND request, with the address listened
+        on, moves to ``SERVER_BIND_CONNECTION_REPLY`` to send the second reply
+        once the peer has connected.
+
+        Args:
+            reply: The reply instance to be packed.
+
+        Raises:
+            ProtocolError: If not currently replying to a command request.
+        """
+        state = self._state
+        if state not in (
+            SOCKS5State.SERVER_COMMAND_REPLY,
+            SOCKS5State.SERVER_BIND_CONNECTION_REPLY,
+        ):
+            raise ProtocolError("Not currently replying to a command request")
+        self._data_to_send.write(reply.packed_size(), reply.write_into)
+        if reply.reply_code != SOCKS5ReplyCode.SUCCEEDED:
+            self._state = SOCKS5State.MUST_CLOSE
+        elif (
+            self._command == SOCKS5Command.BIND
+            and state == SOCKS5State.SERVER_COMMAND_REPLY
+        ):
+            self._state = SOCKS5State.SERVER_BIND_CONNECTION_REPLY
+        else:
+            self._state = SOCKS5State.TUNNEL_READY
+        if self._observer is not None:
+            notify_sent(self._observer, self, reply, state)
+
+    _send_methods: typing.ClassVar[typing.Dict[type, str]] = {
+        SOCKS5AuthReply: "send_auth_reply",
+        SOCKS5UsernamePasswordReply: "send_credentials_reply",
+        SOCKS5Reply: "send_reply",
+    }
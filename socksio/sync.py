@@ -0,0 +1,183 @@
+"""Blocking client helpers driving the sans-I/O connections over sockets."""
+
+import concurrent.futures
+import socket
+import typing
+
+from .handshake import (
+    Address,
+    HopTiming,
+    ProxyHop,
+    SocketStream,
+    chain_handshake,
+    check_protocol,
+    proxy_handshake,
+    run_sync,
+)
+from .utils import get_address_port_tuple_from_address
+
+
+def create_connection(
+    proxy: Address,
+    target: Address,
+    *,
+    protocol: str = "socks5",
+    auth: typing.Optional[typing.Tuple[bytes, bytes]] = None,
+    user_id: typing.Optional[bytes] = None,
+    timeout: typing.Optional[float] = None,
+    pipelined: bool = False,
+) -> socket.socket:
+    """Opens a tunnel to ``target`` through the SOCKS proxy at ``proxy``.
+
+    Args:
+        proxy: The proxy address as a 'HOST:PORT' string or a (host, port) tuple.
+        target: The address to connect to through the proxy, in the same forms.
+        protocol: One of 'socks4', 'socks4a' or 'socks5'.
+        auth: Optional (username, password) for SOCKS5 username/password
+            authentication.
+        user_id: The user ID to send to SOCKS4 and SOCKS4A proxies.
+        timeout: Timeout in seconds set on the socket, applying to the TCP
+            connection and to every read and write of the handshake. The socket is
+            returned with the timeout still set, as ``socket.create_connection()``
+            does. ``None`` blocks indefinitely.
+        pipelined: Sends the SOCKS5 authentication and CONNECT requests in a single
+            flight without waiting for each reply.
+
+    Returns:
+        The socket connected to the proxy with the tunnel established.
+
+    Raises:
+        SOCKSError: If the proxy rejects the authentication or the request, or no
+            user ID was given for SOCKS4.
+        ProtocolError: If the proxy sends malformed data or closes the connection.
+        socket.timeout: If connecting or any read or write times out.
+    """
+    check_protocol(protocol, user_id)
+    sock = socket.create_connection(get_address_port_tuple_from_address(proxy), timeout)
+    try:
+        run_sync(
+            proxy_handshake(
+                SocketStream(sock),
+                target,
+                protocol=protocol,
+                auth=auth,
+                user_id=user_id,
+                pipelined=pipelined,
+            )
+        )
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def create_connections(
+    proxy: Address,
+    targets: typing.Iterable[Address],
+    *,
+    protocol: str = "socks5",
+    auth: typing.Optional[typing.Tuple[bytes, bytes]] = None,
+    user_id: typing.Optional[bytes] = None,
+    timeout: typing.Optional[float] = None,
+    pipelined: bool = False,
+    max_workers: int = 8,
+) -> typing.List[socket.socket]:
+    """Opens tunnels to many targets through the same proxy, running up to
+    ``max_workers`` handshakes in parallel on a thread pool.
+
+    The arguments other than ``targets`` and ``max_workers`` are passed to
+    :func:`create_connection` for every target. On the first failure the
+    handshakes that have not started yet are cancelled, the sockets already
+    connected are closed and the exception of the earliest failed target is raised.
+
+    Args:
+        proxy: The proxy address as a 'HOST:PORT' string or a (host, port) tuple.
+        targets: The addresses to connect to through the proxy.
+        max_workers: The maximum number of handshakes in progress at once.
+
+    Returns:
+        The connected sockets, in the order of ``targets``.
+
+    Raises:
+        SOCKSError: If the proxy rejects any of the requests.
+        ProtocolError: If the proxy sends malformed data or closes a connection.
+        socket.timeout: If any connection times out.
+    """
+    target_list = list(targets)
+    if not target_list:
+        return []
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(max_workers, len(target_list))
+    ) as executor:
+        futures = [
+            executor.submit(
+                create_connection,
+                proxy,
+                target,
+                protocol=protocol,
+                auth=auth,
+                user_id=user_id,
+                timeout=timeout,
+                pipelined=pipelined,
+            )
+            for target in target_list
+        ]
+        _, pending = concurrent.futures.wait(
+            futures, return_when=concurrent.futures.FIRST_EXCEPTION
+        )
+        for future in pending:
+            future.cancel()
+
+    sockets = []
+    error: typing.Optional[BaseException] = None
+    for future in futures:
+        if future.cancelled():
+            continue
+        exc = future.exception()
+        if exc is None:
+            sockets.append(future.result())
+        elif error is None:
+            error = exc
+    if error is not None:
+        for sock in sockets:
+            sock.close()
+        raise error
+    return sockets
+
+
+def create_connection_chain(
+    hops: typing.Sequence[ProxyHop],
+    target: Address,
+    *,
+    timeout: typing.Optional[float] = None,
+) -> typing.Tuple[socket.socket, typing.List[HopTiming]]:
+    """Opens a tunnel to ``target`` through a chain of SOCKS proxies, see
+    :func:`socksio.handshake.chain_handshake`.
+
+    Args:
+        hops: The proxies to go through, in order.
+        target: The address to connect to through the last proxy.
+        timeout: Timeout in seconds set on the socket, see
+            :func:`create_connection`.
+
+    Returns:
+        The socket connected to the first proxy with the tunnel established, and
+        the handshake timing of each proxy.
+
+    Raises:
+        SOCKSError: If any proxy rejects the authentication or the request.
+        ProtocolError: If any proxy sends malformed data or closes the connection.
+        socket.timeout: If connecting or any read or write times out.
+    """
+    if not hops:
+        raise ValueError("At least one proxy is required")
+    sock = socket.create_connection(
+        get_address_port_tuple_from_address(hops[0].address), timeout
+    )
+    try:
+        timings = run_sync(chain_handshake(SocketStream(sock), hops, target))
+    except BaseException:
+        sock.close()
+        raise
+    return sock, timings
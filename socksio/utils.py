@@ -1,16 +1,35 @@
+import collections
 import enum
-import functools
 import re
 import socket
+import threading
+import time
 import typing
 
-from ._types import StrOrBytes
+from . import _codec
+from ._codec import encode_domain_name, encode_host, format_ipv4  # noqa: F401
+from ._types import ReadableBuffer, StrOrBytes, WritableBuffer
 
 if typing.TYPE_CHECKING:
     from socksio.socks5 import SOCKS5AType  # pragma: nocover
 
 
 IP_V6_WITH_PORT_REGEX = re.compile(r"^\[(?P<address>[^\]]+)\]:(?P<port>\d+)$")
+SEND_BUFFER_SIZE = 256
+
+K = typing.TypeVar("K", bound=typing.Hashable)
+V = typing.TypeVar("V")
+E = typing.TypeVar("E", bound=enum.Enum)
+FrameType = typing.TypeVar("FrameType")
+
+
+class NeedData(enum.Enum):
+    """Sentinel returned when more data is required to parse a complete frame."""
+
+    NEED_DATA = "NEED_DATA"
+
+
+NEED_DATA = NeedData.NEED_DATA
 
 
 class AddressType(enum.Enum):
@@ -31,29 +50,228 @@ class AddressType(enum.Enum):
         raise ValueError(socks5atype)
 
 
-@functools.lru_cache(maxsize=64)
-def encode_address(addr: StrOrBytes) -> typing.Tuple[AddressType, bytes]:
-    """Determines the type of address and encodes it into the format SOCKS expects"""
-    addr = addr.decode() if isinstance(addr, bytes) else addr
-    try:
-        return AddressType.IPV6, socket.inet_pton(socket.AF_INET6, addr)
-    except OSError:
+_ADDRESS_TYPES = {
+    _codec.IPV4: AddressType.IPV4,
+    _codec.DOMAIN_NAME: AddressType.DN,
+    _codec.IPV6: AddressType.IPV6,
+}
+
+
+def byte_enum_table(
+    enum_class: typing.Type[E],
+) -> typing.Tuple[typing.Optional[E], ...]:
+    """Builds a table mapping every byte value to the member of a single byte
+    enum with that value, or ``None`` if there is no such member.
+
+    Indexing the table with a byte read from a frame avoids slicing the frame
+    and calling the enum for every field.
+
+    Args:
+        enum_class: An enum whose values are ``bytes`` objects of length 1.
+
+    Returns:
+        A tuple of 256 entries.
+    """
+    table: typing.List[typing.Optional[E]] = [None] * 256
+    for member in enum_class:
+        table[member.value[0]] = member
+    return tuple(table)
+
+
+class CacheInfo(typing.NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+
+class _CacheState:
+    __slots__ = ("entries", "lock", "hits", "misses", "evictions")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries: "collections.OrderedDict[typing.Any, typing.Any]" = (
+            collections.OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class AddressCache:
+    """Bounded LRU cache for encoded and decoded addresses.
+
+    Args:
+        maxsize: The maximum number of entries kept, 0 disables caching.
+        ttl: Seconds an entry stays valid for, ``None`` keeps entries until
+            they are evicted by newer ones.
+        thread_local: If ``True`` every thread gets its own entries and
+            counters and no locking takes place, otherwise entries are shared
+            between threads and guarded by a lock. Shared caches don't take the
+            lock on hits, so the hit counter is approximate under contention.
+
+    Raises:
+        ValueError: If ``maxsize`` is negative or ``ttl`` is not positive.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 64,
+        ttl: typing.Optional[float] = None,
+        thread_local: bool = False,
+    ) -> None:
+        if maxsize < 0:
+            raise ValueError("maxsize must not be negative")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.thread_local = thread_local
+        self._local = threading.local()
+        self._shared = _CacheState()
+
+    def _state(self) -> _CacheState:
+        if not self.thread_local:
+            return self._shared
         try:
-            return AddressType.IPV4, socket.inet_pton(socket.AF_INET, addr)
-        except OSError:
-            return AddressType.DN, addr.encode()
-
-
-@functools.lru_cache(maxsize=64)
-def decode_address(address_type: AddressType, encoded_addr: bytes) -> str:
-    """Decodes the address from a SOCKS reply"""
-    if address_type == AddressType.IPV6:
-        return socket.inet_ntop(socket.AF_INET6, encoded_addr)
-    elif address_type == AddressType.IPV4:
-        return socket.inet_ntop(socket.AF_INET, encoded_addr)
-    else:
-        assert address_type == AddressType.DN
-        return encoded_addr.decode()
+            state: _CacheState = self._local.state
+        except AttributeError:
+            state = self._local.state = _CacheState()
+        return state
+
+    def lookup(self, key: K, compute: typing.Callable[[K], V]) -> V:
+        """Returns the cached value for ``key``, calling ``compute(key)`` and
+        caching its result on a miss.
+
+        Exceptions raised by ``compute`` propagate and nothing is cached.
+        """
+        if not self.maxsize:
+            return compute(key)
+        state = self._state() if self.thread_local else self._shared
+        entries = state.entries
+        ttl = self.ttl
+        now = time.monotonic() if ttl is not None else 0.0
+        # Hits don't take the lock: the lookup and the reordering are atomic
+        # on their own and an entry evicted in between is still valid.
+        entry = entries.get(key)
+        if entry is not None and (ttl is None or entry[1] > now):
+            try:
+                entries.move_to_end(key)
+            except KeyError:  # pragma: nocover
+                pass
+            state.hits += 1
+            value: V = entry[0]
+            return value
+
+        result = compute(key)
+        with state.lock:
+            state.misses += 1
+            if entries.pop(key, None) is not None:
+                state.evictions += 1
+            entries[key] = (result, now + ttl if ttl is not None else 0.0)
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                state.evictions += 1
+        return result
+
+    def info(self) -> CacheInfo:
+        """Returns the counters of the cache, or of the calling thread's cache
+        in thread-local mode."""
+        state = self._state()
+        return CacheInfo(
+            state.hits,
+            state.misses,
+            state.evictions,
+            len(state.entries),
+            self.maxsize,
+        )
+
+    def clear(self) -> None:
+        """Drops all entries and resets the counters."""
+        if self.thread_local:
+            self._local = threading.local()
+        else:
+            self._shared = _CacheState()
+
+
+_address_cache = AddressCache()
+
+
+def get_address_cache() -> AddressCache:
+    """Returns the cache used by default by ``encode_address`` and
+    ``decode_address``."""
+    return _address_cache
+
+
+def set_address_cache(cache: AddressCache) -> None:
+    """Replaces the cache used by default by ``encode_address`` and
+    ``decode_address``.
+
+    Args:
+        cache: The new default cache, use ``AddressCache(maxsize=0)`` to
+            disable caching altogether.
+    """
+    global _address_cache
+    _address_cache = cache
+
+
+def encode_address(
+    addr: StrOrBytes, cache: typing.Optional[AddressCache] = None
+) -> typing.Tuple[AddressType, bytes]:
+    """Determines the type of address and encodes it into the format SOCKS expects.
+
+    Args:
+        addr: The address to encode.
+        cache: The cache to use instead of the default one.
+    """
+    return (_address_cache if cache is None else cache).lookup(addr, _encode_address)
+
+
+def _encode_address(addr: StrOrBytes) -> typing.Tuple[AddressType, bytes]:
+    atype, encoded_addr = encode_host(
+        addr.decode() if isinstance(addr, bytes) else addr
+    )
+    return _ADDRESS_TYPES[atype], encoded_addr
+
+
+def decode_address(
+    address_type: AddressType,
+    encoded_addr: bytes,
+    cache: typing.Optional[AddressCache] = None,
+) -> str:
+    """Decodes the address from a SOCKS reply.
+
+    Args:
+        address_type: The type of the encoded address.
+        encoded_addr: The encoded address.
+        cache: The cache to use instead of the default one.
+    """
+    return (_address_cache if cache is None else cache).lookup(
+        (address_type, encoded_addr), _decode_address
+    )
+
+
+def _decode_address(key: typing.Tuple[AddressType, bytes]) -> str:
+    return unpack_address(key[0], key[1], 0, len(key[1]))
+
+
+def unpack_address(
+    address_type: AddressType, data: ReadableBuffer, offset: int, length: int
+) -> str:
+    """Decodes the address of ``length`` bytes at ``offset`` in a buffer without
+    copying the encoded address out of it.
+    """
+    if address_type == AddressType.IPV4:
+        if length != 4:
+            raise ValueError("Invalid IPv4 address length")
+        return format_ipv4(data, offset)
+    with memoryview(data) as view:
+        if address_type == AddressType.IPV6:
+            return socket.inet_ntop(socket.AF_INET6, view[offset : offset + length])
+        else:
+            assert address_type == AddressType.DN
+            return str(view[offset : offset + length], "utf-8")
 
 
 def split_address_port_from_string(address: StrOrBytes) -> typing.Tuple[str, int]:
@@ -93,3 +311,133 @@ def get_address_port_tuple_from_address(
         address, port = split_address_port_from_string(address)
 
     return address, port
+
+
+def check_buffer_size(buf: WritableBuffer, offset: int, size: int) -> None:
+    """Raises ValueError if ``size`` bytes don't fit in ``buf`` at ``offset``."""
+    if len(buf) - offset < size:
+        raise ValueError(
+            "Buffer too small, {} bytes required at offset {}".format(size, offset)
+        )
+
+
+class SendBuffer:
+    """Reusable outgoing buffer that requests are packed into in place.
+
+    The underlying bytearray is only reallocated when a request does not fit in
+    its remaining space, so queueing and flushing data does not allocate
+    intermediate buffers.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray(SEND_BUFFER_SIZE)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def write(
+        self, size: int, write_into: typing.Callable[[bytearray, int], int]
+    ) -> None:
+        """Packs ``size`` bytes at the end of the pending data using ``write_into``.
+
+        Raises:
+            RuntimeError: If the buffer must grow while a view returned by
+                :meth:`view` has not been released.
+        """
+        if self._end + size > len(self._buffer):
+            try:
+                if self._start:
+                    del self._buffer[: self._start]
+                    self._end -= self._start
+                    self._start = 0
+                missing = self._end + size - len(self._buffer)
+                if missing > 0:
+                    self._buffer += bytes(max(missing, len(self._buffer)))
+            except BufferError:
+                raise RuntimeError(
+                    "The view returned by data_to_send_view() must be released "
+                    "before sending more data"
+                ) from None
+        self._end += write_into(self._buffer, self._end)
+
+    def view(self) -> memoryview:
+        """Returns a view of the pending data without copying it."""
+        return memoryview(self._buffer)[self._start : self._end]
+
+    def consume(self, nbytes: int) -> None:
+        """Discards the first ``nbytes`` of pending data."""
+        if not 0 <= nbytes <= len(self):
+            raise ValueError("Cannot consume more data than is pending")
+        self._start += nbytes
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def take(self) -> bytes:
+        """Returns all the pending data and clears the buffer."""
+        with self.view() as view:
+            data = bytes(view)
+        self._start = self._end = 0
+        return data
+
+
+class BufferedConnection:
+    """Base class of the connection classes holding their send and receive
+    buffers, so the send buffer behaves the same on the client and server side.
+    """
+
+    def __init__(self) -> None:
+        self._data_to_send = SendBuffer()
+        self._received_data = bytearray()
+
+    def data_to_send(self) -> bytes:
+        """Returns the data to be sent via the I/O library of choice.
+
+        Also clears the connection's buffer.
+        """
+        return self._data_to_send.take()
+
+    def data_to_send_view(self) -> memoryview:
+        """Returns a view of the data to be sent without copying it.
+
+        The connection's buffer is not cleared, call :meth:`mark_data_sent` with the
+        number of bytes actually sent once the view has been released. The view
+        must also be released, e.g. with a ``with`` block, before calling
+        ``send()`` again, which may otherwise raise a ``RuntimeError``.
+        """
+        return self._data_to_send.view()
+
+    def mark_data_sent(self, nbytes: int) -> None:
+        """Removes ``nbytes`` sent via :meth:`data_to_send_view` from the buffer."""
+        self._data_to_send.consume(nbytes)
+
+
+class StreamConnection(BufferedConnection):
+    """Base class of the connections buffering data received past the end of the
+    handshake, the start of the tunneled stream.
+    """
+
+    def trailing_data(self) -> bytearray:
+        """Returns any data received after the final frame of the handshake.
+
+        The buffer is handed over without copying and the connection's receive
+        buffer is reset.
+        """
+        data = self._received_data
+        self._received_data = bytearray()
+        return data
+
+
+def pop_frame(
+    buffer: bytearray, length: int, loads: typing.Callable[[ReadableBuffer], FrameType]
+) -> typing.Optional[FrameType]:
+    """Unpacks the first ``length`` bytes of a receive buffer and removes them from
+    the buffer, or returns None if the buffer does not hold ``length`` bytes yet.
+    """
+    if len(buffer) < length:
+        return None
+    with memoryview(buffer) as view:
+        frame = loads(view[:length])
+    del buffer[:length]
+    return frame
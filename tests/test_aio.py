@@ -0,0 +1,651 @@
+import asyncio
+import socket
+import time
+import typing
+
+import pytest
+
+from socksio import ProtocolError, SOCKSError
+from socksio.aio import (
+    ProxyLatencyTracker,
+    SOCKS5ConnectionPool,
+    open_bind,
+    open_connection,
+    open_connection_chain,
+    open_connection_racing,
+)
+from socksio.handshake import ProxyHop
+from socksio.server import SOCKS5Server
+
+
+class StubProxy:
+    """Minimal SOCKS proxy that echoes the tunneled data back to the client."""
+
+    def __init__(
+        self,
+        credentials: typing.Optional[typing.Tuple[bytes, bytes]] = None,
+        reply_code: int = 0,
+        reply_delay: float = 0.0,
+        bind_reply_code: int = 0,
+    ) -> None:
+        self.credentials = credentials
+        self.reply_code = reply_code
+        self.reply_delay = reply_delay
+        self.bind_reply_code = bind_reply_code
+        self.requests: typing.List[bytes] = []
+        self.connections = 0
+
+    async def __aenter__(self) -> str:
+        self.peer_connected = asyncio.Event()
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return "{}:{}".format(host, port)
+
+    async def __aexit__(self, *args: typing.Any) -> None:
+        self.peer_connected.set()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        try:
+            version = await reader.readexactly(1)
+            if version == b"\x05":
+                await self.handle_socks5(reader, writer)
+            else:
+                await self.handle_socks4(reader, writer)
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    break
+                writer.write(data)
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_socks5(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        methods = await reader.readexactly((await reader.readexactly(1))[0])
+        if self.credentials is None:
+            writer.write(b"\x05\x00")
+        elif b"\x02" in methods:
+            writer.write(b"\x05\x02")
+            await reader.readexactly(1)
+            username = await reader.readexactly((await reader.readexactly(1))[0])
+            password = await reader.readexactly((await reader.readexactly(1))[0])
+            if (username, password) != self.credentials:
+                writer.write(b"\x01\x01")
+                return
+            writer.write(b"\x01\x00")
+        else:
+            writer.write(b"\x05\xff")
+            return
+
+        header = await reader.readexactly(4)
+        if header[3] == 3:
+            addr = await reader.readexactly((await reader.readexactly(1))[0])
+        else:
+            addr = await reader.readexactly(4 if header[3] == 1 else 16)
+        await reader.readexactly(2)
+        self.requests.append(addr)
+        await asyncio.sleep(self.reply_delay)
+        writer.write(bytes([5, self.reply_code, 0, 1, 127, 0, 0, 1, 4, 56]))
+        if header[1] == 2 and self.reply_code == 0:
+            await self.peer_connected.wait()
+            writer.write(bytes([5, self.bind_reply_code, 0, 1, 10, 0, 0, 2, 31, 144]))
+
+    async def handle_socks4(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        header = await reader.readexactly(7)
+        await reader.readuntil(b"\x00")
+        if header[3:7] == b"\x00\x00\x00\xff":
+            self.requests.append((await reader.readuntil(b"\x00"))[:-1])
+        else:
+            self.requests.append(header[3:7])
+        await asyncio.sleep(self.reply_delay)
+        writer.write(bytes([0, 0x5A + self.reply_code, 0, 80, 127, 0, 0, 1]))
+
+
+async def echo(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bytes:
+    writer.write(b"ping")
+    await writer.drain()
+    data = await reader.readexactly(4)
+    writer.close()
+    return data
+
+
+def test_open_connection_socks5_no_auth() -> None:
+    async def main() -> None:
+        proxy = StubProxy()
+        async with proxy as address:
+            reader, writer = await open_connection(address, ("example.com", 80))
+            assert await echo(reader, writer) == b"ping"
+        assert proxy.requests == [b"example.com"]
+
+    asyncio.run(main())
+
+
+def test_open_connection_socks5_username_password() -> None:
+    async def main() -> None:
+        async with StubProxy(credentials=(b"user", b"pass")) as address:
+            reader, writer = await open_connection(
+                address, "127.0.0.1:80", auth=(b"user", b"pass")
+            )
+            assert await echo(reader, writer) == b"ping"
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "auth", [None, (b"user", b"wrong")], ids=["no-credentials", "wrong-password"]
+)
+def test_open_connection_socks5_auth_rejected(
+    auth: typing.Optional[typing.Tuple[bytes, bytes]],
+) -> None:
+    async def main() -> None:
+        async with StubProxy(credentials=(b"user", b"pass")) as address:
+            with pytest.raises(SOCKSError):
+                await open_connection(address, "127.0.0.1:80", auth=auth)
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("protocol", ["socks4", "socks5"])
+def test_open_connection_request_rejected(protocol: str) -> None:
+    async def main() -> None:
+        async with StubProxy(reply_code=1) as address:
+            with pytest.raises(SOCKSError, match="could not connect"):
+                await open_connection(
+                    address, "127.0.0.1:80", protocol=protocol, user_id=b"socksio"
+                )
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "protocol,target,expected",
+    [
+        ("socks4", "127.0.0.1:80", b"\x7f\x00\x00\x01"),
+        ("socks4a", "example.com:80", b"example.com"),
+    ],
+)
+def test_open_connection_socks4(protocol: str, target: str, expected: bytes) -> None:
+    async def main() -> None:
+        proxy = StubProxy()
+        async with proxy as address:
+            reader, writer = await open_connection(
+                address, target, protocol=protocol, user_id=b"socksio"
+            )
+            assert await echo(reader, writer) == b"ping"
+        assert proxy.requests == [expected]
+
+    asyncio.run(main())
+
+
+def test_open_connection_socks4_requires_user_id() -> None:
+    with pytest.raises(SOCKSError):
+        asyncio.run(
+            open_connection("127.0.0.1:1080", "127.0.0.1:80", protocol="socks4")
+        )
+
+
+def test_open_connection_unknown_protocol() -> None:
+    with pytest.raises(ValueError):
+        asyncio.run(open_connection("127.0.0.1:1080", "127.0.0.1:80", protocol="http"))
+
+
+def test_open_connection_command_timeout() -> None:
+    async def main() -> None:
+        async with StubProxy(reply_delay=10) as address:
+            with pytest.raises(asyncio.TimeoutError):
+                await open_connection(address, "127.0.0.1:80", command_timeout=0.05)
+
+    asyncio.run(main())
+
+
+def test_open_connection_proxy_closes_connection() -> None:
+    async def handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        await reader.readexactly(3)
+        writer.write(b"\x05")
+        writer.close()
+
+    async def main() -> None:
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        host, port = server.sockets[0].getsockname()[:2]
+        with pytest.raises(ProtocolError):
+            await open_connection((host, port), "127.0.0.1:80")
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(main())
+
+
+def test_open_connection_many_concurrent_handshakes() -> None:
+    async def main() -> None:
+        proxy = StubProxy()
+        async with proxy as address:
+            streams = await asyncio.gather(
+                *[open_connection(address, ("127.0.0.1", 80)) for _ in range(200)]
+            )
+            results = await asyncio.gather(*[echo(*pair) for pair in streams])
+        assert results == [b"ping"] * 200
+        assert len(proxy.requests) == 200
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "credentials,auth",
+    [(None, None), ((b"user", b"pass"), (b"user", b"pass"))],
+    ids=["no-auth", "username-password"],
+)
+def test_open_connection_pipelined(
+    credentials: typing.Optional[typing.Tuple[bytes, bytes]],
+    auth: typing.Optional[typing.Tuple[bytes, bytes]],
+) -> None:
+    async def main() -> None:
+        proxy = StubProxy(credentials=credentials)
+        async with proxy as address:
+            reader, writer = await open_connection(
+                address, "example.com:80", auth=auth, pipelined=True
+            )
+            assert await echo(reader, writer) == b"ping"
+        assert proxy.requests == [b"example.com"]
+
+    asyncio.run(main())
+
+
+def test_open_connection_pipelined_auth_rejected() -> None:
+    async def main() -> None:
+        async with StubProxy(credentials=(b"user", b"pass")) as address:
+            with pytest.raises(SOCKSError, match="username/password"):
+                await open_connection(
+                    address, "127.0.0.1:80", auth=(b"user", b"no"), pipelined=True
+                )
+
+    asyncio.run(main())
+
+
+def test_connection_pool_reuses_authenticated_connections() -> None:
+    async def main() -> None:
+        proxy = StubProxy(credentials=(b"user", b"pass"))
+        async with proxy as address:
+            async with SOCKS5ConnectionPool(
+                address, auth=(b"user", b"pass"), max_size=2, replenish=False
+            ) as pool:
+                await pool.fill()
+                assert pool.idle_count == 2
+                assert proxy.connections == 2
+
+                streams = [await pool.open_connection("127.0.0.1:80") for _ in "ab"]
+                assert pool.idle_count == 0
+                assert proxy.connections == 2
+                assert proxy.requests == [b"\x7f\x00\x00\x01"] * 2
+                assert [await echo(*pair) for pair in streams] == [b"ping"] * 2
+
+                reader, writer = await pool.open_connection("127.0.0.1:80")
+                assert proxy.connections == 3
+                assert await echo(reader, writer) == b"ping"
+
+    asyncio.run(main())
+
+
+def test_connection_pool_replenishes_in_background() -> None:
+    async def main() -> None:
+        proxy = StubProxy()
+        async with proxy as address:
+            async with SOCKS5ConnectionPool(address, max_size=1) as pool:
+                await pool.fill()
+                reader, writer = await pool.open_connection("127.0.0.1:80")
+                writer.close()
+                for _ in range(100):
+                    if pool.idle_count:
+                        break
+                    await asyncio.sleep(0.01)
+                assert pool.idle_count == 1
+                assert proxy.connections == 2
+
+    asyncio.run(main())
+
+
+def test_connection_pool_evicts_expired_connections() -> None:
+    async def main() -> None:
+        proxy = StubProxy()
+        async with proxy as address:
+            async with SOCKS5ConnectionPool(
+                address, max_size=3, idle_ttl=0, replenish=False
+            ) as pool:
+                await pool.fill()
+                await asyncio.sleep(0.01)
+                pool.evict_expired()
+                assert pool.idle_count == 0
+
+                await pool.fill(0)
+                assert pool.idle_count == 0
+                await pool.fill(1)
+                await asyncio.sleep(0.01)
+                reader, writer = await pool.open_connection("127.0.0.1:80")
+                assert await echo(reader, writer) == b"ping"
+                assert proxy.connections == 5
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("raises", [False, True])
+def test_connection_pool_health_check(raises: bool) -> None:
+    checked = []
+
+    async def health_check(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> bool:
+        checked.append(writer)
+        if len(checked) == 1 and raises:
+            raise ConnectionResetError()
+        return len(checked) > 1
+
+    async def main() -> None:
+        proxy = StubProxy()
+        async with proxy as address:
+            async with SOCKS5ConnectionPool(
+                address, max_size=2, health_check=health_check, replenish=False
+            ) as pool:
+                await pool.fill()
+                reader, writer = await pool.open_connection("127.0.0.1:80")
+                assert await echo(reader, writer) == b"ping"
+                assert len(checked) == 2
+                assert checked[0].is_closing()
+                assert pool.idle_count == 0
+                assert proxy.connections == 2
+
+    asyncio.run(main())
+
+
+def test_connection_pool_closed() -> None:
+    async def main() -> None:
+        async with StubProxy() as address:
+            pool = SOCKS5ConnectionPool(address, max_size=2)
+            await pool.fill()
+            await pool.aclose()
+            assert pool.idle_count == 0
+            with pytest.raises(SOCKSError):
+                await pool.open_connection("127.0.0.1:80")
+
+    asyncio.run(main())
+
+
+def closed_port() -> str:
+    """Returns the address of a port nothing is listening on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        host, port = sock.getsockname()
+    return "{}:{}".format(host, port)
+
+
+def test_open_connection_racing_staggers_attempts() -> None:
+    async def main() -> None:
+        slow, fast = StubProxy(reply_delay=10), StubProxy()
+        async with slow as slow_address, fast as fast_address:
+            tracker = ProxyLatencyTracker()
+            start = time.monotonic()
+            reader, writer = await open_connection_racing(
+                [slow_address, fast_address],
+                "127.0.0.1:80",
+                happy_eyeballs_delay=0.05,
+                latency_tracker=tracker,
+            )
+            assert time.monotonic() - start < 5
+            assert await echo(reader, writer) == b"ping"
+            assert slow.connections == 1 and fast.connections == 1
+
+            # The slow attempt was cancelled once the fast proxy won, its latency
+            # is recorded as a lower bound so the fast proxy is now preferred.
+            slow_latency = tracker.latency(slow_address)
+            fast_latency = tracker.latency(fast_address)
+            assert slow_latency is not None and fast_latency is not None
+            assert fast_latency < slow_latency
+            assert tracker.sort([slow_address, fast_address])[0] == (
+                "127.0.0.1",
+                int(fast_address.split(":")[1]),
+            )
+
+            reader, writer = await open_connection_racing(
+                [slow_address, fast_address],
+                "127.0.0.1:80",
+                happy_eyeballs_delay=10,
+                latency_tracker=tracker,
+            )
+            assert await echo(reader, writer) == b"ping"
+            assert slow.connections == 1 and fast.connections == 2
+
+    asyncio.run(main())
+
+
+def test_open_connection_racing_cancelled_attempt_started_later() -> None:
+    async def main() -> None:
+        fast, slow = StubProxy(reply_delay=0.2), StubProxy(reply_delay=10)
+        async with fast as fast_address, slow as slow_address:
+            tracker = ProxyLatencyTracker()
+            tracker.record_failure(slow_address)
+            reader, writer = await open_connection_racing(
+                [fast_address, slow_address],
+                "127.0.0.1:80",
+                happy_eyeballs_delay=0.1,
+                latency_tracker=tracker,
+            )
+            assert await echo(reader, writer) == b"ping"
+            assert slow.connections == 1
+
+            # The slow attempt ran for less time than the fast one took but was
+            # cancelled, so it is recorded as at least as slow as the winner and
+            # its failure is not cleared.
+            slow_latency = tracker.latency(slow_address)
+            fast_latency = tracker.latency(fast_address)
+            assert slow_latency is not None and fast_latency is not None
+            assert slow_latency >= fast_latency
+            assert tracker.sort([fast_address, slow_address])[0] == (
+                "127.0.0.1",
+                int(fast_address.split(":")[1]),
+            )
+            assert tracker.sort([slow_address, fast_address])[0] == (
+                "127.0.0.1",
+                int(fast_address.split(":")[1]),
+            )
+
+    asyncio.run(main())
+
+
+def test_open_connection_racing_next_attempt_on_failure() -> None:
+    async def main() -> None:
+        rejecting, working = StubProxy(reply_code=5), StubProxy()
+        async with rejecting as rejecting_address, working as working_address:
+            tracker = ProxyLatencyTracker()
+            start = time.monotonic()
+            reader, writer = await open_connection_racing(
+                [closed_port(), rejecting_address, working_address],
+                "127.0.0.1:80",
+                happy_eyeballs_delay=10,
+                latency_tracker=tracker,
+            )
+            # Failures start the next attempt without waiting for the delay.
+            assert time.monotonic() - start < 5
+            assert await echo(reader, writer) == b"ping"
+            assert tracker.sort([rejecting_address, working_address])[0] == (
+                "127.0.0.1",
+                int(working_address.split(":")[1]),
+            )
+
+    asyncio.run(main())
+
+
+def test_open_connection_racing_all_fail() -> None:
+    async def main() -> None:
+        async with StubProxy(reply_code=5) as address:
+            with pytest.raises(SOCKSError, match="any proxy") as exc_info:
+                await open_connection_racing([closed_port(), address], "127.0.0.1:80")
+            assert isinstance(exc_info.value.__cause__, SOCKSError)
+
+        with pytest.raises(ValueError):
+            await open_connection_racing([], "127.0.0.1:80")
+
+    asyncio.run(main())
+
+
+def test_open_connection_racing_invalid_target() -> None:
+    async def main() -> None:
+        proxy = StubProxy()
+        async with proxy as address:
+            tracker = ProxyLatencyTracker()
+            tracker.record(address, 0.1)
+            with pytest.raises(ValueError):
+                await open_connection_racing(
+                    [address], ("a" * 256, 80), latency_tracker=tracker
+                )
+            # The proxy is not tried nor penalised for the invalid target.
+            assert proxy.connections == 0
+            assert tracker.sort([closed_port(), address])[0] == (
+                "127.0.0.1",
+                int(address.split(":")[1]),
+            )
+
+    asyncio.run(main())
+
+
+def test_proxy_latency_tracker() -> None:
+    tracker = ProxyLatencyTracker(smoothing=0.5)
+    assert tracker.latency("a:1") is None
+    tracker.record("a:1", 1.0)
+    tracker.record(("a", 1), 0.5)
+    assert tracker.latency("a:1") == 0.75
+    tracker.record("b:2", 0.1)
+    tracker.record_failure("c:3")
+    assert tracker.sort(["c:3", "d:4", "a:1", "e:5", "b:2"]) == [
+        ("b", 2),
+        ("a", 1),
+        ("d", 4),
+        ("e", 5),
+        ("c", 3),
+    ]
+    tracker.record_lower_bound("c:3", 0.1)
+    assert tracker.latency("c:3") == 0.1
+    assert tracker.sort(["c:3", "a:1"]) == [("a", 1), ("c", 3)]
+    tracker.record("c:3", 0.2)
+    assert tracker.sort(["a:1", "c:3"]) == [("c", 3), ("a", 1)]
+    tracker.record_lower_bound("c:3", 0.05)
+    assert tracker.latency("c:3") == pytest.approx(0.15)
+    tracker.record_lower_bound("c:3", 1.0)
+    assert tracker.latency("c:3") == 1.0
+
+    with pytest.raises(ValueError):
+        ProxyLatencyTracker(smoothing=0)
+
+
+def test_open_connection_chain() -> None:
+    async def authenticate(username: bytes, password: bytes) -> bool:
+        return (username, password) == (b"user", b"pass")
+
+    async def main() -> None:
+        first, second = SOCKS5Server(), SOCKS5Server(authenticate=authenticate)
+        await first.start("127.0.0.1", 0)
+        await second.start("127.0.0.1", 0)
+        last = StubProxy()
+        try:
+            async with last as last_address:
+                reader, writer, timings = await open_connection_chain(
+                    [
+                        ProxyHop(first.address),
+                        ProxyHop(second.address, auth=(b"user", b"pass")),
+                        ProxyHop(last_address, protocol="socks4a", user_id=b"id"),
+                    ],
+                    "example.com:80",
+                    handshake_timeout=5,
+                )
+                assert await echo(reader, writer) == b"ping"
+                assert last.requests == [b"example.com"]
+                assert [timing.proxy for timing in timings] == [
+                    first.address,
+                    second.address,
+                    ("127.0.0.1", int(last_address.split(":")[1])),
+                ]
+        finally:
+            await first.aclose()
+            await second.aclose()
+
+    asyncio.run(main())
+
+
+def test_open_connection_chain_rejected() -> None:
+    async def main() -> None:
+        proxy = SOCKS5Server()
+        await proxy.start("127.0.0.1", 0)
+        try:
+            with pytest.raises(SOCKSError, match="CONNECTION_REFUSED"):
+                await open_connection_chain(
+                    [ProxyHop(proxy.address), ProxyHop(closed_port())], "a.example:80"
+                )
+            with pytest.raises(ValueError):
+                await open_connection_chain([], "a.example:80")
+        finally:
+            await proxy.aclose()
+
+    asyncio.run(main())
+
+
+def test_open_bind() -> None:
+    async def main() -> None:
+        proxy = StubProxy(credentials=(b"user", b"pass"))
+        async with proxy as address:
+            bind = await open_bind(
+                address, ("10.0.0.2", 0), auth=(b"user", b"pass"), command_timeout=5
+            )
+            assert bind.address == ("127.0.0.1", 1080)
+            assert bind.peer_address is None
+
+            accept = asyncio.ensure_future(bind.accept(timeout=5))
+            await asyncio.sleep(0.01)
+            assert not accept.done()
+            proxy.peer_connected.set()
+            reader, writer = await accept
+            assert bind.peer_address == ("10.0.0.2", 8080)
+            assert await echo(reader, writer) == b"ping"
+        assert proxy.requests == [b"\x0a\x00\x00\x02"]
+
+    asyncio.run(main())
+
+
+def test_open_bind_rejected() -> None:
+    async def main() -> None:
+        async with StubProxy(reply_code=7) as address:
+            with pytest.raises(SOCKSError, match="COMMAND_NOT_SUPPORTED"):
+                await open_bind(address, ("10.0.0.2", 0))
+
+        proxy = StubProxy(bind_reply_code=5)
+        async with proxy as address:
+            bind = await open_bind(address, ("10.0.0.2", 0))
+            proxy.peer_connected.set()
+            with pytest.raises(SOCKSError, match="CONNECTION_REFUSED"):
+                await bind.accept()
+            assert bind.writer.is_closing()
+
+    asyncio.run(main())
+
+
+def test_open_bind_accept_timeout() -> None:
+    async def main() -> None:
+        async with StubProxy() as address:
+            bind = await open_bind(address, ("10.0.0.2", 0))
+            with pytest.raises(asyncio.TimeoutError):
+                await bind.accept(timeout=0.01)
+            assert bind.writer.is_closing()
+
+            bind = await open_bind(address, ("10.0.0.2", 0))
+            bind.close()
+            assert bind.writer.is_closing()
+
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+import os
+import struct
+
+import pytest
+
+from socksio import ProtocolError, _codec
+
+
+def test_is_compiled() -> None:
+    # The test_compiled nox session sets SOCKSIO_COMPILED after building the
+    # accelerator module, every other run must use the pure Python module.
+    assert _codec.is_compiled() == ("SOCKSIO_COMPILED" in os.environ)
+
+
+@pytest.mark.parametrize(
+    "atype,addr,expected",
+    [
+        (_codec.IPV4, b"\x7f\x00\x00\x01", b"\x05\x01\x00\x01\x7f\x00\x00\x01\x00\x50"),
+        (_codec.DOMAIN_NAME, b"a.b", b"\x05\x01\x00\x03\x03a.b\x00\x50"),
+        (
+            _codec.IPV6,
+            b"\x00" * 15 + b"\x01",
+            b"\x05\x01\x00\x04" + b"\x00" * 15 + b"\x01\x00\x50",
+        ),
+    ],
+)
+def test_pack_socks5_command(atype: int, addr: bytes, expected: bytes) -> None:
+    assert _codec.pack_socks5_command(1, atype, addr, 80) == expected
+
+
+@pytest.mark.parametrize("port", [-1, 65536])
+def test_pack_socks5_command_invalid_port(port: int) -> None:
+    with pytest.raises(struct.error):
+        _codec.pack_socks5_command(1, _codec.IPV4, b"\x7f\x00\x00\x01", port)
+
+
+def test_pack_socks5_command_domain_name_too_long() -> None:
+    with pytest.raises(ValueError):
+        _codec.pack_socks5_command(1, _codec.DOMAIN_NAME, b"a" * 256, 80)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x05\x00\x00\x01\x7f\x00\x00\x01\x04",
+        b"\x04\x00\x00\x01\x7f\x00\x00\x01\x04\x38",
+        b"\x05\x00\x00\x02\x7f\x00\x00\x01\x04\x38",
+    ],
+)
+def test_unpack_socks5_reply_malformed(data: bytes) -> None:
+    with pytest.raises(ProtocolError):
+        _codec.unpack_socks5_reply(data, 0)
+
+
+@pytest.mark.parametrize("kind", ["request", "reply", "datagram"])
+def test_socks5_frame_length_unknown_address_type(kind: str) -> None:
+    with pytest.raises(ProtocolError, match="Malformed " + kind):
+        _codec.socks5_frame_length(b"\x05\x01\x00\x02\x7f", 0, kind)
+
+
+@pytest.mark.parametrize(
+    "data", [b"\x00\x5a\x04\x38\x7f\x00\x00", b"\x01\x5a\x04\x38\x7f\x00\x00\x01"]
+)
+def test_unpack_socks4_reply_malformed(data: bytes) -> None:
+    with pytest.raises(ProtocolError):
+        _codec.unpack_socks4_reply(data, 0)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x00\x00\x5a\x04\x38\x7f\x00\x00\x01",
+        bytearray(b"\x00\x00\x5a\x04\x38\x7f\x00\x00\x01"),
+    ],
+)
+def test_unpack_socks4_reply_buffer_types(data: bytes) -> None:
+    assert _codec.unpack_socks4_reply(memoryview(data), 1) == (0x5A, 1080, "127.0.0.1")
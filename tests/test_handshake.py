@@ -0,0 +1,306 @@
+import asyncio
+import socket
+import threading
+import typing
+
+import pytest
+
+from socksio import (
+    NEED_DATA,
+    SOCKS4Reply,
+    SOCKS4ReplyCode,
+    SOCKS5AuthMethod,
+    SOCKS5AuthMethodsRequest,
+    SOCKS5AuthReply,
+    SOCKS5CommandRequest,
+    SOCKS5Reply,
+    SOCKS5ReplyCode,
+    SOCKS5UsernamePasswordReply,
+    SOCKSError,
+)
+from socksio.exceptions import ProtocolError
+from socksio.handshake import (
+    AnyioStream,
+    AsyncByteStream,
+    AsyncioStream,
+    ProxyHop,
+    SocketStream,
+    TrioStream,
+    chain_handshake,
+    run_sync,
+    socks4_handshake,
+    socks5_handshake,
+)
+from socksio.socks4 import SOCKS4ServerConnection
+from socksio.socks5 import SOCKS5ServerConnection, SOCKS5State
+
+CREDENTIALS = (b"user", b"pass")
+
+
+async def serve_socks5(
+    stream: AsyncByteStream, reply_code: SOCKS5ReplyCode = SOCKS5ReplyCode.SUCCEEDED
+) -> None:
+    """Answers a single SOCKS5 handshake, sending replies in small chunks."""
+    conn = SOCKS5ServerConnection()
+    while conn.state not in (SOCKS5State.TUNNEL_READY, SOCKS5State.MUST_CLOSE):
+        event = conn.receive_data(b"")
+        while event is NEED_DATA:
+            data = await stream.receive(1024)
+            if not data:
+                return
+            event = conn.receive_data(data)
+        if isinstance(event, SOCKS5AuthMethodsRequest):
+            method = (
+                SOCKS5AuthMethod.USERNAME_PASSWORD
+                if SOCKS5AuthMethod.USERNAME_PASSWORD in event.methods
+                else SOCKS5AuthMethod.NO_AUTH_REQUIRED
+            )
+            conn.send(SOCKS5AuthReply(method))
+        elif isinstance(event, SOCKS5CommandRequest):
+            conn.send(SOCKS5Reply.from_address(reply_code, ("10.0.0.1", 4321)))
+        else:
+            conn.send(SOCKS5UsernamePasswordReply(event.password == b"pass"))
+        data = conn.data_to_send()
+        for index in range(0, len(data), 3):
+            await stream.send(data[index : index + 3])
+
+
+async def serve_socks4(stream: AsyncByteStream) -> None:
+    conn = SOCKS4ServerConnection()
+    request = NEED_DATA
+    while request is NEED_DATA:
+        request = conn.receive_data(await stream.receive(1024))
+    conn.send(SOCKS4Reply(SOCKS4ReplyCode.REQUEST_GRANTED, 80, "127.0.0.1"))
+    await stream.send(conn.data_to_send())
+
+
+def serve_in_thread(
+    sock: socket.socket,
+    server: typing.Callable[[AsyncByteStream], typing.Coroutine[None, None, None]],
+) -> threading.Thread:
+    thread = threading.Thread(target=run_sync, args=(server(SocketStream(sock)),))
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+@pytest.mark.parametrize("auth", [None, CREDENTIALS])
+def test_socks5_handshake_trio_nursery(
+    auth: typing.Optional[typing.Tuple[bytes, bytes]], pipelined: bool
+) -> None:
+    trio = pytest.importorskip("trio")
+    from trio.testing import memory_stream_pair
+
+    replies: typing.List[SOCKS5Reply] = []
+
+    async def client(stream: typing.Any) -> None:
+        reply = await socks5_handshake(
+            TrioStream(stream), "example.com:443", auth=auth, pipelined=pipelined
+        )
+        replies.append(reply)
+
+    async def main() -> None:
+        async with trio.open_nursery() as nursery:
+            for _ in range(50):
+                client_stream, server_stream = memory_stream_pair()
+                nursery.start_soon(client, client_stream)
+                nursery.start_soon(serve_socks5, TrioStream(server_stream))
+
+    trio.run(main)
+    assert len(replies) == 50
+    assert all(reply.addr == "10.0.0.1" and reply.port == 4321 for reply in replies)
+
+
+class MemoryByteStream:
+    """anyio byte stream over a pair of memory object streams."""
+
+    def __init__(self, send_stream: typing.Any, receive_stream: typing.Any) -> None:
+        self.send_stream = send_stream
+        self.receive_stream = receive_stream
+        self.buffer = b""
+
+    async def receive(self, max_bytes: int = 65536) -> bytes:
+        if not self.buffer:
+            self.buffer = await self.receive_stream.receive()
+        data, self.buffer = self.buffer[:max_bytes], self.buffer[max_bytes:]
+        return data
+
+    async def send(self, data: bytes) -> None:
+        await self.send_stream.send(data)
+
+    async def aclose(self) -> None:
+        await self.send_stream.aclose()
+
+
+def anyio_stream_pair() -> typing.Tuple[MemoryByteStream, MemoryByteStream]:
+    import anyio
+
+    client_send, server_receive = anyio.create_memory_object_stream(16)
+    server_send, client_receive = anyio.create_memory_object_stream(16)
+    return (
+        MemoryByteStream(client_send, client_receive),
+        MemoryByteStream(server_send, server_receive),
+    )
+
+
+@pytest.mark.parametrize("backend", ["asyncio", "trio"])
+def test_socks5_handshake_anyio_task_group(backend: str) -> None:
+    anyio = pytest.importorskip("anyio")
+    pytest.importorskip(backend)
+    replies: typing.List[SOCKS5Reply] = []
+
+    async def client(stream: MemoryByteStream, pipelined: bool) -> None:
+        reply = await socks5_handshake(
+            AnyioStream(stream), ("::1", 80), auth=CREDENTIALS, pipelined=pipelined
+        )
+        replies.append(reply)
+
+    async def main() -> None:
+        async with anyio.create_task_group() as task_group:
+            for index in range(50):
+                client_stream, server_stream = anyio_stream_pair()
+                task_group.start_soon(client, client_stream, index % 2 == 0)
+                task_group.start_soon(serve_socks5, AnyioStream(server_stream))
+
+    anyio.run(main, backend=backend)
+    assert len(replies) == 50
+
+
+def test_anyio_stream_end_of_stream() -> None:
+    anyio = pytest.importorskip("anyio")
+
+    async def main() -> None:
+        client_stream, server_stream = anyio_stream_pair()
+        await server_stream.aclose()
+        with pytest.raises(ProtocolError):
+            await socks5_handshake(AnyioStream(client_stream), "example.com:80")
+
+    anyio.run(main)
+
+
+def test_socks5_handshake_asyncio() -> None:
+    async def main() -> None:
+        client_sock, server_sock = socket.socketpair()
+        with client_sock, server_sock:
+            reader, writer = await asyncio.open_connection(sock=client_sock)
+            server_reader, server_writer = await asyncio.open_connection(
+                sock=server_sock
+            )
+            server = AsyncioStream(server_reader, server_writer)
+            reply, _ = await asyncio.gather(
+                socks5_handshake(AsyncioStream(reader, writer), "example.com:80"),
+                serve_socks5(server),
+            )
+            assert reply.reply_code == SOCKS5ReplyCode.SUCCEEDED
+            writer.close()
+            server_writer.close()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_socks5_handshake_blocking_socket(pipelined: bool) -> None:
+    client_sock, server_sock = socket.socketpair()
+    with client_sock, server_sock:
+        thread = serve_in_thread(server_sock, serve_socks5)
+        reply = run_sync(
+            socks5_handshake(
+                SocketStream(client_sock),
+                "example.com:80",
+                auth=CREDENTIALS,
+                pipelined=pipelined,
+            )
+        )
+        thread.join()
+    assert reply == SOCKS5Reply.from_address(
+        SOCKS5ReplyCode.SUCCEEDED, ("10.0.0.1", 4321)
+    )
+
+
+def test_socks5_handshake_rejected() -> None:
+    async def reject(stream: AsyncByteStream) -> None:
+        await serve_socks5(stream, SOCKS5ReplyCode.CONNECTION_REFUSED)
+
+    client_sock, server_sock = socket.socketpair()
+    with client_sock, server_sock:
+        thread = serve_in_thread(server_sock, reject)
+        with pytest.raises(SOCKSError, match="CONNECTION_REFUSED"):
+            run_sync(socks5_handshake(SocketStream(client_sock), "example.com:80"))
+        thread.join()
+
+
+def test_socks5_handshake_truncated_reply() -> None:
+    client_sock, server_sock = socket.socketpair()
+    with client_sock, server_sock:
+        server_sock.sendall(b"\x05")
+        server_sock.shutdown(socket.SHUT_WR)
+        with pytest.raises(ProtocolError):
+            run_sync(socks5_handshake(SocketStream(client_sock), "example.com:80"))
+
+
+@pytest.mark.parametrize("socks4a", [False, True])
+def test_socks4_handshake_blocking_socket(socks4a: bool) -> None:
+    client_sock, server_sock = socket.socketpair()
+    with client_sock, server_sock:
+        thread = serve_in_thread(server_sock, serve_socks4)
+        reply = run_sync(
+            socks4_handshake(
+                SocketStream(client_sock),
+                "127.0.0.1:8080",
+                user_id=b"socksio",
+                socks4a=socks4a,
+            )
+        )
+        thread.join()
+    assert reply == SOCKS4Reply(SOCKS4ReplyCode.REQUEST_GRANTED, 80, "127.0.0.1")
+
+
+def test_run_sync_rejects_suspending_coroutine() -> None:
+    async def suspend() -> None:
+        await asyncio.sleep(0)
+
+    with pytest.raises(RuntimeError):
+        run_sync(suspend())
+
+
+def test_chain_handshake_blocking_socket() -> None:
+    async def serve_chain(stream: AsyncByteStream) -> None:
+        await serve_socks5(stream)
+        await serve_socks5(stream)
+        await serve_socks4(stream)
+        await stream.send(b"tunnel")
+
+    hops = [
+        ProxyHop("10.0.0.1:1080"),
+        ProxyHop(("10.0.0.2", 1080), auth=CREDENTIALS),
+        ProxyHop("proxy.example:1080", protocol="socks4a", user_id=b"socksio"),
+    ]
+    client_sock, server_sock = socket.socketpair()
+    with client_sock, server_sock:
+        thread = serve_in_thread(server_sock, serve_chain)
+        timings = run_sync(
+            chain_handshake(SocketStream(client_sock), hops, "example.com:80")
+        )
+        assert client_sock.recv(6) == b"tunnel"
+        thread.join()
+
+    assert [(timing.proxy, timing.protocol) for timing in timings] == [
+        (("10.0.0.1", 1080), "socks5"),
+        (("10.0.0.2", 1080), "socks5"),
+        (("proxy.example", 1080), "socks4a"),
+    ]
+    assert all(timing.duration >= 0 for timing in timings)
+    assert timings[0].started <= timings[1].started <= timings[2].started
+
+
+@pytest.mark.parametrize(
+    "hops,exception",
+    [([], ValueError), ([ProxyHop("10.0.0.1:1080", protocol="socks4")], SOCKSError)],
+)
+def test_chain_handshake_invalid_hops(
+    hops: typing.List[ProxyHop], exception: typing.Type[Exception]
+) -> None:
+    client_sock, server_sock = socket.socketpair()
+    with client_sock, server_sock:
+        with pytest.raises(exception):
+            run_sync(chain_handshake(SocketStream(client_sock), hops, "a.example:80"))
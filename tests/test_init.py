@@ -0,0 +1,61 @@
+import subprocess
+import sys
+import typing
+
+import pytest
+
+import socksio
+
+
+def run_python(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    ).stdout
+
+
+@pytest.mark.parametrize(
+    "name,expected",
+    [
+        ("SOCKS4Connection", "socksio.socks4"),
+        ("SOCKS5Connection", "socksio.socks5"),
+        ("NEED_DATA", None),
+    ],
+)
+def test_submodules_imported_lazily(name: str, expected: typing.Optional[str]) -> None:
+    modules = run_python(
+        "import sys, socksio\n"
+        "print(sorted(sys.modules))\n"
+        "socksio.{}\n"
+        "print(sorted(sys.modules))\n".format(name)
+    ).splitlines()
+    before, after = eval(modules[0]), eval(modules[1])
+    assert "socksio.utils" not in before
+    for module in ("socksio.socks4", "socksio.socks5"):
+        assert module not in before
+        assert (module in after) == (module == expected)
+
+
+@pytest.mark.parametrize("name", ["compat", "socks4", "socks5", "utils"])
+def test_submodule_attributes(name: str) -> None:
+    output = run_python(
+        "import socksio\n"
+        "print(socksio.{0}.__name__)\n"
+        "print({0!r} in dir(socksio))\n".format(name)
+    )
+    assert output.splitlines() == ["socksio." + name, "True"]
+
+
+def test_all() -> None:
+    namespace: dict = {}
+    exec("from socksio import *", namespace)
+    assert set(socksio.__all__) <= set(namespace)
+    assert set(socksio.__all__) <= set(dir(socksio))
+    assert socksio.SOCKS5Connection is socksio.socks5.SOCKS5Connection
+
+
+def test_unknown_attribute() -> None:
+    with pytest.raises(AttributeError, match="has no attribute 'SOCKS6Connection'"):
+        socksio.SOCKS6Connection  # type: ignore[attr-defined]
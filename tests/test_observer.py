@@ -0,0 +1,172 @@
+import typing
+
+import pytest
+
+from socksio import (
+    ProtocolError,
+    SOCKS4Command,
+    SOCKS4Connection,
+    SOCKS4Reply,
+    SOCKS4ReplyCode,
+    SOCKS4Request,
+    SOCKS5AuthMethod,
+    SOCKS5AuthMethodsRequest,
+    SOCKS5AuthReply,
+    SOCKS5Command,
+    SOCKS5CommandRequest,
+    SOCKS5Connection,
+    SOCKS5Reply,
+    SOCKS5UsernamePasswordReply,
+    SOCKS5UsernamePasswordRequest,
+)
+from socksio.observer import ConnectionObserver, StateTimer
+from socksio.socks4 import SOCKS4ServerConnection, SOCKS4State
+from socksio.socks5 import SOCKS5ServerConnection, SOCKS5State
+
+SOCKS5_REPLY = b"\x05\x00\x00\x01\x7f\x00\x00\x01\x04\x38"
+
+
+class RecordingObserver(ConnectionObserver):
+    def __init__(self) -> None:
+        self.events: typing.List[typing.Tuple[str, typing.Any]] = []
+        self.timestamps: typing.List[float] = []
+
+    def on_state_change(
+        self,
+        connection: typing.Any,
+        old_state: typing.Any,
+        new_state: typing.Any,
+        timestamp: float,
+    ) -> None:
+        self.events.append(("state", (old_state, new_state)))
+        self.timestamps.append(timestamp)
+
+    def on_frame_sent(
+        self, connection: typing.Any, frame: typing.Any, timestamp: float
+    ) -> None:
+        self.events.append(("sent", type(frame)))
+        self.timestamps.append(timestamp)
+
+    def on_frame_parsed(
+        self, connection: typing.Any, frame: typing.Any, timestamp: float
+    ) -> None:
+        self.events.append(("parsed", type(frame)))
+        self.timestamps.append(timestamp)
+
+
+def test_socks5_connection_observer() -> None:
+    observer = RecordingObserver()
+    conn = SOCKS5Connection(observer=observer)
+    conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD]))
+    conn.receive_data(b"\x05")
+    conn.receive_data(b"\x02")
+    conn.send(SOCKS5UsernamePasswordRequest(b"user", b"pass"))
+    conn.receive_data(b"\x01\x00")
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.b:80"))
+    conn.receive_data(SOCKS5_REPLY)
+
+    assert observer.events == [
+        ("sent", SOCKS5AuthMethodsRequest),
+        (
+            "state",
+            (SOCKS5State.CLIENT_AUTH_REQUIRED, SOCKS5State.SERVER_AUTH_REPLY),
+        ),
+        ("parsed", SOCKS5AuthReply),
+        (
+            "state",
+            (
+                SOCKS5State.SERVER_AUTH_REPLY,
+                SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD,
+            ),
+        ),
+        ("sent", SOCKS5UsernamePasswordRequest),
+        (
+            "state",
+            (
+                SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD,
+                SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD,
+            ),
+        ),
+        ("parsed", SOCKS5UsernamePasswordReply),
+        (
+            "state",
+            (
+                SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD,
+                SOCKS5State.CLIENT_AUTHENTICATED,
+            ),
+        ),
+        ("sent", SOCKS5CommandRequest),
+        ("parsed", SOCKS5Reply),
+        ("state", (SOCKS5State.CLIENT_AUTHENTICATED, SOCKS5State.TUNNEL_READY)),
+    ]
+    assert observer.timestamps == sorted(observer.timestamps)
+
+
+def test_state_timer() -> None:
+    timer = StateTimer()
+    conn = SOCKS5Connection(observer=timer)
+    conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.NO_AUTH_REQUIRED]))
+    conn.receive_data(b"\x05\x00")
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.b:80"))
+    conn.receive_data(SOCKS5_REPLY)
+
+    assert [state for state, _ in timer.durations] == [
+        SOCKS5State.SERVER_AUTH_REPLY,
+        SOCKS5State.CLIENT_AUTHENTICATED,
+    ]
+    assert all(duration >= 0 for _, duration in timer.durations)
+
+
+def test_socks5_server_connection_observer() -> None:
+    observer = RecordingObserver()
+    conn = SOCKS5ServerConnection(max_buffer_size=8, observer=observer)
+    conn.receive_data(b"\x05\x01\x00")
+    conn.send(SOCKS5AuthReply(SOCKS5AuthMethod.NO_AUTH_REQUIRED))
+    with pytest.raises(ProtocolError):
+        conn.receive_data(b"\x05" * 9)
+
+    assert observer.events == [
+        ("parsed", SOCKS5AuthMethodsRequest),
+        (
+            "state",
+            (SOCKS5State.CLIENT_AUTH_REQUIRED, SOCKS5State.SERVER_AUTH_REPLY),
+        ),
+        ("sent", SOCKS5AuthReply),
+        (
+            "state",
+            (SOCKS5State.SERVER_AUTH_REPLY, SOCKS5State.CLIENT_AUTHENTICATED),
+        ),
+        ("state", (SOCKS5State.CLIENT_AUTHENTICATED, SOCKS5State.MUST_CLOSE)),
+    ]
+
+
+def test_socks4_connection_observer() -> None:
+    observer = RecordingObserver()
+    conn = SOCKS4Connection(b"socksio", observer=observer)
+    assert conn.state == SOCKS4State.CLIENT_REQUEST
+    conn.send(SOCKS4Request.from_address(SOCKS4Command.CONNECT, "127.0.0.1:80"))
+    assert conn.state == SOCKS4State.SERVER_REPLY
+    conn.receive_data(b"\x00\x5b\x00\x00\x00\x00\x00\x00")
+    assert conn.state == SOCKS4State.MUST_CLOSE
+
+    assert observer.events == [
+        ("sent", SOCKS4Request),
+        ("state", (SOCKS4State.CLIENT_REQUEST, SOCKS4State.SERVER_REPLY)),
+        ("parsed", SOCKS4Reply),
+        ("state", (SOCKS4State.SERVER_REPLY, SOCKS4State.MUST_CLOSE)),
+    ]
+
+
+def test_socks4_server_connection_observer() -> None:
+    observer = RecordingObserver()
+    conn = SOCKS4ServerConnection(observer=observer)
+    conn.receive_data(b"\x04\x01\x00\x50\x7f\x00")
+    conn.receive_data(b"\x00\x01\x00")
+    conn.send(SOCKS4Reply(SOCKS4ReplyCode.REQUEST_GRANTED, 0, None))
+
+    assert observer.events == [
+        ("parsed", SOCKS4Request),
+        ("state", (SOCKS4State.CLIENT_REQUEST, SOCKS4State.SERVER_REPLY)),
+        ("sent", SOCKS4Reply),
+        ("state", (SOCKS4State.SERVER_REPLY, SOCKS4State.TUNNEL_READY)),
+    ]
@@ -0,0 +1,179 @@
+import asyncio
+import typing
+
+import pytest
+
+from socksio import SOCKS5Command, SOCKS5CommandRequest, SOCKS5Connection, SOCKSError
+from socksio.aio import open_connection
+from socksio.server import SOCKS5Server
+from socksio.socks5 import (
+    SOCKS5AuthMethod,
+    SOCKS5AuthMethodsRequest,
+    SOCKS5Reply,
+    SOCKS5ReplyCode,
+)
+
+
+class EchoServer:
+    async def __aenter__(self) -> typing.Tuple[str, int]:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return host, port
+
+    async def __aexit__(self, *args: typing.Any) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+
+async def start_proxy(**kwargs: typing.Any) -> SOCKS5Server:
+    server = SOCKS5Server(**kwargs)
+    await server.start("127.0.0.1", 0)
+    return server
+
+
+def test_server_connect_relays_data() -> None:
+    async def main() -> None:
+        async with EchoServer() as target:
+            proxy = await start_proxy(buffer_size=4096)
+            try:
+                reader, writer = await open_connection(proxy.address, target)
+                payload = bytes(range(256)) * 4096
+                writer.write(payload)
+                await writer.drain()
+                assert await reader.readexactly(len(payload)) == payload
+                writer.write_eof()
+                assert await reader.read() == b""
+                writer.close()
+            finally:
+                await proxy.aclose()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_server_username_password(pipelined: bool) -> None:
+    checked = []
+
+    async def authenticate(username: bytes, password: bytes) -> bool:
+        checked.append(username)
+        return (username, password) == (b"user", b"pass")
+
+    async def main() -> None:
+        async with EchoServer() as target:
+            proxy = await start_proxy(authenticate=authenticate)
+            try:
+                reader, writer = await open_connection(
+                    proxy.address, target, auth=(b"user", b"pass"), pipelined=pipelined
+                )
+                writer.write(b"ping")
+                assert await reader.readexactly(4) == b"ping"
+                writer.close()
+
+                with pytest.raises(SOCKSError):
+                    await open_connection(
+                        proxy.address,
+                        target,
+                        auth=(b"user", b"wrong"),
+                        pipelined=pipelined,
+                    )
+                with pytest.raises(SOCKSError):
+                    await open_connection(proxy.address, target)
+            finally:
+                await proxy.aclose()
+        assert checked == [b"user", b"user"]
+
+    asyncio.run(main())
+
+
+def test_server_pipelined_early_data() -> None:
+    async def main() -> None:
+        async with EchoServer() as target:
+            proxy = await start_proxy()
+            try:
+                reader, writer = await asyncio.open_connection(*proxy.address)
+                conn = SOCKS5Connection(pipelined=True)
+                conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.NO_AUTH_REQUIRED]))
+                conn.send(
+                    SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, target)
+                )
+                writer.write(conn.data_to_send() + b"early")
+                assert await reader.readexactly(2) == b"\x05\x00"
+                reply = SOCKS5Reply.loads(await reader.readexactly(10))
+                assert reply.reply_code == SOCKS5ReplyCode.SUCCEEDED
+                assert await reader.readexactly(5) == b"early"
+                writer.close()
+            finally:
+                await proxy.aclose()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "command,target,expected",
+    [
+        (SOCKS5Command.CONNECT, None, SOCKS5ReplyCode.CONNECTION_REFUSED),
+        (SOCKS5Command.CONNECT, "invalid.:80", SOCKS5ReplyCode.HOST_UNREACHABLE),
+        (SOCKS5Command.BIND, "127.0.0.1:80", SOCKS5ReplyCode.COMMAND_NOT_SUPPORTED),
+    ],
+)
+def test_server_command_failures(
+    command: SOCKS5Command, target: typing.Optional[str], expected: SOCKS5ReplyCode
+) -> None:
+    async def main() -> None:
+        nonlocal target
+        if target is None:
+            async with EchoServer() as (host, port):
+                pass
+            target = "{}:{}".format(host, port)
+
+        proxy = await start_proxy()
+        try:
+            reader, writer = await asyncio.open_connection(*proxy.address)
+            conn = SOCKS5Connection()
+            conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.NO_AUTH_REQUIRED]))
+            writer.write(conn.data_to_send())
+            conn.receive_data(await reader.readexactly(2))
+            conn.send(SOCKS5CommandRequest.from_address(command, target))
+            writer.write(conn.data_to_send())
+            reply = conn.receive_data(await reader.readexactly(10))
+            assert isinstance(reply, SOCKS5Reply)
+            assert reply.reply_code == expected
+            assert await reader.read() == b""
+            writer.close()
+        finally:
+            await proxy.aclose()
+
+    asyncio.run(main())
+
+
+def test_server_rejects_malformed_client() -> None:
+    async def main() -> None:
+        proxy = await start_proxy()
+        try:
+            reader, writer = await asyncio.open_connection(*proxy.address)
+            writer.write(b"\x04\x01\x00\x50")
+            assert await reader.read() == b""
+            writer.close()
+        finally:
+            await proxy.aclose()
+
+    asyncio.run(main())
+
+
+def test_server_not_listening() -> None:
+    server = SOCKS5Server()
+    with pytest.raises(RuntimeError):
+        server.address
+    with pytest.raises(RuntimeError):
+        asyncio.run(server.serve_forever())
@@ -8,6 +8,7 @@ from socksio import (
     SOCKS4Reply,
     SOCKS4ReplyCode,
     SOCKS4Request,
+    SOCKS4RequestTemplate,
     SOCKSError,
 )
 
@@ -149,3 +150,136 @@ def test_SOCKS4A_connection_request(command: SOCKS4Command) -> None:
     assert data[4:8] == b"\x00\x00\x00\xff"
     assert data[8:14] == b"socks\x00"
     assert data[14:] == b"proxy.example.com\x00"
+
+
+@pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+def test_socks4_reply_loads_from_buffer_with_offset(buffer_type) -> None:
+    data = buffer_type(b"\xff\xff\x00Z\x1f\x90\x7f\x00\x00\x01")
+
+    reply = SOCKS4Reply.loads(data, offset=2)
+
+    assert reply == SOCKS4Reply(
+        reply_code=SOCKS4ReplyCode.REQUEST_GRANTED, port=8080, addr="127.0.0.1"
+    )
+
+
+def test_socks4_receive_data_from_memoryview() -> None:
+    conn = SOCKS4Connection(user_id=b"socks")
+    buffer = bytearray(b"\x00Z\x1f\x90\x7f\x00\x00\x01")
+
+    with memoryview(buffer) as view:
+        reply = conn.receive_data(view)
+
+    assert reply.addr == "127.0.0.1"
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        SOCKS4Request.from_address(SOCKS4Command.CONNECT, ("127.0.0.1", 8080)),
+        SOCKS4ARequest.from_address(SOCKS4Command.CONNECT, ("proxy.example.com", 8080)),
+    ],
+)
+@pytest.mark.parametrize("use_memoryview", [False, True])
+def test_socks4_requests_write_into(request_, use_memoryview) -> None:
+    expected = request_.dumps(user_id=b"socks")
+    storage = bytearray(b"\xff" * (len(expected) + 2))
+    buf = memoryview(storage) if use_memoryview else storage
+
+    written = request_.write_into(buf, 1, user_id=b"socks")
+
+    assert written == request_.packed_size(user_id=b"socks") == len(expected)
+    assert storage == b"\xff" + expected + b"\xff"
+
+
+def test_socks4_request_write_into_buffer_too_small() -> None:
+    request_ = SOCKS4Request.from_address(SOCKS4Command.CONNECT, ("127.0.0.1", 8080))
+
+    with pytest.raises(ValueError):
+        request_.write_into(bytearray(8), user_id=b"socks")
+
+
+def test_socks4_data_to_send_view() -> None:
+    conn = SOCKS4Connection(user_id=b"socks")
+    request = SOCKS4Request.from_address(SOCKS4Command.CONNECT, ("127.0.0.1", 8080))
+    conn.send(request)
+
+    with conn.data_to_send_view() as view:
+        assert view == request.dumps(user_id=b"socks")
+        sent = len(view)
+    conn.mark_data_sent(sent)
+
+    assert conn.data_to_send() == b""
+
+
+def test_socks4_bytes_needed() -> None:
+    conn = SOCKS4Connection(user_id=b"socks")
+    assert conn.bytes_needed == 8
+
+    conn.receive_data(b"\x00Z\x1f\x90\x7f\x00\x00\x01")
+
+    assert conn.bytes_needed == 0
+
+
+@pytest.mark.parametrize("command", [SOCKS4Command.CONNECT, SOCKS4Command.BIND])
+def test_socks4_request_template(command: SOCKS4Command) -> None:
+    template = SOCKS4RequestTemplate(command, b"socksio")
+
+    for port, addr in [(80, b"\x7f\x00\x00\x01"), (65535, b"\x0a\x00\x00\xff")]:
+        expected = SOCKS4Request(command, port, addr, b"socksio").dumps()
+        assert template.dumps(port, addr) == expected
+        assert template.packed_size() == len(expected)
+
+    for port, domain_name in [(80, b"example.com"), (443, b"a.b")]:
+        expected = SOCKS4ARequest(command, port, domain_name, b"socksio").dumps()
+        assert template.dumps_socks4a(port, domain_name) == expected
+        assert template.packed_size(domain_name) == len(expected)
+
+
+@pytest.mark.parametrize("use_memoryview", [False, True])
+def test_socks4_request_template_write_into(use_memoryview: bool) -> None:
+    template = SOCKS4RequestTemplate(SOCKS4Command.CONNECT, b"socks")
+    storage = bytearray(b"\xff" * (template.packed_size(b"example.com") + 2))
+    buf = memoryview(storage) if use_memoryview else storage
+    assert template.write_template_into(buf, 1) == template.packed_size()
+
+    for port in (80, 8080):
+        written = template.write_into(buf, 1, port, b"\x7f\x00\x00\x01")
+
+        expected = template.dumps(port, b"\x7f\x00\x00\x01")
+        assert written == len(expected)
+        assert storage[: written + 1] == b"\xff" + expected
+
+    for port, domain_name in [(443, b"example.com"), (80, b"a.b")]:
+        written = template.write_socks4a_into(buf, 1, port, domain_name)
+
+        expected = template.dumps_socks4a(port, domain_name)
+        assert written == len(expected)
+        assert storage[: written + 1] == b"\xff" + expected
+
+    # Only the fields of the request are written, not those of the template.
+    storage[1] = 0
+    template.write_into(buf, 1, 80, b"\x7f\x00\x00\x01")
+    assert storage[1] == 0
+
+    with pytest.raises(ValueError):
+        template.write_template_into(buf, len(storage) - 2)
+    with pytest.raises(ValueError):
+        template.write_into(buf, len(storage) - 2, 80, b"\x7f\x00\x00\x01")
+    with pytest.raises(ValueError):
+        template.write_socks4a_into(buf, 3, 80, b"example.com")
+
+
+def test_socks4_request_template_errors() -> None:
+    with pytest.raises(SOCKSError):
+        SOCKS4RequestTemplate(SOCKS4Command.CONNECT, b"")
+
+    template = SOCKS4RequestTemplate(SOCKS4Command.CONNECT, b"socks")
+    with pytest.raises(ValueError):
+        template.dumps(80, b"\x7f\x00\x00")
+    with pytest.raises(ValueError):
+        template.write_into(bytearray(32), 0, 80, b"\x7f\x00\x00\x00\x01")
+    with pytest.raises(ValueError):
+        template.dumps_socks4a(80, b"example.com\x00")
+    with pytest.raises(ValueError):
+        template.write_socks4a_into(bytearray(64), 0, 80, b"exam\x00ple.com")
@@ -0,0 +1,165 @@
+import typing
+
+import pytest
+
+from socksio import (
+    NEED_DATA,
+    ProtocolError,
+    SOCKS4ARequest,
+    SOCKS4Command,
+    SOCKS4Reply,
+    SOCKS4ReplyCode,
+    SOCKS4Request,
+)
+from socksio.socks4 import SOCKS4ServerConnection, SOCKS4State
+
+
+def test_socks4_request_loads_round_trip() -> None:
+    request = SOCKS4Request.from_address(
+        SOCKS4Command.CONNECT, "127.0.0.1:8080", user_id=b"socks"
+    )
+    assert SOCKS4Request.loads(request.dumps()) == request
+
+
+def test_socks4a_request_loads_round_trip() -> None:
+    request = SOCKS4ARequest.from_address(
+        SOCKS4Command.BIND, "example.com:80", user_id=b"socks"
+    )
+    data = bytearray(b"..") + request.dumps()
+    assert SOCKS4ARequest.loads(memoryview(data), 2) == request
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x04\x01\x00\x50\x7f\x00\x00\x01",  # missing USERID terminator
+        b"\x05\x01\x00\x50\x7f\x00\x00\x01\x00",  # incorrect version
+        b"\x04\x03\x00\x50\x7f\x00\x00\x01\x00",  # unknown command
+        b"\x04\x01\x00\x50\x7f\x00\x00\x01a\x00b\x00",  # NUL inside USERID
+    ],
+)
+def test_socks4_request_loads_malformed(data: bytes) -> None:
+    with pytest.raises(ProtocolError):
+        SOCKS4Request.loads(data)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x04\x01\x00\x50\x7f\x00\x00\x01a\x00host\x00",  # not a 0.0.0.x address
+        b"\x04\x01\x00\x50\x00\x00\x00\x01a\x00",  # missing domain name
+        b"\x04\x01\x00\x50\x00\x00\x00\x01a\x00ho\x00st\x00",  # NUL inside name
+    ],
+)
+def test_socks4a_request_loads_malformed(data: bytes) -> None:
+    with pytest.raises(ProtocolError):
+        SOCKS4ARequest.loads(data)
+
+
+@pytest.mark.parametrize(
+    "reply,expected",
+    [
+        (
+            SOCKS4Reply(SOCKS4ReplyCode.REQUEST_GRANTED, 1080, "127.0.0.1"),
+            b"\x00\x5a\x04\x38\x7f\x00\x00\x01",
+        ),
+        (
+            SOCKS4Reply(SOCKS4ReplyCode.REQUEST_REJECTED_OR_FAILED, 0, None),
+            b"\x00\x5b\x00\x00\x00\x00\x00\x00",
+        ),
+    ],
+)
+def test_socks4_reply_dumps(reply: SOCKS4Reply, expected: bytes) -> None:
+    assert reply.dumps() == expected
+    assert reply.packed_size() == 8
+    buf = bytearray(10)
+    assert reply.write_into(memoryview(buf), 2) == 8
+    assert buf[2:] == expected
+
+
+def test_socks4_reply_dumps_requires_ipv4() -> None:
+    with pytest.raises(ValueError):
+        SOCKS4Reply(SOCKS4ReplyCode.REQUEST_GRANTED, 80, "::1").dumps()
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        SOCKS4Request.from_address(SOCKS4Command.CONNECT, "10.0.0.1:22", b"user"),
+        SOCKS4ARequest.from_address(SOCKS4Command.CONNECT, "example.com:443", b"u"),
+    ],
+    ids=["socks4", "socks4a"],
+)
+def test_socks4_server_connection_byte_by_byte(
+    request_: typing.Union[SOCKS4Request, SOCKS4ARequest],
+) -> None:
+    conn = SOCKS4ServerConnection()
+    assert conn.bytes_needed == 9
+
+    data = request_.dumps()
+    received = None
+    for index in range(len(data)):
+        received = conn.receive_data(data[index : index + 1])
+        if received is not NEED_DATA:
+            break
+        assert conn.bytes_needed >= 1
+    assert received == request_
+    assert conn.state == SOCKS4State.SERVER_REPLY
+    assert conn.bytes_needed == 0
+
+    conn.send(SOCKS4Reply(SOCKS4ReplyCode.REQUEST_GRANTED, 0, "0.0.0.0"))
+    assert conn.state == SOCKS4State.TUNNEL_READY
+    assert conn.data_to_send() == b"\x00\x5a\x00\x00\x00\x00\x00\x00"
+    assert index == len(data) - 1
+    assert conn.trailing_data() == b""
+
+
+def test_socks4_server_connection_single_chunk() -> None:
+    conn = SOCKS4ServerConnection()
+    request = conn.receive_data(b"\x04\x01\x00\x50\x00\x00\x00\x07id\x00a.b\x00GET")
+    assert request == SOCKS4ARequest(SOCKS4Command.CONNECT, 80, b"a.b", b"id")
+    conn.send(SOCKS4Reply(SOCKS4ReplyCode.REQUEST_REJECTED_OR_FAILED, 0, None))
+    assert conn.state == SOCKS4State.MUST_CLOSE
+    view = conn.data_to_send_view()
+    assert len(view) == 8
+    view.release()
+    conn.mark_data_sent(8)
+    assert conn.trailing_data() == b"GET"
+    with pytest.raises(ProtocolError):
+        conn.receive_data(b"")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x04\x01\x00\x50\x7f\x00\x00\x01" + b"u" * 9,  # USERID too long
+        b"\x04\x01\x00\x50\x00\x00\x00\x01\x00" + b"h" * 9,  # domain name too long
+        b"\x04\x01\x00\x50\x7f\x00\x00\x01" + b"u" * 9 + b"\x00",
+    ],
+)
+def test_socks4_server_connection_field_too_long(data: bytes) -> None:
+    conn = SOCKS4ServerConnection(max_field_length=8)
+    with pytest.raises(ProtocolError, match="maximum length"):
+        for index in range(len(data)):
+            conn.receive_data(data[index : index + 1])
+    assert conn.state == SOCKS4State.MUST_CLOSE
+
+
+def test_socks4_server_connection_malformed_request() -> None:
+    conn = SOCKS4ServerConnection()
+    with pytest.raises(ProtocolError):
+        conn.receive_data(b"\x05\x01\x00\x50")
+    assert conn.state == SOCKS4State.MUST_CLOSE
+
+
+def test_socks4_server_connection_unknown_command() -> None:
+    conn = SOCKS4ServerConnection()
+    with pytest.raises(ProtocolError):
+        conn.receive_data(b"\x04\x09\x00\x50\x7f\x00\x00\x01\x00")
+    assert conn.state == SOCKS4State.MUST_CLOSE
+
+
+def test_socks4_server_connection_unexpected_reply() -> None:
+    conn = SOCKS4ServerConnection()
+    with pytest.raises(ProtocolError):
+        conn.send(SOCKS4Reply(SOCKS4ReplyCode.REQUEST_GRANTED, 0, None))
@@ -1,6 +1,7 @@
 import pytest
 
 from socksio import (
+    NEED_DATA,
     ProtocolError,
     SOCKS5AType,
     SOCKS5AuthMethod,
@@ -13,7 +14,7 @@ from socksio import (
     SOCKS5ReplyCode,
     SOCKS5UsernamePasswordRequest,
 )
-from socksio.socks5 import SOCKS5State
+from socksio.socks5 import SOCKS5State, SOCKS5UsernamePasswordReply
 from socksio.utils import AddressType
 
 
@@ -117,15 +118,25 @@ def test_socks5_auth_reply_no_acceptable_auth_method() -> None:
     assert reply == SOCKS5AuthReply(method=SOCKS5AuthMethod.NO_ACCEPTABLE_METHODS)
 
 
-@pytest.mark.parametrize(
-    "data", [b"\x05", b"\x05\x10"]  # missing method byte , incorrect method value
-)
-def test_socks5_auth_reply_malformed(data: bytes) -> None:
+def test_socks5_auth_reply_malformed() -> None:
     conn = SOCKS5Connection()
     auth_request = SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD])
     conn.send(auth_request)
     with pytest.raises(ProtocolError):
-        conn.receive_data(data)
+        conn.receive_data(b"\x05\x10")  # incorrect method value
+
+
+def test_socks5_auth_reply_partial() -> None:
+    conn = SOCKS5Connection()
+    auth_request = SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD])
+    conn.send(auth_request)
+
+    assert conn.receive_data(b"\x05") is NEED_DATA
+    assert conn.state == SOCKS5State.SERVER_AUTH_REPLY
+    reply = conn.receive_data(SOCKS5AuthMethod.USERNAME_PASSWORD)
+
+    assert reply == SOCKS5AuthReply(method=SOCKS5AuthMethod.USERNAME_PASSWORD)
+    assert conn.state == SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD
 
 
 def test_socks5_no_auth_required_reply_sets_client_authenticated_state() -> None:
@@ -181,6 +192,7 @@ def test_socks5_auth_username_password_fail() -> None:
     conn.send(auth_request)
 
     assert conn.data_to_send() == b"\x01\x08username\x08password"
+    assert conn.receive_data(b"\x01") is NEED_DATA
     conn.receive_data(b"\x01")
     assert conn.state == SOCKS5State.MUST_CLOSE
 
@@ -276,7 +288,7 @@ def test_socks5_request_ipv6(
     "atype,addr,expected_atype,expected_addr",
     [
         (b"\x01", b"\x7f\x00\x00\x01", SOCKS5AType.IPV4_ADDRESS, "127.0.0.1"),
-        (b"\x03", b"localhost", SOCKS5AType.DOMAIN_NAME, "localhost"),
+        (b"\x03", b"\x09localhost", SOCKS5AType.DOMAIN_NAME, "localhost"),
         (
             b"\x04",
             b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01",
@@ -317,8 +329,8 @@ def test_socks5_reply_success(
     "data",
     [
         b"\x00\x00\x00\x01\x7f\x00\x00\x01\x048",  # incorrect protocol version
-        b"\x05\x00\x00\x01\x7f\x00\x00\x01\x04",  # missing one byte of port number
-        b"\x05\x00\x00\x01\x7f\x00\x00\x048",  # missing one byte of address
+        b"\x05\x00\x00\x02\x7f\x00\x00\x01\x048",  # unknown address type
+        b"\x05\x09\x00\x01\x7f\x00\x00\x01\x048",  # unknown reply code
     ],
 )
 def test_socks5_receive_malformed_data(
@@ -333,7 +345,7 @@ def test_socks5_receive_malformed_data(
     "atype,addr,expected_atype,expected_addr",
     [
         (b"\x01", b"\x7f\x00\x00\x01", SOCKS5AType.IPV4_ADDRESS, "127.0.0.1"),
-        (b"\x03", b"localhost", SOCKS5AType.DOMAIN_NAME, "localhost"),
+        (b"\x03", b"\x09localhost", SOCKS5AType.DOMAIN_NAME, "localhost"),
         (
             b"\x04",
             b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01",
@@ -366,3 +378,385 @@ def test_socks5_reply_error(
     assert reply == SOCKS5Reply(
         reply_code=error_code, atype=expected_atype, addr=expected_addr, port=1080
     )
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x05\x00\x00\x01\x7f\x00\x00\x01\x04",  # missing one byte of port number
+        b"\x05\x00\x00\x01\x7f\x00\x00\x048",  # missing one byte of address
+        b"\x05\x00\x00\x03\x09local",  # missing part of the domain name
+    ],
+)
+def test_socks5_receive_partial_data(
+    authenticated_conn: SOCKS5Connection, data: bytes
+) -> None:
+    assert authenticated_conn.receive_data(data) is NEED_DATA
+    assert authenticated_conn.state == SOCKS5State.CLIENT_AUTHENTICATED
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x05\x00\x00\x01\x7f\x00\x00\x01\x048",
+        b"\x05\x00\x00\x03\x09localhost\x048",
+        b"\x05\x00\x00\x04" + b"\x00" * 15 + b"\x01\x048",
+    ],
+)
+def test_socks5_reply_received_byte_by_byte(
+    authenticated_conn: SOCKS5Connection, data: bytes
+) -> None:
+    for i in range(len(data) - 1):
+        assert authenticated_conn.receive_data(data[i : i + 1]) is NEED_DATA
+
+    reply = authenticated_conn.receive_data(data[-1:])
+
+    assert reply.reply_code == SOCKS5ReplyCode.SUCCEEDED
+    assert reply.port == 1080
+    assert authenticated_conn.state == SOCKS5State.TUNNEL_READY
+    assert authenticated_conn.trailing_data() == b""
+
+
+def test_socks5_reply_with_trailing_tunnel_data(
+    authenticated_conn: SOCKS5Connection,
+) -> None:
+    reply = authenticated_conn.receive_data(
+        b"\x05\x00\x00\x01\x7f\x00\x00\x01\x048SSH-2.0-OpenSSH\r\n"
+    )
+
+    assert reply == SOCKS5Reply(
+        reply_code=SOCKS5ReplyCode.SUCCEEDED,
+        atype=SOCKS5AType.IPV4_ADDRESS,
+        addr="127.0.0.1",
+        port=1080,
+    )
+    assert authenticated_conn.trailing_data() == b"SSH-2.0-OpenSSH\r\n"
+    assert authenticated_conn.trailing_data() == b""
+
+
+@pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+def test_socks5_reply_loads_from_buffer_with_offset(buffer_type) -> None:
+    data = buffer_type(b"garbage\x05\x00\x00\x03\x09localhost\x048")
+
+    reply = SOCKS5Reply.loads(data, offset=7)
+
+    assert reply == SOCKS5Reply(
+        reply_code=SOCKS5ReplyCode.SUCCEEDED,
+        atype=SOCKS5AType.DOMAIN_NAME,
+        addr="localhost",
+        port=1080,
+    )
+
+
+@pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+def test_socks5_auth_replies_loads_from_buffer_with_offset(buffer_type) -> None:
+    assert SOCKS5AuthReply.loads(buffer_type(b"\x00\x05\x02"), offset=1) == (
+        SOCKS5AuthReply(method=SOCKS5AuthMethod.USERNAME_PASSWORD)
+    )
+    reply = SOCKS5UsernamePasswordReply.loads(buffer_type(b"\x00\x01\x00"), offset=1)
+    assert reply.success
+    reply = SOCKS5UsernamePasswordReply.loads(buffer_type(b"\x01\x00"), offset=1)
+    assert not reply.success
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        SOCKS5AuthMethodsRequest(
+            [SOCKS5AuthMethod.NO_AUTH_REQUIRED, SOCKS5AuthMethod.USERNAME_PASSWORD]
+        ),
+        SOCKS5UsernamePasswordRequest(username=b"username", password=b"password"),
+        SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "127.0.0.1:1080"),
+        SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "localhost:1080"),
+        SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "[::1]:1080"),
+    ],
+)
+@pytest.mark.parametrize("use_memoryview", [False, True])
+def test_socks5_requests_write_into(request_, use_memoryview) -> None:
+    expected = request_.dumps()
+    storage = bytearray(b"\xff" * (len(expected) + 4))
+    buf = memoryview(storage) if use_memoryview else storage
+
+    written = request_.write_into(buf, 3)
+
+    assert written == request_.packed_size() == len(expected)
+    assert storage == b"\xff" * 3 + expected + b"\xff"
+
+
+def test_socks5_request_write_into_buffer_too_small() -> None:
+    request_ = SOCKS5CommandRequest.from_address(
+        SOCKS5Command.CONNECT, "localhost:1080"
+    )
+    buf = bytearray(request_.packed_size())
+
+    with pytest.raises(ValueError):
+        request_.write_into(buf, 1)
+    assert buf == bytearray(request_.packed_size())
+
+
+def test_socks5_data_to_send_view(authenticated_conn: SOCKS5Connection) -> None:
+    request_ = SOCKS5CommandRequest.from_address(
+        SOCKS5Command.CONNECT, "localhost:1080"
+    )
+    authenticated_conn.send(request_)
+
+    with authenticated_conn.data_to_send_view() as view:
+        assert view == request_.dumps()
+    authenticated_conn.mark_data_sent(10)
+    with authenticated_conn.data_to_send_view() as view:
+        assert view == request_.dumps()[10:]
+    authenticated_conn.mark_data_sent(6)
+
+    assert authenticated_conn.data_to_send() == b""
+
+
+def test_socks5_send_with_unreleased_view() -> None:
+    conn = SOCKS5Connection()
+    conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD]))
+    conn.receive_data(b"\x05\x02")
+    request_ = SOCKS5UsernamePasswordRequest(b"u" * 255, b"p" * 255)
+
+    with conn.data_to_send_view() as view:
+        with pytest.raises(RuntimeError, match="must be released"):
+            conn.send(request_)
+        assert view == b"\x05\x01\x02"
+    assert conn.state == SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD
+
+    conn.send(request_)
+    assert conn.data_to_send() == b"\x05\x01\x02" + request_.dumps()
+    assert conn.state == SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD
+
+
+def test_socks5_bytes_needed() -> None:
+    conn = SOCKS5Connection()
+    assert conn.bytes_needed == 0
+
+    conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD]))
+    assert conn.bytes_needed == 2
+    conn.receive_data(b"\x05")
+    assert conn.bytes_needed == 1
+    conn.receive_data(b"\x02")
+    assert conn.bytes_needed == 0
+
+    conn.send(SOCKS5UsernamePasswordRequest(b"username", b"password"))
+    assert conn.bytes_needed == 2
+    conn.receive_data(b"\x01\x00")
+
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.com:80"))
+    assert conn.bytes_needed == 5
+    conn.receive_data(b"\x05\x00\x00\x03")
+    assert conn.bytes_needed == 1
+    conn.receive_data(b"\x0a")
+    assert conn.bytes_needed == 12
+    conn.receive_data(b"proxy.test\x00")
+    assert conn.bytes_needed == 1
+    conn.receive_data(b"P")
+    assert conn.state == SOCKS5State.TUNNEL_READY
+    assert conn.bytes_needed == 0
+
+
+def test_socks5_pipelined_username_password_handshake() -> None:
+    conn = SOCKS5Connection(pipelined=True)
+    conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD]))
+    conn.send(SOCKS5UsernamePasswordRequest(b"username", b"password"))
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.com:80"))
+
+    assert conn.data_to_send() == (
+        b"\x05\x01\x02"
+        b"\x01\x08username\x08password"
+        b"\x05\x01\x00\x03\x05a.com\x00P"
+    )
+
+    replies = [conn.receive_data(b"\x05\x02\x01\x00\x05\x00\x00\x01\x7f\x00\x00")]
+    assert conn.state == SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD
+    replies.append(conn.receive_data(b""))
+    assert conn.state == SOCKS5State.CLIENT_AUTHENTICATED
+    assert conn.receive_data(b"") is NEED_DATA
+    replies.append(conn.receive_data(b"\x01\x048"))
+
+    assert replies == [
+        SOCKS5AuthReply(method=SOCKS5AuthMethod.USERNAME_PASSWORD),
+        SOCKS5UsernamePasswordReply(success=True),
+        SOCKS5Reply(
+            reply_code=SOCKS5ReplyCode.SUCCEEDED,
+            atype=SOCKS5AType.IPV4_ADDRESS,
+            addr="127.0.0.1",
+            port=1080,
+        ),
+    ]
+    assert conn.state == SOCKS5State.TUNNEL_READY
+
+
+def test_socks5_pipelined_no_auth_handshake() -> None:
+    conn = SOCKS5Connection(pipelined=True)
+    conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.NO_AUTH_REQUIRED]))
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.com:80"))
+
+    assert conn.receive_data(b"\x05\x00\x05\x00\x00\x01\x7f\x00\x00\x01\x048") == (
+        SOCKS5AuthReply(method=SOCKS5AuthMethod.NO_AUTH_REQUIRED)
+    )
+    assert conn.receive_data(b"").reply_code == SOCKS5ReplyCode.SUCCEEDED
+    assert conn.state == SOCKS5State.TUNNEL_READY
+
+
+def test_socks5_pipelined_username_password_rejected() -> None:
+    conn = SOCKS5Connection(pipelined=True)
+    conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD]))
+    conn.send(SOCKS5UsernamePasswordRequest(b"username", b"password"))
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.com:80"))
+
+    conn.receive_data(b"\x05\x02\x01\x01")
+    reply = conn.receive_data(b"")
+
+    assert reply == SOCKS5UsernamePasswordReply(success=False)
+    assert conn.state == SOCKS5State.MUST_CLOSE
+
+
+def test_socks5_pipelined_no_acceptable_methods() -> None:
+    conn = SOCKS5Connection(pipelined=True)
+    conn.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.NO_AUTH_REQUIRED]))
+    conn.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.com:80"))
+
+    conn.receive_data(b"\x05\xff")
+
+    assert conn.state == SOCKS5State.MUST_CLOSE
+
+
+@pytest.mark.parametrize(
+    "pipelined,methods",
+    [
+        (False, [SOCKS5AuthMethod.USERNAME_PASSWORD]),
+        (True, [SOCKS5AuthMethod.NO_AUTH_REQUIRED]),
+        (True, [SOCKS5AuthMethod.NO_AUTH_REQUIRED, SOCKS5AuthMethod.USERNAME_PASSWORD]),
+    ],
+)
+def test_socks5_pipelining_requires_single_known_method(pipelined, methods) -> None:
+    conn = SOCKS5Connection(pipelined=pipelined)
+    conn.send(SOCKS5AuthMethodsRequest(methods))
+
+    with pytest.raises(ProtocolError):
+        conn.send(SOCKS5UsernamePasswordRequest(b"username", b"password"))
+    if len(methods) > 1 or not pipelined:
+        with pytest.raises(ProtocolError):
+            conn.send(
+                SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "a.com:80")
+            )
+
+
+class Record:
+    """Stand-in for a record of a NumPy structured array."""
+
+    def __init__(self, host: bytes, port: int) -> None:
+        self.fields = (host, port)
+
+    def __len__(self) -> int:
+        return 2
+
+    def __getitem__(self, index: int):
+        return self.fields[index]
+
+
+def test_socks5commandrequest_dumps_batch() -> None:
+    addresses = [
+        ("127.0.0.1", 80),
+        "localhost:8080",
+        (b"::1", "443"),
+        Record(b"example.com", 53),
+    ]
+
+    buf, offsets = SOCKS5CommandRequest.dumps_batch(SOCKS5Command.CONNECT, addresses)
+
+    expected = [
+        SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, address).dumps()
+        for address in addresses[:3]
+    ]
+    expected.append(
+        SOCKS5CommandRequest.from_address(
+            SOCKS5Command.CONNECT, ("example.com", 53)
+        ).dumps()
+    )
+    assert buf == b"".join(expected)
+    assert list(offsets) == [0, 10, 26, 48, 66]
+    assert [
+        bytes(buf[start:end]) for start, end in zip(offsets, offsets[1:])
+    ] == expected
+
+
+def test_socks5commandrequest_dumps_batch_empty() -> None:
+    buf, offsets = SOCKS5CommandRequest.dumps_batch(SOCKS5Command.CONNECT, [])
+
+    assert buf == b""
+    assert list(offsets) == [0]
+
+
+def test_socks5_send_methods() -> None:
+    conn = SOCKS5Connection()
+    conn.send_auth_methods(
+        SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD])
+    )
+    conn.receive_data(b"\x05\x02")
+    conn.send_credentials(SOCKS5UsernamePasswordRequest(b"user", b"pass"))
+    conn.receive_data(b"\x01\x00")
+    conn.send_command(
+        SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "127.0.0.1:80")
+    )
+
+    assert conn.data_to_send() == (
+        b"\x05\x01\x02"
+        + b"\x01\x04user\x04pass"
+        + b"\x05\x01\x00\x01\x7f\x00\x00\x01\x00\x50"
+    )
+
+
+def test_socks5_send_request_subclass() -> None:
+    class Request(SOCKS5AuthMethodsRequest):
+        pass
+
+    conn = SOCKS5Connection()
+    conn.send(Request([SOCKS5AuthMethod.NO_AUTH_REQUIRED]))
+    assert conn.state == SOCKS5State.SERVER_AUTH_REPLY
+    assert conn.data_to_send() == b"\x05\x01\x00"
+
+
+def test_socks5_send_unknown_request_type() -> None:
+    conn = SOCKS5Connection()
+    with pytest.raises(NotImplementedError):
+        conn.send(object())  # type: ignore
+
+
+def test_socks5_bind_two_replies(authenticated_conn: SOCKS5Connection) -> None:
+    authenticated_conn.send(
+        SOCKS5CommandRequest.from_address(SOCKS5Command.BIND, "10.0.0.2:0")
+    )
+    first = authenticated_conn.receive_data(b"\x05\x00\x00\x01\x7f\x00\x00\x01\x04\x38")
+    assert first == SOCKS5Reply(
+        SOCKS5ReplyCode.SUCCEEDED, SOCKS5AType.IPV4_ADDRESS, "127.0.0.1", 1080
+    )
+    assert authenticated_conn.state == SOCKS5State.SERVER_BIND_CONNECTION_REPLY
+    assert authenticated_conn.bytes_needed == 5
+
+    assert authenticated_conn.receive_data(b"\x05\x00\x00\x01\x0a") is NEED_DATA
+    assert authenticated_conn.bytes_needed == 5
+    second = authenticated_conn.receive_data(b"\x00\x00\x02\x1f\x90data")
+    assert second == SOCKS5Reply(
+        SOCKS5ReplyCode.SUCCEEDED, SOCKS5AType.IPV4_ADDRESS, "10.0.0.2", 8080
+    )
+    assert authenticated_conn.state == SOCKS5State.TUNNEL_READY
+    assert authenticated_conn.bytes_needed == 0
+    assert authenticated_conn.trailing_data() == b"data"
+
+
+@pytest.mark.parametrize("failed_reply", [0, 1])
+def test_socks5_bind_failure(
+    authenticated_conn: SOCKS5Connection, failed_reply: int
+) -> None:
+    authenticated_conn.send(
+        SOCKS5CommandRequest.from_address(SOCKS5Command.BIND, "10.0.0.2:0")
+    )
+    replies = [b"\x05\x00\x00\x01\x7f\x00\x00\x01\x04\x38"] * 2
+    replies[failed_reply] = b"\x05\x05\x00\x01\x00\x00\x00\x00\x00\x00"
+    for reply in replies[: failed_reply + 1]:
+        authenticated_conn.receive_data(reply)
+
+    assert authenticated_conn.state == SOCKS5State.MUST_CLOSE
+    assert authenticated_conn.bytes_needed == 0
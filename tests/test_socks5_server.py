@@ -0,0 +1,333 @@
+import typing
+
+import pytest
+
+from socksio import (
+    NEED_DATA,
+    ProtocolError,
+    SOCKS5AType,
+    SOCKS5AuthMethod,
+    SOCKS5AuthMethodsRequest,
+    SOCKS5AuthReply,
+    SOCKS5Command,
+    SOCKS5CommandRequest,
+    SOCKS5Connection,
+    SOCKS5Reply,
+    SOCKS5ReplyCode,
+    SOCKS5ServerConnection,
+    SOCKS5UsernamePasswordReply,
+    SOCKS5UsernamePasswordRequest,
+)
+from socksio.socks5 import SOCKS5State
+
+
+def test_auth_methods_request_loads() -> None:
+    request = SOCKS5AuthMethodsRequest.loads(b"\x05\x03\x00\x80\x02")
+    assert request.methods == [
+        SOCKS5AuthMethod.NO_AUTH_REQUIRED,
+        SOCKS5AuthMethod.USERNAME_PASSWORD,
+    ]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x05",  # missing method count
+        b"\x04\x01\x00",  # incorrect protocol version
+        b"\x05\x02\x00",  # missing method
+    ],
+)
+def test_auth_methods_request_loads_malformed(data: bytes) -> None:
+    with pytest.raises(ProtocolError):
+        SOCKS5AuthMethodsRequest.loads(data)
+
+
+def test_username_password_request_loads() -> None:
+    data = bytearray(b"..\x01\x04user\x06secret")
+    request = SOCKS5UsernamePasswordRequest.loads(memoryview(data), 2)
+    assert request == SOCKS5UsernamePasswordRequest(b"user", b"secret")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x01\x04user",  # missing password
+        b"\x02\x04user\x04pass",  # incorrect version
+        b"\x01\x04user\x04password",  # trailing bytes
+    ],
+)
+def test_username_password_request_loads_malformed(data: bytes) -> None:
+    with pytest.raises(ProtocolError):
+        SOCKS5UsernamePasswordRequest.loads(data)
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1:80", "[::1]:443", "example.com:8080"])
+def test_command_request_loads_round_trip(address: str) -> None:
+    request = SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, address)
+    assert SOCKS5CommandRequest.loads(request.dumps()) == request
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x04\x01\x00\x01\x7f\x00\x00\x01\x00\x50",  # incorrect protocol version
+        b"\x05\x09\x00\x01\x7f\x00\x00\x01\x00\x50",  # unknown command
+        b"\x05\x01\x00\x01\x7f\x00\x00\x01\x00",  # missing port byte
+    ],
+)
+def test_command_request_loads_malformed(data: bytes) -> None:
+    with pytest.raises(ProtocolError):
+        SOCKS5CommandRequest.loads(data)
+
+
+@pytest.mark.parametrize(
+    "reply,expected",
+    [
+        (SOCKS5AuthReply(SOCKS5AuthMethod.USERNAME_PASSWORD), b"\x05\x02"),
+        (SOCKS5UsernamePasswordReply(True), b"\x01\x00"),
+        (SOCKS5UsernamePasswordReply(False), b"\x01\x01"),
+        (
+            SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, "127.0.0.1:1080"),
+            b"\x05\x00\x00\x01\x7f\x00\x00\x01\x04\x38",
+        ),
+        (
+            SOCKS5Reply.from_address(SOCKS5ReplyCode.HOST_UNREACHABLE, ("::1", 80)),
+            b"\x05\x04\x00\x04" + b"\x00" * 15 + b"\x01\x00\x50",
+        ),
+        (
+            SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, "localhost:80"),
+            b"\x05\x00\x00\x03\x09localhost\x00\x50",
+        ),
+    ],
+)
+def test_reply_dumps(reply: typing.Any, expected: bytes) -> None:
+    assert reply.dumps() == expected
+    assert reply.packed_size() == len(expected)
+    assert type(reply).loads(expected) == reply
+
+    buf = bytearray(len(expected) + 2)
+    assert reply.write_into(buf, 2) == len(expected)
+    assert buf[2:] == expected
+
+
+def test_reply_dumps_address_type_mismatch() -> None:
+    reply = SOCKS5Reply(SOCKS5ReplyCode.SUCCEEDED, SOCKS5AType.IPV6_ADDRESS, "", 0)
+    with pytest.raises(ValueError):
+        reply.dumps()
+
+
+def test_server_connection_no_auth() -> None:
+    conn = SOCKS5ServerConnection()
+    assert conn.bytes_needed == 2
+
+    assert conn.receive_data(b"\x05") is NEED_DATA
+    assert conn.bytes_needed == 1
+    assert conn.receive_data(b"\x01") is NEED_DATA
+    assert conn.bytes_needed == 1
+    request = conn.receive_data(b"\x00")
+    assert request == SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.NO_AUTH_REQUIRED])
+    assert conn.state == SOCKS5State.SERVER_AUTH_REPLY
+    assert conn.bytes_needed == 0
+
+    conn.send(SOCKS5AuthReply(SOCKS5AuthMethod.NO_AUTH_REQUIRED))
+    assert conn.data_to_send() == b"\x05\x00"
+    assert conn.state == SOCKS5State.CLIENT_AUTHENTICATED
+
+    data = b"\x05\x01\x00\x03\x0bexample.com\x00\x50"
+    for index in range(len(data) - 1):
+        assert conn.receive_data(data[index : index + 1]) is NEED_DATA
+        assert conn.bytes_needed > 0
+    command = conn.receive_data(data[-1:] + b"GET")
+    assert command == SOCKS5CommandRequest(
+        SOCKS5Command.CONNECT, SOCKS5AType.DOMAIN_NAME, b"example.com", 80
+    )
+    assert conn.state == SOCKS5State.SERVER_COMMAND_REPLY
+
+    conn.send(SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, "0.0.0.0:0"))
+    assert conn.state == SOCKS5State.TUNNEL_READY
+    view = conn.data_to_send_view()
+    assert bytes(view) == b"\x05\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+    view.release()
+    conn.mark_data_sent(10)
+    assert conn.trailing_data() == b"GET"
+
+
+@pytest.mark.parametrize("success", [True, False])
+def test_server_connection_username_password(success: bool) -> None:
+    conn = SOCKS5ServerConnection()
+    conn.receive_data(b"\x05\x02\x00\x02")
+    assert conn.auth_methods_offered == [
+        SOCKS5AuthMethod.NO_AUTH_REQUIRED,
+        SOCKS5AuthMethod.USERNAME_PASSWORD,
+    ]
+    conn.send_auth_reply(SOCKS5AuthReply(SOCKS5AuthMethod.USERNAME_PASSWORD))
+    assert conn.state == SOCKS5State.CLIENT_WAITING_FOR_USERNAME_PASSWORD
+    assert conn.bytes_needed == 2
+
+    assert conn.receive_data(b"\x01\x04us") is NEED_DATA
+    assert conn.bytes_needed == 3
+    assert conn.receive_data(b"er\x04") is NEED_DATA
+    assert conn.bytes_needed == 4
+    credentials = conn.receive_data(b"pass")
+    assert credentials == SOCKS5UsernamePasswordRequest(b"user", b"pass")
+    assert conn.state == SOCKS5State.SERVER_VERIFY_USERNAME_PASSWORD
+
+    conn.send(SOCKS5UsernamePasswordReply(success))
+    assert conn.data_to_send() == b"\x05\x02" + (
+        b"\x01\x00" if success else b"\x01\x01"
+    )
+    if success:
+        assert conn.state == SOCKS5State.CLIENT_AUTHENTICATED
+    else:
+        assert conn.state == SOCKS5State.MUST_CLOSE
+
+
+def test_server_connection_pipelined_client() -> None:
+    client = SOCKS5Connection(pipelined=True)
+    client.send(SOCKS5AuthMethodsRequest([SOCKS5AuthMethod.USERNAME_PASSWORD]))
+    client.send(SOCKS5UsernamePasswordRequest(b"user", b"pass"))
+    client.send(SOCKS5CommandRequest.from_address(SOCKS5Command.CONNECT, "[::1]:22"))
+
+    server = SOCKS5ServerConnection()
+    assert isinstance(
+        server.receive_data(client.data_to_send()), SOCKS5AuthMethodsRequest
+    )
+    assert server.receive_data(b"") is NEED_DATA
+    server.send(SOCKS5AuthReply(SOCKS5AuthMethod.USERNAME_PASSWORD))
+    assert isinstance(server.receive_data(b""), SOCKS5UsernamePasswordRequest)
+    server.send(SOCKS5UsernamePasswordReply(True))
+    command = server.receive_data(b"")
+    assert isinstance(command, SOCKS5CommandRequest)
+    assert command.atype == SOCKS5AType.IPV6_ADDRESS
+    server.send(SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, "[::1]:1080"))
+
+    replies = [client.receive_data(server.data_to_send())]
+    replies += [client.receive_data(b""), client.receive_data(b"")]
+    assert [type(reply) for reply in replies] == [
+        SOCKS5AuthReply,
+        SOCKS5UsernamePasswordReply,
+        SOCKS5Reply,
+    ]
+    assert client.state == SOCKS5State.TUNNEL_READY
+
+
+@pytest.mark.parametrize(
+    "method",
+    [SOCKS5AuthMethod.USERNAME_PASSWORD, SOCKS5AuthMethod.GSSAPI],
+    ids=["not-offered", "unsupported"],
+)
+def test_server_connection_invalid_auth_method(method: SOCKS5AuthMethod) -> None:
+    conn = SOCKS5ServerConnection()
+    conn.receive_data(b"\x05\x02\x00\x01")
+    with pytest.raises(ProtocolError):
+        conn.send(SOCKS5AuthReply(method))
+
+
+def test_server_connection_no_acceptable_methods() -> None:
+    conn = SOCKS5ServerConnection()
+    conn.receive_data(b"\x05\x01\x00")
+    conn.send(SOCKS5AuthReply(SOCKS5AuthMethod.NO_ACCEPTABLE_METHODS))
+    assert conn.data_to_send() == b"\x05\xff"
+    assert conn.state == SOCKS5State.MUST_CLOSE
+    with pytest.raises(ProtocolError):
+        conn.receive_data(b"\x05")
+
+
+def test_server_connection_command_rejected() -> None:
+    conn = SOCKS5ServerConnection()
+    conn.receive_data(b"\x05\x01\x00")
+    conn.send(SOCKS5AuthReply(SOCKS5AuthMethod.NO_AUTH_REQUIRED))
+    conn.receive_data(b"\x05\x01\x00\x01\x7f\x00\x00\x01\x00\x50")
+    conn.send(
+        SOCKS5Reply.from_address(
+            SOCKS5ReplyCode.CONNECTION_NOT_ALLOWED_BY_RULESET, "0.0.0.0:0"
+        )
+    )
+    assert conn.state == SOCKS5State.MUST_CLOSE
+
+
+@pytest.mark.parametrize(
+    "reply",
+    [
+        SOCKS5AuthReply(SOCKS5AuthMethod.NO_AUTH_REQUIRED),
+        SOCKS5UsernamePasswordReply(True),
+        SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, "0.0.0.0:0"),
+    ],
+)
+def test_server_connection_unexpected_reply(reply: typing.Any) -> None:
+    conn = SOCKS5ServerConnection()
+    with pytest.raises(ProtocolError):
+        conn.send(reply)
+
+
+@pytest.mark.parametrize(
+    "data", [b"\x04\x01\x00", b"\x05\x01\x00\x04\x01\x00\x01"], ids=["auth", "command"]
+)
+def test_server_connection_wrong_version(data: bytes) -> None:
+    conn = SOCKS5ServerConnection()
+    with pytest.raises(ProtocolError):
+        conn.receive_data(data)
+        conn.send(SOCKS5AuthReply(SOCKS5AuthMethod.NO_AUTH_REQUIRED))
+        conn.receive_data(b"")
+    assert conn.state == SOCKS5State.MUST_CLOSE
+
+
+def test_server_connection_malformed_command() -> None:
+    conn = SOCKS5ServerConnection()
+    conn.receive_data(b"\x05\x01\x00")
+    conn.send(SOCKS5AuthReply(SOCKS5AuthMethod.NO_AUTH_REQUIRED))
+    with pytest.raises(ProtocolError, match="Malformed request"):
+        conn.receive_data(b"\x05\x01\x00\x02\x7f\x00\x00\x01\x00\x50")
+    assert conn.state == SOCKS5State.MUST_CLOSE
+
+
+def test_server_connection_buffer_limit() -> None:
+    conn = SOCKS5ServerConnection(max_buffer_size=16)
+    conn.receive_data(b"\x05\x01\x00")
+    assert conn.receive_data(b"x" * 16) is NEED_DATA
+    with pytest.raises(ProtocolError):
+        conn.receive_data(b"x")
+    assert conn.state == SOCKS5State.MUST_CLOSE
+
+
+def test_server_connection_send_unknown_reply_type() -> None:
+    conn = SOCKS5ServerConnection()
+    with pytest.raises(NotImplementedError):
+        conn.send(object())  # type: ignore
+
+
+def test_server_connection_bind() -> None:
+    conn = SOCKS5ServerConnection()
+    conn.receive_data(b"\x05\x01\x00")
+    conn.send(SOCKS5AuthReply(SOCKS5AuthMethod.NO_AUTH_REQUIRED))
+    conn.data_to_send()
+    command = conn.receive_data(b"\x05\x02\x00\x01\x0a\x00\x00\x02\x00\x00")
+    assert isinstance(command, SOCKS5CommandRequest)
+    assert command.command == SOCKS5Command.BIND
+    assert conn.state == SOCKS5State.SERVER_COMMAND_REPLY
+
+    conn.send(SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, "127.0.0.1:1080"))
+    assert conn.state == SOCKS5State.SERVER_BIND_CONNECTION_REPLY
+    assert conn.bytes_needed == 0
+    assert conn.receive_data(b"early") is NEED_DATA
+
+    conn.send(SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, "10.0.0.2:8080"))
+    assert conn.state == SOCKS5State.TUNNEL_READY
+    assert conn.data_to_send() == (
+        b"\x05\x00\x00\x01\x7f\x00\x00\x01\x04\x38"
+        b"\x05\x00\x00\x01\x0a\x00\x00\x02\x1f\x90"
+    )
+    assert conn.trailing_data() == b"early"
+    with pytest.raises(ProtocolError):
+        conn.send(SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, "0.0.0.0:0"))
+
+
+def test_server_connection_bind_connection_failed() -> None:
+    conn = SOCKS5ServerConnection()
+    conn.receive_data(b"\x05\x01\x00")
+    conn.send(SOCKS5AuthReply(SOCKS5AuthMethod.NO_AUTH_REQUIRED))
+    conn.receive_data(b"\x05\x02\x00\x01\x0a\x00\x00\x02\x00\x00")
+    conn.send(SOCKS5Reply.from_address(SOCKS5ReplyCode.SUCCEEDED, "127.0.0.1:1080"))
+
+    conn.send(SOCKS5Reply.from_address(SOCKS5ReplyCode.TTL_EXPIRED, "0.0.0.0:0"))
+    assert conn.state == SOCKS5State.MUST_CLOSE
@@ -0,0 +1,176 @@
+import typing
+
+import pytest
+
+from socksio import ProtocolError, SOCKS5AType
+from socksio.socks5 import SOCKS5Datagram, SOCKS5ReassemblyQueue
+
+
+@pytest.mark.parametrize(
+    "address,expected",
+    [
+        (("127.0.0.1", 53), b"\x00\x00\x00\x01\x7f\x00\x00\x01\x005"),
+        (("localhost", 53), b"\x00\x00\x00\x03\x09localhost\x005"),
+        (("::1", 53), b"\x00\x00\x00\x04" + b"\x00" * 15 + b"\x01\x005"),
+    ],
+)
+def test_socks5_datagram_dumps_loads(
+    address: typing.Tuple[str, int], expected: bytes
+) -> None:
+    datagram = SOCKS5Datagram.from_address(address, b"payload")
+
+    data = datagram.dumps()
+
+    assert data == expected + b"payload"
+    assert datagram.pack_header() == expected
+    assert datagram.packed_size() == len(data)
+    assert SOCKS5Datagram.loads(data) == datagram
+
+
+def test_socks5_datagram_fragment_byte() -> None:
+    datagram = SOCKS5Datagram.from_address(
+        "127.0.0.1:53", b"", fragment=3, last_fragment=True
+    )
+
+    data = datagram.dumps()
+
+    assert data[2] == 0x83
+    loaded = SOCKS5Datagram.loads(data)
+    assert loaded.fragment == 3
+    assert loaded.last_fragment
+
+
+def test_socks5_datagram_loads_memoryview_payload_is_a_view() -> None:
+    buffer = bytearray(b"xx\x00\x00\x00\x01\x7f\x00\x00\x01\x005payload")
+
+    with memoryview(buffer) as view:
+        datagram = SOCKS5Datagram.loads(view, offset=2)
+        assert isinstance(datagram.data, memoryview)
+        assert datagram.data == b"payload"
+        assert datagram.addr == b"\x7f\x00\x00\x01"
+        datagram.data.release()
+
+
+def test_socks5_datagram_write_into() -> None:
+    datagram = SOCKS5Datagram.from_address("localhost:53", b"payload")
+    buf = bytearray(datagram.packed_size() + 1)
+
+    assert datagram.write_into(buf, 1) == datagram.packed_size()
+    assert buf[1:] == datagram.dumps()
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x00\x00\x00\x01\x7f\x00\x00",  # truncated header
+        b"\x00\x01\x00\x01\x7f\x00\x00\x01\x005",  # reserved bytes not zero
+        b"\x00\x00\x00\x02\x7f\x00\x00\x01\x005",  # unknown address type
+    ],
+)
+def test_socks5_datagram_loads_malformed(data: bytes) -> None:
+    with pytest.raises(ProtocolError, match="Malformed datagram"):
+        SOCKS5Datagram.loads(data)
+
+
+def test_socks5_datagram_invalid_fragment() -> None:
+    with pytest.raises(ValueError):
+        SOCKS5Datagram.from_address("127.0.0.1:53", b"", fragment=128).dumps()
+
+
+def fragment(position: int, data: bytes, last: bool = False) -> SOCKS5Datagram:
+    return SOCKS5Datagram(
+        SOCKS5AType.IPV4_ADDRESS, b"\x7f\x00\x00\x01", 53, data, position, last
+    )
+
+
+def test_reassembly_queue_standalone_datagram() -> None:
+    queue = SOCKS5ReassemblyQueue()
+    datagram = fragment(0, b"payload")
+
+    assert queue.feed(datagram, now=0) is datagram
+    assert len(queue) == 0
+
+
+def test_reassembly_queue_reassembles_fragments() -> None:
+    queue = SOCKS5ReassemblyQueue()
+
+    assert queue.feed(fragment(1, b"ab"), now=0) is None
+    assert queue.feed(fragment(2, memoryview(b"cd")), now=1) is None
+    assert queue.buffered_size == 4
+    datagram = queue.feed(fragment(3, b"ef", last=True), now=2)
+
+    assert datagram == fragment(0, b"abcdef")
+    assert len(queue) == 0
+    assert queue.buffered_size == 0
+
+
+def test_reassembly_queue_timeout() -> None:
+    queue = SOCKS5ReassemblyQueue(timeout=5)
+    queue.feed(fragment(1, b"ab"), now=0)
+
+    assert queue.feed(fragment(2, b"cd", last=True), now=5) is None
+    assert len(queue) == 0
+
+
+def test_reassembly_queue_expires_oldest_sequences() -> None:
+    queue = SOCKS5ReassemblyQueue(timeout=50)
+    for port in range(10):
+        queue.feed(fragment(1, b"ab")._replace(port=port), now=port)
+
+    queue.expire(now=52)
+    assert len(queue) == 7
+    # A restarted sequence moves behind the others and expires last.
+    queue.feed(fragment(1, b"xy")._replace(port=3), now=53)
+    assert len(queue) == 7
+    queue.expire(now=59)
+    assert len(queue) == 1
+    assert queue.feed(fragment(2, b"z", last=True)._replace(port=3), now=60) == (
+        fragment(0, b"xyz")._replace(port=3)
+    )
+
+
+def test_reassembly_queue_restarts_on_lower_fragment() -> None:
+    queue = SOCKS5ReassemblyQueue()
+    queue.feed(fragment(1, b"ab"), now=0)
+    queue.feed(fragment(2, b"cd"), now=0)
+
+    assert queue.feed(fragment(1, b"xy"), now=0) is None
+    assert queue.feed(fragment(2, b"z", last=True), now=0) == fragment(0, b"xyz")
+
+
+def test_reassembly_queue_drops_sequence_with_missing_fragment() -> None:
+    queue = SOCKS5ReassemblyQueue()
+    queue.feed(fragment(1, b"ab"), now=0)
+
+    assert queue.feed(fragment(3, b"ef", last=True), now=0) is None
+    assert len(queue) == 0
+    assert queue.feed(fragment(2, b"cd"), now=0) is None
+
+
+def test_reassembly_queue_bounded_memory() -> None:
+    queue = SOCKS5ReassemblyQueue(max_size=4)
+    other = fragment(1, b"123")._replace(port=54)
+    queue.feed(other, now=0)
+    queue.feed(fragment(1, b"ab"), now=0)
+
+    # The oldest sequence is dropped to make room for the new fragment
+    assert len(queue) == 1
+    assert queue.buffered_size == 2
+
+    # A sequence that can't fit on its own is dropped
+    assert queue.feed(fragment(2, b"cde"), now=0) is None
+    assert len(queue) == 0
+    assert queue.buffered_size == 0
+
+
+def test_reassembly_queue_evicts_other_sequences() -> None:
+    queue = SOCKS5ReassemblyQueue(max_size=64)
+    queue.feed(fragment(1, b"a" * 10), now=0)
+    queue.feed(fragment(1, b"b" * 50)._replace(port=54), now=0)
+
+    # The oldest sequence is completed by this fragment, the other one is dropped
+    datagram = queue.feed(fragment(2, b"c" * 10, last=True), now=0)
+
+    assert datagram == fragment(0, b"a" * 10 + b"c" * 10)
+    assert len(queue) == 0
+    assert queue.buffered_size == 0
@@ -0,0 +1,129 @@
+import asyncio
+import socket
+import threading
+import typing
+
+import pytest
+
+from socksio import SOCKSError
+from socksio.handshake import ProxyHop
+from socksio.server import SOCKS5Server
+from socksio.sync import create_connection, create_connection_chain, create_connections
+
+
+class Servers(typing.NamedTuple):
+    proxy: typing.Tuple[str, int]
+    target: typing.Tuple[str, int]
+
+
+@pytest.fixture
+def servers() -> typing.Iterator[Servers]:
+    """Runs a proxy and an echo server on an event loop in a background thread."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+
+    async def authenticate(username: bytes, password: bytes) -> bool:
+        return password == b"pass"
+
+    def run(coroutine: typing.Awaitable[typing.Any]) -> typing.Any:
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    async def echo(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+        writer.close()
+
+    proxy = SOCKS5Server(authenticate=authenticate)
+    try:
+        target = run(asyncio.start_server(echo, "127.0.0.1", 0))
+        run(proxy.start("127.0.0.1", 0))
+        yield Servers(proxy.address, target.sockets[0].getsockname())
+        run(proxy.aclose())
+        loop.call_soon_threadsafe(target.close)
+        run(target.wait_closed())
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_create_connection(servers: Servers, pipelined: bool) -> None:
+    with create_connection(
+        servers.proxy,
+        servers.target,
+        auth=(b"user", b"pass"),
+        timeout=5,
+        pipelined=pipelined,
+    ) as sock:
+        assert sock.gettimeout() == 5
+        sock.sendall(b"ping")
+        assert sock.recv(4) == b"ping"
+
+
+def test_create_connection_rejected(servers: Servers) -> None:
+    with pytest.raises(SOCKSError):
+        create_connection(servers.proxy, servers.target, auth=(b"user", b"wrong"))
+
+
+def test_create_connection_timeout() -> None:
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        with pytest.raises(socket.timeout):
+            create_connection(listener.getsockname(), "example.com:80", timeout=0.1)
+
+
+@pytest.mark.parametrize(
+    "kwargs,exception",
+    [({"protocol": "http"}, ValueError), ({"protocol": "socks4"}, SOCKSError)],
+)
+def test_create_connection_invalid_arguments(
+    kwargs: typing.Dict[str, typing.Any], exception: typing.Type[Exception]
+) -> None:
+    with pytest.raises(exception):
+        create_connection("127.0.0.1:1080", "example.com:80", **kwargs)
+
+
+def test_create_connections(servers: Servers) -> None:
+    host, port = servers.target
+    targets = ["{}:{}".format(host, port)] * 20
+    sockets = create_connections(
+        servers.proxy, targets, auth=(b"user", b"pass"), timeout=5, max_workers=4
+    )
+    assert len(sockets) == 20
+    for index, sock in enumerate(sockets):
+        with sock:
+            sock.sendall(b"%d" % index)
+            assert sock.recv(16) == b"%d" % index
+    assert create_connections(servers.proxy, []) == []
+
+
+def test_create_connections_failure(servers: Servers) -> None:
+    with socket.socket() as closed:
+        closed.bind(("127.0.0.1", 0))
+        refused = closed.getsockname()
+
+    with pytest.raises(SOCKSError, match="CONNECTION_REFUSED"):
+        create_connections(
+            servers.proxy,
+            [servers.target, refused, servers.target],
+            auth=(b"user", b"pass"),
+            timeout=5,
+        )
+
+
+def test_create_connection_chain(servers: Servers) -> None:
+    hop = ProxyHop(servers.proxy, auth=(b"user", b"pass"))
+    sock, timings = create_connection_chain([hop, hop], servers.target, timeout=5)
+    with sock:
+        sock.sendall(b"ping")
+        assert sock.recv(4) == b"ping"
+    assert [timing.proxy for timing in timings] == [servers.proxy, servers.proxy]
+
+    with pytest.raises(ValueError):
+        create_connection_chain([], servers.target)
@@ -1,7 +1,22 @@
+import threading
+
 import pytest
 
 from socksio.socks5 import SOCKS5AType
-from socksio.utils import AddressType, split_address_port_from_string
+from socksio.utils import (
+    AddressCache,
+    AddressType,
+    BufferedConnection,
+    CacheInfo,
+    SendBuffer,
+    StreamConnection,
+    byte_enum_table,
+    decode_address,
+    encode_address,
+    get_address_cache,
+    set_address_cache,
+    split_address_port_from_string,
+)
 
 
 @pytest.mark.parametrize(
@@ -45,3 +60,179 @@ def test_split_address_port_from_string(
 def test_split_address_port_from_string_errors(address_str) -> None:
     with pytest.raises(ValueError):
         split_address_port_from_string(address_str)
+
+
+def test_send_buffer_grows_and_reuses_space() -> None:
+    buffer = SendBuffer()
+    chunk = bytes(range(200))
+
+    def write_chunk(buf: bytearray, offset: int) -> int:
+        buf[offset : offset + len(chunk)] = chunk
+        return len(chunk)
+
+    buffer.write(len(chunk), write_chunk)
+    buffer.consume(150)
+    buffer.write(len(chunk), write_chunk)
+    buffer.write(len(chunk), write_chunk)
+
+    assert len(buffer) == 450
+    assert buffer.take() == chunk[150:] + chunk + chunk
+    assert len(buffer) == 0
+
+
+def test_send_buffer_consume_too_much_raises() -> None:
+    buffer = SendBuffer()
+
+    with pytest.raises(ValueError):
+        buffer.consume(1)
+
+
+def test_stream_connection_buffers() -> None:
+    conn = StreamConnection()
+    assert isinstance(conn, BufferedConnection)
+
+    def write_abc(buf: bytearray, offset: int) -> int:
+        buf[offset : offset + 3] = b"abc"
+        return 3
+
+    conn._data_to_send.write(3, write_abc)
+    with conn.data_to_send_view() as view:
+        assert view == b"abc"
+    conn.mark_data_sent(1)
+    assert conn.data_to_send() == b"bc"
+    assert conn.data_to_send() == b""
+
+    conn._received_data += b"tail"
+    assert conn.trailing_data() == b"tail"
+    assert conn.trailing_data() == b""
+
+
+def test_address_cache_counts_hits_and_misses() -> None:
+    cache = AddressCache(maxsize=2)
+    assert encode_address("127.0.0.1", cache) == (AddressType.IPV4, b"\x7f\0\0\1")
+    assert encode_address("127.0.0.1", cache) == (AddressType.IPV4, b"\x7f\0\0\1")
+    assert decode_address(AddressType.IPV4, b"\x7f\0\0\1", cache) == "127.0.0.1"
+    assert cache.info() == CacheInfo(hits=1, misses=2, evictions=0, size=2, maxsize=2)
+
+    encode_address("localhost", cache)
+    encode_address("127.0.0.1", cache)
+    assert cache.info() == CacheInfo(hits=1, misses=4, evictions=2, size=2, maxsize=2)
+
+    cache.clear()
+    assert cache.info() == CacheInfo(hits=0, misses=0, evictions=0, size=0, maxsize=2)
+
+
+def test_address_cache_disabled() -> None:
+    cache = AddressCache(maxsize=0)
+    encode_address("localhost", cache)
+    encode_address("localhost", cache)
+    assert cache.info() == CacheInfo(hits=0, misses=0, evictions=0, size=0, maxsize=0)
+
+
+def test_address_cache_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr("socksio.utils.time.monotonic", lambda: now[0])
+    cache = AddressCache(ttl=10)
+    encode_address("localhost", cache)
+    now[0] += 5
+    encode_address("localhost", cache)
+    assert cache.info().hits == 1
+    now[0] += 10
+    encode_address("localhost", cache)
+    assert cache.info() == CacheInfo(hits=1, misses=2, evictions=1, size=1, maxsize=64)
+
+
+def test_address_cache_thread_local() -> None:
+    cache = AddressCache(thread_local=True)
+    encode_address("localhost", cache)
+
+    infos = []
+    thread = threading.Thread(
+        target=lambda: infos.append((encode_address("localhost", cache), cache.info()))
+    )
+    thread.start()
+    thread.join()
+
+    assert infos[0][0] == (AddressType.DN, b"localhost")
+    assert infos[0][1].misses == 1 and infos[0][1].hits == 0
+    assert cache.info().misses == 1 and cache.info().size == 1
+
+
+def test_address_cache_shared_between_threads() -> None:
+    cache = AddressCache(maxsize=8)
+    addresses = ["host{}.example".format(index) for index in range(16)]
+    errors = []
+
+    def lookup() -> None:
+        try:
+            for _ in range(200):
+                for address in addresses:
+                    expected = (AddressType.DN, address.encode())
+                    assert encode_address(address, cache) == expected
+        except Exception as exc:  # pragma: nocover
+            errors.append(exc)
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    info = cache.info()
+    assert info.size <= 8
+    assert info.misses >= 16
+
+
+def test_set_address_cache() -> None:
+    default = get_address_cache()
+    cache = AddressCache()
+    set_address_cache(cache)
+    try:
+        encode_address("localhost")
+        assert cache.info().misses == 1
+    finally:
+        set_address_cache(default)
+
+
+@pytest.mark.parametrize("kwargs", [{"maxsize": -1}, {"ttl": 0}])
+def test_address_cache_invalid_arguments(kwargs) -> None:
+    with pytest.raises(ValueError):
+        AddressCache(**kwargs)
+
+
+@pytest.mark.parametrize(
+    "address,expected",
+    [
+        ("127.0.0.1", (AddressType.IPV4, b"\x7f\x00\x00\x01")),
+        (b"127.0.0.1", (AddressType.IPV4, b"\x7f\x00\x00\x01")),
+        ("::1", (AddressType.IPV6, b"\x00" * 15 + b"\x01")),
+        ("::ffff:1.2.3.4", (AddressType.IPV6, b"\x00" * 10 + b"\xff\xff\1\2\3\4")),
+        ("localhost", (AddressType.DN, b"localhost")),
+        ("1.2.3", (AddressType.DN, b"1.2.3")),
+        ("1.2.3.4.5", (AddressType.DN, b"1.2.3.4.5")),
+        ("example.com:80", (AddressType.DN, b"example.com:80")),
+        ("bücher.example", (AddressType.DN, b"xn--bcher-kva.example")),
+        (
+            "b\xc3\xbccher.example".encode("latin-1"),
+            (AddressType.DN, b"xn--bcher-kva.example"),
+        ),
+        ("a" * 255, (AddressType.DN, b"a" * 255)),
+    ],
+)
+def test_encode_address(address, expected) -> None:
+    assert encode_address(address, AddressCache(maxsize=0)) == expected
+
+
+def test_encode_address_domain_name_too_long() -> None:
+    with pytest.raises(ValueError, match="longer than 255 bytes"):
+        encode_address("a" * 256, AddressCache(maxsize=0))
+
+
+def test_byte_enum_table() -> None:
+    table = byte_enum_table(SOCKS5AType)
+    assert len(table) == 256
+    assert table[1] is SOCKS5AType.IPV4_ADDRESS
+    assert table[3] is SOCKS5AType.DOMAIN_NAME
+    assert table[4] is SOCKS5AType.IPV6_ADDRESS
+    assert table.count(None) == 253